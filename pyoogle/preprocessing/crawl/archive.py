@@ -0,0 +1,117 @@
+import gzip
+import json
+import logging
+import os
+import threading
+import time
+import zlib
+
+# An archive keeps the downloaded websites so that a changed parser or changed link rules only need parsing them
+# again instead of downloading them again. Similar to a WARC file every record is a gzip member of its own with
+# the url, http status and headers as a json line followed by the website's raw bytes. The index next to the archive
+# has a line "offset<TAB>length<TAB>url" for every record.
+
+
+def get_archive_path(store_path):
+    return store_path + ".archive"
+
+
+class PageArchive:
+    # Append only archive of downloaded websites, records can be added by several threads at once
+    def __init__(self, path, clear=False):
+        self.path = path
+        self.index_path = path + ".idx"
+        if clear:
+            PageArchive.remove(path)
+        self._lock = threading.Lock()
+        self._file = open(path, "ab")
+        self._index_file = open(self.index_path, "a", encoding="utf-8")
+        self._index = None  # url to (offset, length) of its last record, loaded when needed
+
+    @staticmethod
+    def remove(path):
+        for file_path in (path, path + ".idx"):
+            if os.path.isfile(file_path):
+                os.remove(file_path)
+
+    def add(self, url, website, status=None, headers=None):
+        # Compressing happens outside of the lock, only writing is serialized. Ignored when closed.
+        header = json.dumps({"url": url, "status": status, "headers": headers or {}, "time": time.time()})
+        record = gzip.compress(header.encode("utf-8") + b"\n" + website, compresslevel=6)
+        with self._lock:
+            if self._file is None:
+                return 0
+            offset = self._file.tell()
+            self._file.write(record)
+            self._index_file.write("%d\t%d\t%s\n" % (offset, len(record), url))
+            if self._index is not None:
+                self._index[url] = (offset, len(record))
+        return len(record)
+
+    def flush(self):
+        # The archive first, so that the index never points behind it
+        with self._lock:
+            if self._file is not None:
+                self._file.flush()
+                self._index_file.flush()
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._index_file.close()
+                self._file = None
+                self._index_file = None
+
+    def __enter__(self):
+        return self
+
+    # noinspection PyUnusedLocal
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def __len__(self):
+        self.flush()
+        return sum(1 for _ in PageArchive.iter_index(self.path))
+
+    def get(self, url):
+        # The last record (url, status, headers, website) of the url or None
+        self.flush()
+        if self._index is None:
+            self._index = {url: (offset, length) for offset, length, url in PageArchive.iter_index(self.path)}
+        entry = self._index.get(url)
+        if entry is None:
+            return
+        with open(self.path, "rb") as file:
+            file.seek(entry[0])
+            return PageArchive._decode(file.read(entry[1]))
+
+    @staticmethod
+    def iter_index(path):
+        # (offset, length, url) of every record in the order they were added
+        with open(path + ".idx", encoding="utf-8") as index_file:
+            for line in index_file:
+                parts = line.rstrip("\n").split("\t", 2)
+                if len(parts) == 3:  # the last line may be incomplete after a crash
+                    yield int(parts[0]), int(parts[1]), parts[2]
+
+    @staticmethod
+    def iter_records(path):
+        # Streams the records (url, status, headers, website) of the archive at path, damaged records are skipped
+        with open(path, "rb") as file:
+            for offset, length, url in PageArchive.iter_index(path):
+                file.seek(offset)
+                record = PageArchive._decode(file.read(length))
+                if record is None:
+                    logging.warning("Damaged record of %s at %d in archive %s", url, offset, path)
+                    continue
+                yield record
+
+    @staticmethod
+    def _decode(data):
+        try:
+            header, _, website = gzip.decompress(data).partition(b"\n")
+            header = json.loads(header.decode("utf-8"))
+        except (OSError, EOFError, zlib.error, ValueError):
+            return
+        return header["url"], header["status"], header["headers"], website
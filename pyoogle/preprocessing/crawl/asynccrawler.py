@@ -0,0 +1,124 @@
+import asyncio
+import logging
+import time
+
+from pyoogle.preprocessing.crawl.asynchttp import ConnectionPool, HTTPStatusError, ConnectionClosedError
+from pyoogle.preprocessing.crawl.crawler import Crawler, NotResolvable
+from pyoogle.preprocessing.web.extractor import SoupExtractor
+
+
+class AsyncCrawler(Crawler):
+    # Crawler that downloads websites with asyncio instead of a thread pool. Up to max_concurrency downloads are
+    # in flight at once and at most max_per_host of them go to the same host, reusing keep-alive connections.
+    # Started, joined and stopped exactly like the Crawler.
+    def __init__(self, store_path, link_constraint, max_sites=0, max_concurrency=500, max_per_host=8, timeout=30,
+                 parse_workers=0, extractor=SoupExtractor, frontier_size=0, max_pending_websites=0,
+                 seen_error_rate=0., near_duplicate_distance=0, flush_size=1000, flush_interval=60., min_delay=0.,
+                 obey_robots=False, collect_stats=False, stats_path=None, stats_interval=10., guess_languages=False,
+                 archive_pages=False, write_snapshot=False):
+        super().__init__(store_path, link_constraint, max_sites=max_sites, timeout=timeout,
+                         parse_workers=parse_workers, extractor=extractor, frontier_size=frontier_size,
+                         max_pending_websites=max_pending_websites, seen_error_rate=seen_error_rate,
+                         near_duplicate_distance=near_duplicate_distance, flush_size=flush_size,
+                         flush_interval=flush_interval, min_delay=min_delay, max_per_host=max_per_host,
+                         obey_robots=obey_robots, collect_stats=collect_stats, stats_path=stats_path,
+                         stats_interval=stats_interval, guess_languages=guess_languages,
+                         archive_pages=archive_pages, write_snapshot=write_snapshot)
+        self.max_concurrency = max_concurrency
+
+    def process_links(self):
+        logging.info("Starting to process links asynchronously")
+        try:
+            asyncio.run(self._process_links_async())
+        finally:
+            self.stop()  # ensure crawler is really stopped
+
+    async def _process_links_async(self):
+        loop = asyncio.get_running_loop()
+        pool = ConnectionPool(self.max_per_host, self.timeout)
+        slots = asyncio.Semaphore(self.max_concurrency)
+        in_flight = set()
+        try:
+            while not self._is_finished():
+                await slots.acquire()
+                # obtaining blocks until a link is pending, do not block the event loop meanwhile
+                link = await loop.run_in_executor(None, self.obtain_new_link)
+                if link is None:
+                    slots.release()
+                    if len(in_flight) == 0:
+                        return
+                    # Downloads still running can lead to new links
+                    await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+                    continue
+                task = loop.create_task(self._process_link_async(pool, link, slots))
+                in_flight.add(task)
+                task.add_done_callback(in_flight.discard)
+        finally:
+            for task in in_flight:
+                task.cancel()
+            await asyncio.gather(*in_flight, return_exceptions=True)
+            pool.close()
+
+    async def _process_link_async(self, pool, link, slots):
+        try:
+            if self._is_finished():
+                return
+            try:
+                if self.robots is not None and not await asyncio.get_running_loop().run_in_executor(
+                        None, self.is_allowed, link):
+                    logging.debug("Website %s not allowed by robots.txt", link)
+                    self._count("robots_disallowed")
+                    self.link_finished(link)
+                    return
+                start_time = time.perf_counter()
+                website, status, headers = await AsyncCrawler.download_response_async(pool, link)
+                self.download_finished(website, start_time)
+            finally:
+                self.scheduler.release(link)
+            if website is None:
+                logging.debug("Website %s not downloaded", link)
+            if website is NotResolvable:
+                logging.debug("Website %s not resolvable and not trying again.", link)
+                self.link_finished(link)
+                return
+            # Handing over blocks while too many websites are pending
+            await asyncio.get_running_loop().run_in_executor(None, self.website_downloaded, link, website, status,
+                                                             headers)
+        finally:
+            slots.release()
+
+    @staticmethod
+    async def download_website_async(pool, url):
+        # Same results as Crawler.download_website: the website, None to try again later or NotResolvable
+        return (await AsyncCrawler.download_response_async(pool, url))[0]
+
+    @staticmethod
+    async def download_response_async(pool, url):
+        # Same results as Crawler.download_response: the website, the http status and headers
+        logging.debug("Downloading website %s", url)
+        status, headers = None, None
+        try:
+            status, headers, website = await pool.fetch_response(url)
+        except asyncio.TimeoutError:
+            logging.debug("Timeout error when downloading %s", url)
+            website = None
+        except HTTPStatusError as err:
+            if int(err.code / 100) == 4:
+                logging.debug("Client http error when downloading %s %s", url, err)
+                website = NotResolvable  # 404 Not Found or other Client Error, ignore link in future
+            else:
+                logging.debug("HTTP Error when downloading %d %s %s", err.code, url, err)
+                website = None
+        except ConnectionClosedError as disc:
+            logging.debug("(RemoteDisconnect) error when downloading %s %s", url, disc)
+            website = NotResolvable
+        except UnicodeEncodeError:
+            logging.debug("(UnicodeEncodeError) error when downloading %s", url)
+            website = NotResolvable
+        except ValueError as err:
+            logging.debug("(ValueError) error when downloading %s %s", url, err)
+            website = NotResolvable
+        except (OSError, asyncio.IncompleteReadError) as err:
+            logging.debug("Url error when downloading %s %s", url, err)
+            website = None
+        return website, status, headers
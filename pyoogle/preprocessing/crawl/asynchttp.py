@@ -0,0 +1,166 @@
+import asyncio
+import ssl
+import sys
+from urllib.parse import urlsplit, urljoin
+
+# Minimal asyncio HTTP/1.1 client for the crawler. Keeps idle keep-alive connections per host so that
+# consecutive downloads from the same host reuse their TCP (and TLS) connection instead of opening a new one.
+
+_REDIRECT_CODES = (301, 302, 303, 307, 308)
+_MAX_REDIRECTS = 10  # same as urllib's HTTPRedirectHandler
+_USER_AGENT = "Python-urllib/%d.%d" % sys.version_info[:2]
+
+
+class HTTPStatusError(Exception):
+    # Raised for a final http status code >= 400, mirrors urllib.error.HTTPError
+    def __init__(self, url, code):
+        super().__init__("HTTP Error %d for %s" % (code, url))
+        self.url = url
+        self.code = code
+
+
+class ConnectionClosedError(ConnectionError):
+    # The remote side closed the connection without sending a response, mirrors http.client.RemoteDisconnected
+    pass
+
+
+class _Connection:
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+
+    def close(self):
+        self.writer.close()
+
+
+class ConnectionPool:
+    # Limits the open connections per host to max_per_host and keeps finished connections for reuse.
+    def __init__(self, max_per_host=8, timeout=30):
+        self.max_per_host = max_per_host
+        self.timeout = timeout
+        self._idle = {}  # Maps (scheme, host, port) to a list of idle connections
+        self._host_limits = {}  # Maps (scheme, host, port) to a semaphore
+        self._ssl_context = None
+
+    def _get_ssl_context(self):
+        if self._ssl_context is None:
+            self._ssl_context = ssl.create_default_context()
+        return self._ssl_context
+
+    def _host_limit(self, key):
+        limit = self._host_limits.get(key)
+        if limit is None:
+            limit = asyncio.Semaphore(self.max_per_host)
+            self._host_limits[key] = limit
+        return limit
+
+    async def _connect(self, key):
+        scheme, host, port = key
+        ssl_context = self._get_ssl_context() if scheme == "https" else None
+        reader, writer = await asyncio.open_connection(host, port, ssl=ssl_context)
+        return _Connection(reader, writer)
+
+    async def fetch(self, url):
+        # Downloads the given url following redirects, returns the body as bytes.
+        # Raises HTTPStatusError for status codes >= 400, asyncio.TimeoutError, OSError or ValueError.
+        return (await self.fetch_response(url))[2]
+
+    async def fetch_response(self, url):
+        # Same as fetch but returns the status, the headers with lower case names and the body of the final response
+        for _ in range(_MAX_REDIRECTS + 1):
+            status, headers, body = await asyncio.wait_for(self._request(url), self.timeout)
+            if status in _REDIRECT_CODES and "location" in headers:
+                url = urljoin(url, headers["location"])
+                continue
+            if status >= 400:
+                raise HTTPStatusError(url, status)
+            return status, headers, body
+        raise HTTPStatusError(url, 310)  # too many redirects
+
+    async def _request(self, url):
+        split = urlsplit(url)
+        if split.scheme not in ("http", "https") or not split.hostname:
+            raise ValueError("unknown url type: %r" % url)
+        port = split.port or (443 if split.scheme == "https" else 80)
+        key = (split.scheme, split.hostname, port)
+        path = split.path or "/"
+        if split.query:
+            path += "?" + split.query
+        # Like urllib we do not quote the url here, non ascii urls fail with UnicodeEncodeError
+        request = ("GET {path} HTTP/1.1\r\nHost: {host}\r\nUser-Agent: {agent}\r\n"
+                   "Accept-Encoding: identity\r\nConnection: keep-alive\r\n\r\n"
+                   .format(path=path, host=split.netloc, agent=_USER_AGENT)).encode("ascii")
+
+        async with self._host_limit(key):
+            idle = self._idle.setdefault(key, [])
+            while idle:
+                # A reused connection could have been closed by the server in the meantime, then retry with a new one
+                connection = idle.pop()
+                try:
+                    return await self._exchange(key, connection, request)
+                except (ConnectionClosedError, ConnectionResetError, BrokenPipeError):
+                    connection.close()
+                except BaseException:
+                    connection.close()
+                    raise
+            connection = await self._connect(key)
+            try:
+                return await self._exchange(key, connection, request)
+            except BaseException:
+                connection.close()
+                raise
+
+    async def _exchange(self, key, connection, request):
+        connection.writer.write(request)
+        await connection.writer.drain()
+        status_line = await connection.reader.readline()
+        if not status_line:
+            raise ConnectionClosedError("Remote end closed connection without response")
+        parts = status_line.decode("latin-1").split(None, 2)
+        if len(parts) < 2 or not parts[0].startswith("HTTP/"):
+            raise ConnectionClosedError("Invalid status line %r" % status_line)
+        version, status = parts[0], int(parts[1])
+        headers = {}
+        while True:
+            line = await connection.reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        keep_alive = headers.get("connection", "").lower() != "close" and version != "HTTP/1.0"
+        if headers.get("transfer-encoding", "").lower() == "chunked":
+            body = await self._read_chunked(connection.reader)
+        elif "content-length" in headers:
+            body = await connection.reader.readexactly(int(headers["content-length"]))
+        elif status in (204, 304) or 100 <= status < 200:
+            body = b""
+        else:
+            body = await connection.reader.read()
+            keep_alive = False
+
+        if keep_alive:
+            self._idle[key].append(connection)
+        else:
+            connection.close()
+        return status, headers, body
+
+    @staticmethod
+    async def _read_chunked(reader):
+        chunks = []
+        while True:
+            size_line = await reader.readline()
+            size = int(size_line.split(b";", 1)[0].strip() or b"0", 16)
+            if size == 0:
+                # Skip trailers
+                while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                    pass
+                return b"".join(chunks)
+            chunks.append(await reader.readexactly(size))
+            await reader.readline()  # CRLF after each chunk
+
+    def close(self):
+        for connections in self._idle.values():
+            for connection in connections:
+                connection.close()
+        self._idle = {}
@@ -0,0 +1,257 @@
+import logging
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+from pyoogle.preprocessing.crawl.asynccrawler import AsyncCrawler
+from pyoogle.preprocessing.crawl.crawler import Crawler
+from pyoogle.preprocessing.crawl.letterdistributions import _guess_language, guess_languages
+from pyoogle.preprocessing.crawl.linkconstraint import LinkConstraint
+from pyoogle.preprocessing.web.parser import parse_website
+
+
+def _make_synthetic_page(index, pages_count, fan_out, name):
+    links = "".join('<li><a href="/page/{0}">Page {0}</a></li>'.format((index * 7 + step * 13) % pages_count)
+                    for step in range(1, fan_out + 1))
+    return ("<!DOCTYPE html><html lang=\"en\"><head><title>{2} page {0}</title>"
+            "<style>body {{ color: black; }}</style></head><body><h1>Page {0}</h1>"
+            "<p>This is the {2} content of page number {0} used for benchmarking.</p>"
+            "<ul>{1}</ul></body></html>").format(index, links, name).encode("utf-8")
+
+
+class SyntheticSite:
+    # Local http server serving pages_count pages /page/0 to /page/<pages_count-1> which link to fan_out other pages.
+    # Every response is delayed by latency seconds to simulate the network. Sites with different names have
+    # different content.
+    def __init__(self, pages_count=500, fan_out=10, latency=0.02, name="synthetic"):
+        self.pages_count = pages_count
+        pages = [_make_synthetic_page(index, pages_count, fan_out, name) for index in range(pages_count)]
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # keep-alive
+
+            def do_GET(self):
+                time.sleep(latency)
+                try:
+                    page = pages[int(self.path.rsplit("/", 1)[-1])]
+                except (ValueError, IndexError):
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", "text/html; charset=utf-8")
+                self.send_header("Content-Length", str(len(page)))
+                self.end_headers()
+                self.wfile.write(page)
+
+            # noinspection PyShadowingBuiltins
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.server.handle_error = lambda request, client_address: None  # crawlers drop connections when stopping
+        self.thread = None
+
+    def get_netloc(self):
+        return "127.0.0.1:%d" % self.server.server_address[1]
+
+    def get_start_url(self):
+        return "http://%s/page/0" % self.get_netloc()
+
+    def __enter__(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    # noinspection PyUnusedLocal
+    def __exit__(self, exc_type=None, exc_val=None, exc_tb=None):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def _crawl_pages_per_second(site, make_crawler):
+    with tempfile.TemporaryDirectory() as directory:
+        crawler = make_crawler(os.path.join(directory, "benchmark.db"), LinkConstraint("http", site.get_netloc()))
+        start_time = time.perf_counter()
+        crawler.start(site.get_start_url())
+        crawler.join()
+        duration = time.perf_counter() - start_time
+    return crawler.processed_sites_count, crawler.processed_sites_count / duration
+
+
+def benchmark_engines(pages_count=500, fan_out=10, latency=0.02, max_workers=2, max_concurrency=500,
+                      parse_workers=os.cpu_count()):
+    # Crawls the same synthetic site with the thread engine and the asyncio engine, the latter also with
+    # parse_workers parsing processes, and prints pages/sec
+    engines = [("Thread engine (%d workers)" % max_workers,
+                lambda path, constraint: Crawler(path, constraint, max_sites=pages_count,
+                                                 max_workers=max_workers, timeout=5)),
+               ("Asyncio engine (%d concurrent)" % max_concurrency,
+                lambda path, constraint: AsyncCrawler(path, constraint, max_sites=pages_count,
+                                                      max_concurrency=max_concurrency, timeout=5)),
+               ("Asyncio engine (%d concurrent, %d parse processes)" % (max_concurrency, parse_workers),
+                lambda path, constraint: AsyncCrawler(path, constraint, max_sites=pages_count,
+                                                      max_concurrency=max_concurrency, timeout=5,
+                                                      parse_workers=parse_workers))]
+    results = {}
+    with SyntheticSite(pages_count, fan_out, latency) as site:
+        for name, make_crawler in engines:
+            count, pages_per_second = _crawl_pages_per_second(site, make_crawler)
+            print("{}: crawled {} pages with {:.1f} pages/sec".format(name, count, pages_per_second))
+            results[name] = pages_per_second
+    return results
+
+
+def benchmark_hosts(hosts_counts=(1, 2, 4, 8), pages_count=100, latency=0.02, min_delay=0.05, max_per_host=1):
+    # Crawls hosts_count synthetic sites at once, each host with at most max_per_host downloads at once and
+    # min_delay seconds between them, and prints pages/sec which should grow with the amount of hosts
+    results = {}
+    for hosts_count in hosts_counts:
+        sites = [SyntheticSite(pages_count, 5, latency, "host %d" % index) for index in range(hosts_count)]
+        for site in sites:
+            site.__enter__()
+        try:
+            with tempfile.TemporaryDirectory() as directory:
+                crawler = AsyncCrawler(os.path.join(directory, "benchmark.db"), LinkConstraint("http"),
+                                       max_sites=pages_count * hosts_count, max_per_host=max_per_host,
+                                       min_delay=min_delay, timeout=5)
+                start_time = time.perf_counter()
+                crawler.start(sites[0].get_start_url())
+                for site in sites[1:]:
+                    crawler.add_link(site.get_start_url(), revive=True)
+                crawler.join()
+                duration = time.perf_counter() - start_time
+        finally:
+            for site in sites:
+                site.__exit__()
+        pages_per_second = crawler.processed_sites_count / duration
+        print("{} hosts: crawled {} pages with {:.1f} pages/sec".format(hosts_count, crawler.processed_sites_count,
+                                                                        pages_per_second))
+        results[hosts_count] = pages_per_second
+    return results
+
+
+def make_link_corpus(links_count=200000, seed=42):
+    # Links as found on websites: some links are very frequent (like navigation), most are rare
+    rand = random.Random(seed)
+    paths = ["/", "/index", "/de/lehre", "/en/research/seminar", "/iag2/~schwer/seite/yggt5/de", "/page/%d",
+             "/files/script%d.pdf", "/img/logo%d.png", "/favicon.ico", "/news/%d.html", "/search?q=%d&lang=de",
+             "/people/%d#top", "/data/table%d.csv", "/Vorlesung/%d/Übung"]
+    hosts = ["http://www.math.kit.edu", "https://www.math.kit.edu", "http://www.kit.edu", "http://www.spiegel.de"]
+    links = []
+    for _ in range(links_count):
+        path = rand.choice(paths)
+        if "%d" in path:
+            path %= int(rand.paretovariate(1.))  # few numbers are frequent
+        links.append(rand.choice(hosts) + path + ("/" if rand.random() < 0.1 else ""))
+    return links
+
+
+def load_link_corpus(directory):
+    # The links of the websites saved in the directory
+    from pyoogle.preprocessing.web.benchmark import load_corpus
+    links = []
+    for link, website in load_corpus(directory):
+        record = parse_website(link, website)
+        if record is not None:
+            links.extend(record[4])
+    return links
+
+
+def _make_function_constraint(cache_size):
+    # The rules of crawl_mathy as functions
+    constraint = LinkConstraint('http', 'www.math.kit.edu', cache_size=cache_size)
+    forbidden_endings = ['.pdf', '.png', '.ico', '#top']
+    constraint.add_rule(lambda link: all((not link.lower().endswith(ending) for ending in forbidden_endings)))
+
+    def rule_no_point_in_last_path_segment(link_parsed):
+        split = link_parsed.path.split("/")
+        return len(split) == 0 or "." not in split[-1]
+    constraint.add_rule(rule_no_point_in_last_path_segment, parsed_link=True)
+    return constraint
+
+
+def _make_declared_constraint(cache_size):
+    # The rules of crawl_mathy declared
+    constraint = LinkConstraint('http', 'www.math.kit.edu', cache_size=cache_size)
+    constraint.forbid_endings(['.pdf', '.png', '.ico', '#top'])
+    constraint.forbid_point_in_last_segment()
+    return constraint
+
+
+def benchmark_link_constraints(links, repeat=3):
+    # Checks that all constraints accept the same links and prints the time per link
+    constraints = [("Function rules", lambda: _make_function_constraint(0)),
+                   ("Declared rules", lambda: _make_declared_constraint(0)),
+                   ("Declared rules with cache", lambda: _make_declared_constraint(100000))]
+    expected = None
+    results = {}
+    for name, make_constraint in constraints:
+        best = None
+        for _ in range(repeat):
+            constraint = make_constraint()  # a new cache every time
+            start_time = time.perf_counter()
+            valid = [constraint.get_valid(link) for link in links]
+            duration = time.perf_counter() - start_time
+            best = duration if best is None else min(best, duration)
+        if expected is None:
+            expected = valid
+        elif valid != expected:
+            print("{} gives different results!".format(name))
+        results[name] = best / len(links)
+        print("{}: {:.2f} µs per link, {} of {} links valid".format(name, 1e6 * best / len(links),
+                                                                     sum(link is not None for link in valid),
+                                                                     len(links)))
+    return results
+
+
+_LANGUAGE_WORDS = {"de": "der die und ist nicht mit eine auch auf sich dem wird für werden über zwischen Mathematik "
+                         "Vorlesung Übung Prüfung Fakultät Straße größer schön".split(),
+                   "en": "the and is not with one also on which will for are between mathematics lecture exercise "
+                         "exam faculty street larger beautiful".split()}
+
+
+def make_language_corpus(texts_count=2000, seed=42):
+    # Content like parse_website returns it, lists of text pieces, in german and english of different lengths
+    rnd = random.Random(seed)
+    texts = []
+    for _ in range(texts_count):
+        words = _LANGUAGE_WORDS[rnd.choice(list(_LANGUAGE_WORDS))]
+        texts.append([" ".join(rnd.choice(words) for _ in range(rnd.randint(5, 40)))
+                      for _ in range(rnd.randint(1, 30))])
+    return texts
+
+
+def benchmark_language_guessing(texts, repeat=3):
+    # Checks that the vectorized guessing agrees with the letter by letter guessing and prints documents per second
+    guessers = [("Letter by letter", lambda: [_guess_language(text) for text in texts]),
+                ("Vectorized batch", lambda: guess_languages(texts))]
+    expected = None
+    results = {}
+    for name, guess in guessers:
+        best = None
+        for _ in range(repeat):
+            start_time = time.perf_counter()
+            languages = guess()
+            duration = time.perf_counter() - start_time
+            best = duration if best is None else min(best, duration)
+        if expected is None:
+            expected = languages
+        elif list(languages) != list(expected):
+            print("{} gives different results!".format(name))
+        results[name] = len(texts) / best
+        print("{}: {:.0f} documents/sec".format(name, len(texts) / best))
+    return results
+
+
+if __name__ == "__main__":
+    logging.getLogger().setLevel(logging.WARNING)
+    # Optionally give a directory of saved websites for the links, else synthetic links are used
+    benchmark_link_constraints(load_link_corpus(sys.argv[1]) if len(sys.argv) > 1 else make_link_corpus())
+    benchmark_language_guessing(make_language_corpus())
+    benchmark_engines()
+    benchmark_hosts()
@@ -6,49 +6,149 @@ Created on Sat Feb  6 12:49:02 2016
 """
 
 import logging
+import os
 import threading  # For main processing thread
+import time
 import urllib  # For downloading websites
 import urllib.error
 import urllib.request
+from collections import deque
 from concurrent.futures import ThreadPoolExecutor  # each downloads a website
+from concurrent.futures import ProcessPoolExecutor  # each parses a website
 from http.client import RemoteDisconnected
-from queue import Queue, Empty  # For processing downloaded websites
+from queue import Queue, Empty, Full  # For processing downloaded websites
 from socket import timeout as socket_timeout
 
 from pyoogle.config import LOGGING_LEVEL
+from pyoogle.preprocessing.crawl.archive import PageArchive, get_archive_path  # keeps downloaded websites
+from pyoogle.preprocessing.crawl.frontier import UrlFrontier  # links to download
+from pyoogle.preprocessing.crawl.letterdistributions import guess_language  # for websites without lang attribute
 from pyoogle.preprocessing.crawl.linkconstraint import LinkConstraint  # constraint to which links are allowed
+from pyoogle.preprocessing.crawl.scheduler import HostScheduler, RobotsCache  # which link to download next
+from pyoogle.preprocessing.crawl.seenset import ScalableBloomFilter  # compact set of processed links
+from pyoogle.preprocessing.crawl.stats import CrawlStats, StatsWriter  # metrics of the crawl's stages
+from pyoogle.preprocessing.web.extractor import SoupExtractor
+from pyoogle.preprocessing.web.fingerprint import simhash, SimHashIndex  # for detecting near duplicates
 from pyoogle.preprocessing.web.net import WebNet
 from pyoogle.preprocessing.web.node import WebNode
 from pyoogle.preprocessing.web.nodestore import WebNodeStore  # for permanently saving created WebNodes
-from pyoogle.preprocessing.web.parser import WebParser  # parses the downloaded html site and extracts info
+from pyoogle.preprocessing.web.parser import WebParser, parse_website  # parses the downloaded html site
+from pyoogle.preprocessing.web.snapshot import GraphSnapshot, get_snapshot_path  # link graph for ranking
 
 logging.getLogger().setLevel(LOGGING_LEVEL)
 
 NotResolvable = "NOT_RESOLVABLE_LINK"
 
 
+def _parse_website_timed(link, website_raw, extractor):
+    # The record and the seconds parsing took in the worker process
+    start_time = time.perf_counter()
+    record = parse_website(link, website_raw, extractor)
+    return record, time.perf_counter() - start_time
+
+
 class Crawler:
+    _BACKPRESSURE_TIMEOUT = 1.  # seconds until a blocked download checks if crawling stopped
+    _FLUSH_CHECK_INTERVAL = 1.  # seconds until waiting for a website checks if the unsaved nodes are due
     # Initializes the Crawler. If max_sites is greater than zero it will only
     # download this many sites and stop afterwards, else until no new site is found.
-    def __init__(self, store_path, link_constraint, max_sites=0, max_workers=2, timeout=30):
+    # If parse_workers is greater than zero, websites are parsed by this many processes.
+    # The extractor is used by the WebParser, see preprocessing.web.extractor.py
+    # If frontier_size is greater than zero, at most this many pending links are kept in memory, the others
+    # are kept in a database next to the store which also allows continuing with them when not clearing the store.
+    # If max_pending_websites is greater than zero, downloading waits while this many websites wait for processing.
+    # If seen_error_rate is greater than zero, processed links are kept in a bloom filter instead of a set which
+    # needs only a few bytes per link but skips this fraction of the new links. The links that are done are saved
+    # next to the store, so that continuing does not try them again. A frontier kept in memory then remembers the
+    # links put into it in a bloom filter too.
+    # If near_duplicate_distance is greater than zero, websites whose simhash differs in at most this many bits
+    # from the one of an already processed website are treated like websites with the same content.
+    # New nodes are saved whenever flush_size nodes are unsaved or flush_interval seconds passed, zero disables
+    # either. Saved nodes release their content and out links, a killed crawl continues from the last save.
+    # Downloads of the same host start at least min_delay seconds apart and if max_per_host is greater than zero
+    # at most this many run at once, see preprocessing.crawl.scheduler.py. If obey_robots is set, the robots.txt
+    # of every host is downloaded and obeyed, including the crawl delay it asks for.
+    # If collect_stats is set, the crawler counts what happened and measures how long every stage took, see
+    # get_stats(). If stats_path is given, these stats are also appended to this file every stats_interval seconds.
+    # If guess_languages is set, the language of websites without lang attribute is guessed from their letters.
+    # If archive_pages is set, downloaded websites are kept in an archive next to the store so that they can be parsed
+    # again without downloading them, see preprocessing.crawl.reparse.py
+    # If write_snapshot is set, the link graph of the store is written next to it when crawling ends so that ranking
+    # can start from it, see preprocessing.web.snapshot.py
+    def __init__(self, store_path, link_constraint, max_sites=0, max_workers=2, timeout=30, parse_workers=0,
+                 extractor=SoupExtractor, frontier_size=0, max_pending_websites=0, seen_error_rate=0.,
+                 near_duplicate_distance=0, flush_size=1000, flush_interval=60., min_delay=0., max_per_host=0,
+                 obey_robots=False, collect_stats=False, stats_path=None, stats_interval=10., guess_languages=False,
+                 archive_pages=False, write_snapshot=False):
         self.store_path = store_path
-        self.pending_links = Queue()
-        self.pending_websites = Queue()
+        self.write_snapshot = write_snapshot
+        self.archive_pages = archive_pages
+        self.archive = None
+        self.frontier_size = frontier_size
+        self.pending_links = UrlFrontier()
+        self.min_delay = min_delay
+        self.max_per_host = max_per_host
+        self.scheduler = None
+        self.robots = RobotsCache(timeout=timeout) if obey_robots else None
+        self.pending_websites = Queue(maxsize=max_pending_websites)
         self.web_net = None
+        self.unsaved_nodes = []  # new nodes and stored nodes that got new urls
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.last_flush_time = 0
         self.link_constraint = link_constraint
         if self.link_constraint is None:
             raise ValueError("No link constraint given!")
-        self.already_processed_links = set()
-        self.already_processed_websites = set()
+        self.seen_error_rate = seen_error_rate
+        self.already_processed_links = set()  # links handed out for downloading
+        self.finished_links = None  # stored, not resolvable or not parsable links, only with seen_error_rate
+        self.near_duplicates = SimHashIndex(near_duplicate_distance) if near_duplicate_distance > 0 else None
         self.is_crawling = False
         self.max_sites = max_sites
         self.processed_sites_count = 0
         self.max_workers = max_workers
         self.timeout = timeout
+        self.parse_workers = parse_workers
+        self.extractor = extractor
+        self.guess_languages = guess_languages
+        self.stats = CrawlStats() if collect_stats or stats_path is not None else None
+        self.stats_writer = StatsWriter(stats_path, self.get_stats, stats_interval) if stats_path is not None else None
         self.starting_processor = None
         self.links_processor = None
         self.websites_processor = None
 
+    def get_stats(self):
+        # Snapshot of the progress and the queue depths and, if collected, of the counters and durations
+        snapshot = self.stats.snapshot() if self.stats is not None else {}
+        snapshot["time"] = time.time()
+        snapshot["processed_sites"] = self.processed_sites_count
+        snapshot["pending_links"] = (self.scheduler.qsize() if self.scheduler is not None
+                                     else self.pending_links.qsize())
+        snapshot["pending_websites"] = self.pending_websites.qsize()
+        snapshot["unsaved_nodes"] = len(self.unsaved_nodes)
+        return snapshot
+
+    def _count(self, name, amount=1):
+        if self.stats is not None:
+            self.stats.count(name, amount)
+
+    def _add_duration(self, name, start_time):
+        if self.stats is not None:
+            self.stats.add_duration(name, time.perf_counter() - start_time)
+
+    def download_finished(self, website, start_time):
+        # Stats of a download started at start_time
+        if self.stats is None:
+            return
+        self._add_duration("download", start_time)
+        if website is None:
+            self._count("download_failed")
+        elif website is NotResolvable:
+            self._count("not_resolvable")
+        else:
+            self._count("downloaded")
+            self._count("bytes_downloaded", len(website))
+
     def _is_finished(self):
         return not self.is_crawling or self.has_maximum_sites_processed()
 
@@ -56,86 +156,157 @@ class Crawler:
         return 0 < self.max_sites <= self.processed_sites_count
 
     def process_link(self, link):
-        if self._is_finished():
-            return
-        website = Crawler.download_website(link, self.timeout)
+        try:
+            if self._is_finished():
+                return
+            if not self.is_allowed(link):
+                logging.debug("Website %s not allowed by robots.txt", link)
+                self._count("robots_disallowed")
+                self.link_finished(link)
+                return
+            start_time = time.perf_counter()
+            website, status, headers = Crawler.download_response(link, self.timeout)
+            self.download_finished(website, start_time)
+        finally:
+            self.scheduler.release(link)
         if website is None:
             logging.debug("Website %s not downloaded", link)
         if website is NotResolvable:
             logging.debug("Website %s not resolvable and not trying again.", link)
+            self.link_finished(link)
             return
-        return self, link, website
+        return self, link, website, status, headers
+
+    def is_allowed(self, link):
+        # Downloads the robots.txt of the link's host the first time
+        if self.robots is None:
+            return True
+        if not self.robots.can_fetch(link):
+            return False
+        delay = self.robots.get_crawl_delay(link)
+        if delay is not None:
+            self.scheduler.set_crawl_delay(link, delay)
+        return True
 
     @staticmethod
     def link_got_processed(future):
         if future.done() and future.result() is not None:
-            self, link, website = future.result()
-            if self._is_finished():
-                return
-            if website is None:
-                # revert and try later
-                logging.debug("Website %s not downloaded, retrying later ", link)
-                self.add_link(link)
+            self, link, website, status, headers = future.result()
+            self.website_downloaded(link, website, status, headers)
+
+    def website_downloaded(self, link, website, status=None, headers=None):
+        # Hands a downloaded website over to the website processor, website being None means try again later
+        if self._is_finished():
+            return
+        if website is None:
+            # revert and try later
+            logging.debug("Website %s not downloaded, retrying later ", link)
+            self._count("retries")
+            self.add_link(link)
+            return
+        if self.archive is not None:
+            start_time = time.perf_counter()
+            self._count("bytes_archived", self.archive.add(link, website, status, headers))
+            self._add_duration("archive", start_time)
+        # Block while too many websites are pending, this slows down downloading
+        start_time = time.perf_counter()
+        while not self._is_finished():
+            try:
+                self.pending_websites.put((link, website), timeout=Crawler._BACKPRESSURE_TIMEOUT)
+                self._add_duration("backpressure_wait", start_time)
                 return
-            if not self.has_maximum_sites_processed():
-                self.pending_websites.put((link, website))
+            except Full:
+                continue
+
+    def link_finished(self, link):
+        # The link does not need to be downloaded again when continuing
+        if self.finished_links is not None:
+            self.finished_links.add(link)
 
     def obtain_new_link(self):
+        # The scheduler already skips processed links
         link = None
+        start_time = time.perf_counter()
         while link is None and not self._is_finished():
             try:
-                link = self.pending_links.get(timeout=self.timeout)
+                link = self.scheduler.get(timeout=self.timeout)
             except Empty:
                 logging.info("No more links found to process!")
                 return
-            if link in self.already_processed_links:
-                link = None
-                continue  # already processed
+        self._add_duration("link_wait", start_time)
         if link is not None:
             self.already_processed_links.add(link)
         return link
 
+    def _is_processed(self, link):
+        return link in self.already_processed_links
+
     def process_links(self):
         logging.info("Starting to process links")
         try:
+            # Only obtain a link when a worker is free, so the scheduler decides which host is downloaded next
+            free_workers = threading.Semaphore(self.max_workers)
             with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
                 while not self._is_finished():
-                    # this will submit many many futures when testing with limited maxsites(>0)
-                    # but they will be ignored!
+                    free_workers.acquire()
                     link = self.obtain_new_link()
                     if link is None:
                         return
 
                     future = executor.submit(self.process_link, link)
                     future.add_done_callback(Crawler.link_got_processed)
+                    future.add_done_callback(lambda _: free_workers.release())
 
         finally:
             self.stop()  # ensure crawler is really stopped
 
     def process_website(self, link, website):
-        logging.debug("Starting to parse %s pending links %d", link, self.pending_links.qsize())
-        try:
-            webparser = WebParser(link, website)
-        except ValueError:
+        logging.debug("Starting to parse %s pending links %d", link, self.scheduler.qsize())
+        start_time = time.perf_counter()
+        record = parse_website(link, website, self.extractor)
+        self._add_duration("parse", start_time)
+        self.process_record(link, record)
+
+    def process_record(self, link, record):
+        # Builds the node for the record of the parsed website, record being None if not parsable
+        if record is None:
             logging.debug("Website %s not parsable, ignored but out link kept", link)
+            self._count("not_parsable")
+            self.link_finished(link)
             return
-        web_hash = hash(webparser)
-        if web_hash in self.already_processed_websites:
+        start_time = time.perf_counter()
+        self._process_record(link, record)
+        self._add_duration("process", start_time)
+
+    def _process_record(self, link, record):
+        web_hash = WebParser.hash_content(record[3])
+        self.link_finished(link)
+        node = self.web_net.get_by_content_hash(web_hash)
+        web_simhash = None
+        if node is None and self.near_duplicates is not None:
+            web_simhash = simhash(record[3])
+            node = self.near_duplicates.find(web_simhash)
+        if node is not None:
             # Already processed but with a different url, add this url to node so we know this in the future!
             logging.debug("Website %s already processed (with different url)!", link)
-            node = self.web_net.get_by_content_hash(web_hash)
-            if node is not None:
-                node.add_url(link)
+            self._count("duplicates" if web_simhash is None else "near_duplicates")
+            self.web_net.add_url(node, link)
+            if node.has_node_id():
+                self.unsaved_nodes.append(node)  # stored node that needs to be updated
             return
         logging.info("Processed %d.link %s pending websites %d",
                      self.processed_sites_count + 1, link, self.pending_websites.qsize())
-        self.already_processed_websites.add(web_hash)
         self.processed_sites_count += 1
+        self._count("processed")
 
-        builder = WebNode.Builder(self.link_constraint)
-        builder.init_from_webparser(webparser)
+        builder = WebNode.Builder(self.link_constraint, content_hash=web_hash, simhash=web_simhash,
+                                  guess_missing_language=guess_language if self.guess_languages else None)
+        builder.init_from_record(record)
         webnode = builder.make_node()
         self.web_net.add_node(webnode)
+        if web_simhash is not None:
+            self.near_duplicates.add(web_simhash, webnode)
+        self.unsaved_nodes.append(webnode)
         for link in webnode.get_out_links():
             self.add_link(link)
 
@@ -144,35 +315,128 @@ class Crawler:
         logging.info("Starting to process websites")
         with WebNodeStore(self.store_path, clear_store) as node_store:
             try:
-                while not self._is_finished():
-                    data = self.pending_websites.get(block=True)
-                    if data is None:
-                        break
-                    link, website = data
-                    self.process_website(link, website)
-                node_store.save_webnodes(self.web_net.get_nodes())
+                self.last_flush_time = time.monotonic()
+                if self.parse_workers > 0:
+                    with ProcessPoolExecutor(max_workers=self.parse_workers) as executor:
+                        self._process_websites_parallel(executor, node_store)
+                else:
+                    while not self._is_finished():
+                        data = self._get_pending_website(node_store)
+                        if data is None:
+                            break
+                        link, website = data
+                        self.process_website(link, website)
+                self.flush(node_store)
+                if self.finished_links is not None:
+                    logging.info("Seen set of processed links: %s", self.already_processed_links)
+                if self.write_snapshot:
+                    logging.info("Writing snapshot of the link graph")
+                    GraphSnapshot.from_store(node_store).save(get_snapshot_path(self.store_path))
             finally:
                 self.stop()  # ensure crawler is really stopped
+                self.pending_links.close()
+                if self.archive is not None:
+                    self.archive.close()
+                if self.stats_writer is not None:
+                    self.stats_writer.stop()
+
+    def _get_pending_website(self, node_store):
+        # Waits for the next downloaded website and saves the unsaved nodes meanwhile when they are due
+        start_time = time.perf_counter()
+        while True:
+            if self._is_flush_due():
+                self.flush(node_store)
+                start_time = time.perf_counter()
+            try:
+                data = self.pending_websites.get(timeout=Crawler._FLUSH_CHECK_INTERVAL)
+                self._add_duration("website_wait", start_time)
+                return data
+            except Empty:
+                if self._is_finished():
+                    return
+
+    def _is_flush_due(self):
+        if len(self.unsaved_nodes) == 0:
+            return False
+        return ((0 < self.flush_size <= len(self.unsaved_nodes)) or
+                (0 < self.flush_interval <= time.monotonic() - self.last_flush_time))
+
+    def flush(self, node_store):
+        # Saves the unsaved nodes in one transaction, they are not needed in memory with all their data anymore
+        logging.info("Saving %d nodes", len(self.unsaved_nodes))
+        start_time = time.perf_counter()
+        self._count("saved_nodes", len(self.unsaved_nodes))
+        node_store.save_webnodes(self.unsaved_nodes)
+        for node in self.unsaved_nodes:
+            if node.has_node_id():
+                node.release_content()
+        self.unsaved_nodes = []
+        self.last_flush_time = time.monotonic()
+        self._add_duration("save", start_time)
+        if self.archive is not None:
+            self.archive.flush()
+        if self.finished_links is not None:
+            self.finished_links.save(self._seen_path())
+
+    def _process_websites_parallel(self, executor, node_store):
+        # Parsing happens in the executor's processes, building nodes stays in this thread and in download order.
+        # Keep some more websites in flight than there are workers so that none of them idles.
+        parsing = deque()
+        max_parsing = 2 * self.parse_workers
+        while not self._is_finished():
+            if len(parsing) > 0 and (len(parsing) >= max_parsing or self.pending_websites.empty()):
+                link, future = parsing.popleft()
+                record, parse_seconds = future.result()
+                if self.stats is not None:
+                    self.stats.add_duration("parse", parse_seconds)
+                self.process_record(link, record)
+                continue
+            data = self._get_pending_website(node_store)
+            if data is None:
+                break
+            link, website = data
+            logging.debug("Starting to parse %s pending links %d", link, self.scheduler.qsize())
+            parsing.append((link, executor.submit(_parse_website_timed, link, website, self.extractor)))
+        for _, future in parsing:
+            future.cancel()
+
+    def _seen_path(self):
+        return self.store_path + ".seen"
+
+    def _init_seen(self, clear_store):
+        # Links finished before are processed already, stored links are added again in case the file is outdated
+        if self.seen_error_rate <= 0:
+            return
+        if not clear_store and os.path.isfile(self._seen_path()):
+            self.finished_links = ScalableBloomFilter.load(self._seen_path())
+            logging.info("Loaded finished links: %s", self.finished_links)
+        else:
+            self.finished_links = ScalableBloomFilter(self.seen_error_rate)
+        self.already_processed_links = self.finished_links.copy()
 
     def _init_net(self, clear_store):
         self.web_net = WebNet()
+        self._init_seen(clear_store)
         if not clear_store:
-                # Do not clear the store but add new nodes to it, load and add existing to webnet
+            # Do not clear the store but add new nodes to it, load and add existing to webnet
+            # The stored nodes are streamed and kept without content and out links
             with WebNodeStore(self.store_path, clear=False) as node_store:
-                for node in node_store.load_webnodes(True):
-                    self.already_processed_websites.add(node.get_content_hash())
+                for node in node_store.iter_resume_nodes():
+                    if self.near_duplicates is not None and node.get_simhash() is not None:
+                        self.near_duplicates.add(node.get_simhash(), node)
                     for link in node.get_urls():
                         self.already_processed_links.add(link)
+                        self.link_finished(link)
                     self.web_net.add_node(node)
 
                 # After we marked all already processed links, add new outgoings to restart
                 restart_link_count = 0
                 total_link_out = 0
-                for node in self.web_net:
-                    for link in node.get_out_links():
+                for out_links in node_store.iter_out_links():
+                    for link in out_links:
                         total_link_out += 1
                         if link not in self.already_processed_links:
-                            self.add_link(link)
+                            self.add_link(link, revive=True)
                             restart_link_count += 1
                 logging.info("Restarting with %d links of %d", restart_link_count, total_link_out)
 
@@ -194,29 +458,53 @@ class Crawler:
     def start(self, start_url, clear_store=True):
         logging.info("Starting crawling at %s", start_url)
         self.is_crawling = True
-        self.add_link(start_url)
+        if self.frontier_size > 0:
+            self.pending_links = UrlFrontier(self.store_path + ".frontier", self.frontier_size, clear=clear_store)
+        elif self.seen_error_rate > 0:
+            self.pending_links = UrlFrontier(seen=ScalableBloomFilter(self.seen_error_rate))
+        if self.archive_pages:
+            self.archive = PageArchive(get_archive_path(self.store_path), clear=clear_store)
+        # Buffering more links than the frontier keeps in memory would defeat its memory bound
+        self.scheduler = HostScheduler(self.pending_links, self.min_delay, self.max_per_host,
+                                       max_buffered=self.frontier_size if self.frontier_size > 0 else 10000,
+                                       skip=self._is_processed)
+        if self.stats_writer is not None:
+            self.stats_writer.start()
+        self.add_link(start_url, revive=True)
         self.starting_processor = threading.Thread(target=Crawler._start_async, args=[self, clear_store])
         self.starting_processor.start()
 
-    def add_link(self, link):
+    def add_link(self, link, revive=False):
+        # Links that were added before are ignored, unless revive is set and they are not pending anymore
         link = self.link_constraint.get_valid(link)
         if link is None:
             return
-        self.pending_links.put(link)
+        self.pending_links.put(link, revive)
 
     def stop(self):
         if self.is_crawling:  # Race condition safe (could be executed multiple times)
             logging.info("Stopping crawling")
             self.is_crawling = False
-            self.pending_websites.put(None)  # Ensure threads do not wait forever and exit
+            try:
+                self.pending_websites.put_nowait(None)  # Ensure threads do not wait forever and exit
+            except Full:
+                pass  # not waiting anyways
             self.pending_links.put(None)
 
     @staticmethod
     def download_website(url, timeout):
         # Download and read website
+        return Crawler.download_response(url, timeout)[0]
+
+    @staticmethod
+    def download_response(url, timeout):
+        # The website like download_website returns it and the http status and headers if it was downloaded
         logging.debug("Downloading website %s", url)
+        status, headers = None, None
         try:
-            website = urllib.request.urlopen(url, timeout=timeout).read()
+            with urllib.request.urlopen(url, timeout=timeout) as response:
+                website = response.read()
+                status, headers = response.status, dict(response.headers.items())
         except socket_timeout:
             logging.debug("Timeout error when downloading %s", url)
             website = None
@@ -236,25 +524,25 @@ class Crawler:
         except UnicodeEncodeError:
             logging.debug("(UnicodeEncodeError) error when downloading %s", url)
             website = NotResolvable
-        return website
+        return website, status, headers
 
 
-def crawl_mathy():
-
+def make_mathy_constraint():
     # Build constraint that describes which outgoing WebNode links to follow
     constraint = LinkConstraint('http', 'www.math.kit.edu')
 
     # Prevent downloading links with these endings
     # Frequent candidates: '.png', '.jpg', '.jpeg', '.pdf', '.ico', '.doc', '.txt', '.gz', '.zip', '.tar','.ps',
     # '.docx', '.tex', 'gif', '.ppt', '.m', '.mw', '.mp3', '.wav', '.mp4'
-    forbidden_endings = ['.pdf', '.png', '.ico', '#top']  # for fast exclusion
-    constraint.add_rule(lambda link: all((not link.lower().endswith(ending) for ending in forbidden_endings)))
+    constraint.forbid_endings(['.pdf', '.png', '.ico', '#top'])  # for fast exclusion
 
     # Forbid every point in the last path segment as this likely is a file and we are not interested in it
-    def rule_no_point_in_last_path_segment(link_parsed):
-        split = link_parsed.path.split("/")
-        return len(split) == 0 or "." not in split[-1]
-    constraint.add_rule(rule_no_point_in_last_path_segment, parsed_link=True)
+    constraint.forbid_point_in_last_segment()
+    return constraint
+
+
+def crawl_mathy():
+    constraint = make_mathy_constraint()
 
     # Start the crawler from a start domain, optionally loading already existing nodes
     from pyoogle.config import DATABASE_PATH
@@ -273,12 +561,7 @@ def crawl_spon():
     constraint = LinkConstraint('', 'www.spiegel.de')
 
     # Forbid every point in the last path segment as this likely is a file and we are not interested in it
-    def rule_no_point_in_last_path_segment(link_parsed):
-        split = link_parsed.path.split("/")
-        return len(split) == 0 or ("." not in split[-1] or
-                                   split[-1].lower().endswith(".html") or split[-1].lower().endswith(".htm"))
-
-    constraint.add_rule(rule_no_point_in_last_path_segment, parsed_link=True)
+    constraint.forbid_point_in_last_segment(allowed_endings=[".html", ".htm"])
     path = "/home/daniel/PycharmProjects/PageRank/spon.db"
     c = Crawler(path, constraint)
     c.start("http://www.spiegel.de", clear_store=False)
@@ -0,0 +1,277 @@
+import hashlib
+import logging
+import multiprocessing
+import os
+import sqlite3 as lite
+import threading
+
+from pyoogle.preprocessing.crawl.asynccrawler import AsyncCrawler
+from pyoogle.preprocessing.web.nodestore import WebNodeStore
+
+# A distributed crawl runs one ShardedCrawler per process, on one or several machines. Every crawler owns the links
+# whose hash falls into its shard and sends all other links to their shard through a LinkExchange. The crawlers
+# save to their own stores which merge_stores combines into one store for ranking and searching.
+
+
+def get_shard(link, shards_count):
+    # Stable between processes and machines, unlike hash()
+    digest = hashlib.blake2b(link.encode("utf-8", "surrogatepass"), digest_size=8).digest()
+    return int.from_bytes(digest, "little") % shards_count
+
+
+def get_shard_path(store_path, shard):
+    return "{}.shard{}".format(store_path, shard)
+
+
+def get_exchange_path(store_path):
+    return store_path + ".exchange"
+
+
+class LinkExchange:
+    # Sqlite database through which the shards hand links to each other, on several machines it must be on a shared
+    # file system. Every shard reads the links sent to it in the order they were sent, a link is sent to a shard
+    # only once. Also knows which shards are idle to decide when the whole crawl is done.
+    _LINKS_TABLE_NAME = "Links"
+    _SHARDS_TABLE_NAME = "Shards"
+    _LOCK_TIMEOUT = 60.  # seconds to wait for other processes writing
+    _RECEIVE_SIZE = 10000  # links read at once
+
+    def __init__(self, path, shards_count):
+        self.path = path
+        self.shards_count = shards_count
+        self._lock = threading.Lock()  # the crawler's threads share the connection
+        self._con = lite.connect(path, timeout=LinkExchange._LOCK_TIMEOUT, check_same_thread=False)
+        self._con.execute("PRAGMA journal_mode=WAL")
+        with self._con:
+            self._con.execute("CREATE TABLE IF NOT EXISTS {tn}(Id INTEGER PRIMARY KEY, Shard INTEGER, Url TEXT, "
+                              "UNIQUE(Shard, Url))".format(tn=LinkExchange._LINKS_TABLE_NAME))
+            self._con.execute("CREATE TABLE IF NOT EXISTS {tn}(Shard INTEGER PRIMARY KEY, LastRead INTEGER DEFAULT 0, "
+                              "Idle INTEGER DEFAULT 0, Done INTEGER DEFAULT 0)"
+                              .format(tn=LinkExchange._SHARDS_TABLE_NAME))
+            self._con.executemany("INSERT OR IGNORE INTO {tn} (Shard) VALUES (?)"
+                                  .format(tn=LinkExchange._SHARDS_TABLE_NAME),
+                                  ((shard,) for shard in range(shards_count)))
+
+    @staticmethod
+    def remove(path):
+        for file_path in (path, path + "-wal", path + "-shm"):
+            if os.path.isfile(file_path):
+                os.remove(file_path)
+
+    def send(self, shard_links):
+        # Sends the links of the (shard, link) tuples to their shard
+        with self._lock, self._con:
+            self._con.executemany("INSERT OR IGNORE INTO {tn} (Shard, Url) VALUES (?, ?)"
+                                  .format(tn=LinkExchange._LINKS_TABLE_NAME), shard_links)
+
+    def receive(self, shard):
+        # Links sent to the shard since the last call, if there are any the shard is not idle anymore
+        with self._lock, self._con:
+            cur = self._con.cursor()
+            cur.execute("SELECT LastRead FROM {tn} WHERE Shard=?".format(tn=LinkExchange._SHARDS_TABLE_NAME),
+                        (shard,))
+            last_read = cur.fetchone()[0]
+            cur.execute("SELECT Id, Url FROM {tn} WHERE Shard=? AND Id>? ORDER BY Id LIMIT ?"
+                        .format(tn=LinkExchange._LINKS_TABLE_NAME), (shard, last_read, LinkExchange._RECEIVE_SIZE))
+            rows = cur.fetchall()
+            if len(rows) > 0:
+                cur.execute("UPDATE {tn} SET LastRead=?, Idle=0 WHERE Shard=?"
+                            .format(tn=LinkExchange._SHARDS_TABLE_NAME), (rows[-1][0], shard))
+            cur.close()
+        return [url for _, url in rows]
+
+    def rewind(self, shard):
+        # The shard receives all links sent to it again, for continuing a crawl
+        with self._lock, self._con:
+            self._con.execute("UPDATE {tn} SET LastRead=0, Idle=0, Done=0 WHERE Shard=?"
+                              .format(tn=LinkExchange._SHARDS_TABLE_NAME), (shard,))
+
+    def leave(self, shard):
+        # The shard stopped crawling, do not wait for it anymore
+        with self._lock, self._con:
+            self._con.execute("UPDATE {tn} SET Done=1 WHERE Shard=?".format(tn=LinkExchange._SHARDS_TABLE_NAME),
+                              (shard,))
+
+    def set_busy(self, shard):
+        with self._lock, self._con:
+            self._con.execute("UPDATE {tn} SET Idle=0 WHERE Shard=?".format(tn=LinkExchange._SHARDS_TABLE_NAME),
+                              (shard,))
+
+    def set_idle(self, shard):
+        # Marks the shard idle and returns True if the crawl is done: all shards are idle and received all links
+        with self._lock, self._con:
+            cur = self._con.cursor()
+            # Writing first starts the transaction, so no other shard changes anything until it ends
+            cur.execute("UPDATE {tn} SET Idle=1 WHERE Shard=?".format(tn=LinkExchange._SHARDS_TABLE_NAME), (shard,))
+            cur.execute("SELECT COUNT(*) FROM {tn} WHERE Idle=0 AND Done=0".format(tn=LinkExchange._SHARDS_TABLE_NAME))
+            busy_count = cur.fetchone()[0]
+            cur.execute("SELECT EXISTS(SELECT 1 FROM {ltn} l JOIN {stn} s ON l.Shard=s.Shard "
+                        "WHERE s.Done=0 AND l.Id>s.LastRead)"
+                        .format(ltn=LinkExchange._LINKS_TABLE_NAME, stn=LinkExchange._SHARDS_TABLE_NAME))
+            unread = cur.fetchone()[0]
+            cur.close()
+        return busy_count == 0 and not unread
+
+    def close(self):
+        with self._lock:
+            if self._con is not None:
+                self._con.close()
+                self._con = None
+
+
+class ShardedCrawler(AsyncCrawler):
+    # Crawls the links of one shard of shards_count and saves them to the store get_shard_path(store_path, shard).
+    # All shards of a crawl must be given the same store_path, link constraint and start url. Further arguments
+    # are the ones of the AsyncCrawler.
+    _EXCHANGE_INTERVAL = 0.2  # seconds between sending and receiving links
+
+    def __init__(self, store_path, link_constraint, shard, shards_count, **crawler_args):
+        super().__init__(get_shard_path(store_path, shard), link_constraint, **crawler_args)
+        self.shard = shard
+        self.shards_count = shards_count
+        self.exchange_path = get_exchange_path(store_path)
+        self.exchange = None
+        self.exchange_processor = None
+        self.is_idle = False
+        self.stopped = threading.Event()
+        self._outbox = []  # (shard, link) tuples to send
+        self._outbox_lock = threading.Lock()
+
+    def add_link(self, link, revive=False):
+        valid_link = self.link_constraint.get_valid(link)
+        if valid_link is None:
+            return
+        shard = get_shard(valid_link, self.shards_count)
+        if shard == self.shard:
+            super().add_link(valid_link, revive)
+        else:
+            with self._outbox_lock:
+                self._outbox.append((shard, valid_link))
+
+    def obtain_new_link(self):
+        while True:
+            link = super().obtain_new_link()
+            if link is not None:
+                if self.is_idle:
+                    self.is_idle = False
+                    self.exchange.set_busy(self.shard)
+                return link
+            if self._is_finished():
+                return
+            # No links for a while, but other shards may still send some
+            self.exchange_links()
+            self.is_idle = True
+            if self.exchange.set_idle(self.shard):
+                logging.info("All shards are done")
+                return
+
+    def exchange_links(self):
+        # Sends the links of other shards and adds the links received
+        with self._outbox_lock:
+            outbox, self._outbox = self._outbox, []
+        if len(outbox) > 0:
+            self.exchange.send(outbox)
+        for link in self.exchange.receive(self.shard):
+            self.pending_links.put(link)
+
+    def process_exchange(self):
+        try:
+            while self.is_crawling:
+                self.exchange_links()
+                self.stopped.wait(ShardedCrawler._EXCHANGE_INTERVAL)
+            self.starting_processor.join()
+            self.websites_processor.join()  # links found by the last websites
+            with self._outbox_lock:
+                outbox, self._outbox = self._outbox, []
+            self.exchange.send(outbox)
+            self.exchange.leave(self.shard)
+        finally:
+            self.exchange.close()
+
+    def start(self, start_url, clear_store=True):
+        self.exchange = LinkExchange(self.exchange_path, self.shards_count)
+        if not clear_store:
+            self.exchange.rewind(self.shard)
+        super().start(start_url, clear_store)
+        self.exchange_processor = threading.Thread(target=self.process_exchange)
+        self.exchange_processor.start()
+
+    def stop(self):
+        super().stop()
+        self.stopped.set()
+
+    def join(self):
+        super().join()
+        self.exchange_processor.join()
+
+
+def run_shard(store_path, make_constraint, start_url, shard, shards_count, clear_store=True, crawler_args=None):
+    # Crawls one shard until all shards are done, also for starting shards on other machines
+    crawler = ShardedCrawler(store_path, make_constraint(), shard, shards_count, **(crawler_args or {}))
+    crawler.start(start_url, clear_store)
+    crawler.join()
+    logging.info("Shard %d processed %d sites", shard, crawler.processed_sites_count)
+    return crawler.processed_sites_count
+
+
+_MERGE_BATCH_SIZE = 1000  # nodes saved at once when merging
+
+
+def merge_stores(shard_paths, target_path):
+    # Writes the nodes of all stores to a new store, nodes with the same content in several stores become one node
+    nodes_by_hash = {}
+    merged_nodes = []  # nodes that got urls of another store
+    with WebNodeStore(target_path, clear=True) as target:
+        for path in shard_paths:
+            if not os.path.isfile(path):
+                continue
+            batch = []
+            with WebNodeStore(path) as store:
+                for node in store.iter_webnodes():
+                    existing = nodes_by_hash.get(node.get_content_hash())
+                    if existing is not None:
+                        for url in node.get_urls():
+                            if url not in existing.get_urls():
+                                existing.add_url(url)
+                        merged_nodes.append(existing)
+                        continue
+                    node.set_node_id(None)
+                    nodes_by_hash[node.get_content_hash()] = node
+                    batch.append(node)
+                    if len(batch) >= _MERGE_BATCH_SIZE:
+                        _save_released(target, batch)
+                        batch = []
+            _save_released(target, batch)
+        target.save_webnodes(merged_nodes)
+    logging.info("Merged %d stores into %s with %d nodes", len(shard_paths), target_path, len(nodes_by_hash))
+
+
+def _save_released(store, nodes):
+    store.save_webnodes(nodes)
+    for node in nodes:
+        node.release_content()
+
+
+def crawl_distributed(store_path, make_constraint, start_url, shards_count=os.cpu_count(), clear_store=True,
+                      **crawler_args):
+    # Crawls with shards_count processes on this machine and merges their stores into the store at store_path.
+    # make_constraint must be picklable, like a module level function, as it is called by every process.
+    exchange_path = get_exchange_path(store_path)
+    if clear_store:
+        LinkExchange.remove(exchange_path)
+    LinkExchange(exchange_path, shards_count).close()  # create before the shards try at once
+    processes = [multiprocessing.Process(target=run_shard, args=(store_path, make_constraint, start_url, shard,
+                                                                 shards_count, clear_store, crawler_args))
+                 for shard in range(shards_count)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+    merge_stores([get_shard_path(store_path, shard) for shard in range(shards_count)], store_path)
+    return store_path
+
+
+if __name__ == "__main__":
+    from pyoogle.config import DATABASE_PATH
+    from pyoogle.preprocessing.crawl.crawler import make_mathy_constraint
+    crawl_distributed(DATABASE_PATH, make_mathy_constraint, "http://www.math.kit.edu", clear_store=False)
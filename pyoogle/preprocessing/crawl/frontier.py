@@ -0,0 +1,156 @@
+import sqlite3 as lite
+import os
+import threading
+import time
+from collections import deque
+from queue import Empty
+
+
+class UrlFrontier:
+    # First in first out queue of the links to crawl which ignores links that were put before.
+    # Without a path all links are kept in memory. With a path every link is written to an sqlite database,
+    # only memory_size links are kept in memory and the others are read back from the database when needed.
+    # A handed out link is only marked as done in the database once task_done is called for it, so reopening the
+    # database with clear=False continues with the links that were not handed out or not done yet.
+    # Without a path the links put before are remembered in seen, a set or anything with add and in like a
+    # ScalableBloomFilter that needs much less memory than the strings.
+    # Offers the methods of queue.Queue the crawler uses, putting None wakes up a waiting get and returns None.
+    _TABLE_NAME = "Frontier"
+    _COMMIT_INTERVAL = 1000  # changes until the database is committed
+
+    def __init__(self, path=None, memory_size=10000, clear=False, seen=None):
+        self.path = path
+        self.memory_size = max(1, memory_size)
+        self._memory = deque()  # (id, link) tuples, id is None without database
+        self._seen = seen if seen is not None else set()  # only used without database
+        self._not_empty = threading.Condition()
+        self._con = None
+        self._spilled_count = 0  # pending links only in the database
+        self._last_loaded_id = 0
+        self._handed_out = {}  # ids of the handed out links by link until they are done
+        self._done_ids = []  # done links not yet marked as done in the database
+        self._changes = 0
+        if path is not None:
+            if clear and os.path.isfile(path):
+                os.remove(path)
+            self._open()
+
+    def _open(self):
+        # The frontier is shared by the crawler's threads, access is synchronized by the condition
+        self._con = lite.connect(self.path, check_same_thread=False)
+        cur = self._con.cursor()
+        cur.execute("CREATE TABLE IF NOT EXISTS {tn}(Id INTEGER PRIMARY KEY, Url TEXT UNIQUE, Done INTEGER DEFAULT 0)"
+                    .format(tn=UrlFrontier._TABLE_NAME))
+        cur.execute("SELECT COUNT(*) FROM {tn} WHERE Done=0".format(tn=UrlFrontier._TABLE_NAME))
+        self._spilled_count = cur.fetchone()[0]
+        cur.close()
+        self._con.commit()
+
+    def qsize(self):
+        with self._not_empty:
+            return len(self._memory) + self._spilled_count
+
+    def empty(self):
+        return self.qsize() == 0
+
+    def put(self, link, revive=False):
+        # Adds the link if it was never put before. If revive is set a link that was already handed out is added again.
+        with self._not_empty:
+            if link is None:
+                self._memory.append((None, None))
+            elif self.path is None:
+                if link in self._seen:
+                    return
+                self._seen.add(link)
+                self._memory.append((None, link))
+            elif self._con is None or not self._insert(link, revive):
+                return
+            self._not_empty.notify()
+
+    def _insert(self, link, revive):
+        cur = self._con.cursor()
+        if revive:
+            cur.execute("DELETE FROM {tn} WHERE Url=? AND Done=1".format(tn=UrlFrontier._TABLE_NAME), (link,))
+        cur.execute("INSERT OR IGNORE INTO {tn} (Url) VALUES (?)".format(tn=UrlFrontier._TABLE_NAME), (link,))
+        inserted = cur.rowcount > 0
+        link_id = cur.lastrowid
+        cur.close()
+        if not inserted:
+            return False
+        if self._spilled_count == 0 and len(self._memory) < self.memory_size:
+            self._memory.append((link_id, link))
+            self._last_loaded_id = link_id
+        else:
+            # Keep the order, once links were spilled all newer links are spilled too until they are loaded
+            self._spilled_count += 1
+        self._changed()
+        return True
+
+    def get(self, block=True, timeout=None):
+        with self._not_empty:
+            end_time = None if timeout is None else time.monotonic() + timeout
+            while len(self._memory) == 0 and not self._load():
+                if not block:
+                    raise Empty
+                remaining = None if end_time is None else end_time - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    raise Empty
+                self._not_empty.wait(remaining)
+            link_id, link = self._memory.popleft()
+            if link_id is not None:
+                self._handed_out[link] = link_id
+            return link
+
+    def task_done(self, link):
+        # The handed out link does not need to be handed out again when continuing
+        with self._not_empty:
+            link_id = self._handed_out.pop(link, None)
+            if link_id is not None and self._con is not None:
+                self._done_ids.append(link_id)
+                self._changed()
+
+    def _load(self):
+        # Reads the next spilled links from the database into memory, returns False if there are none
+        if self._spilled_count == 0 or self._con is None:
+            return False
+        cur = self._con.cursor()
+        cur.execute("SELECT Id, Url FROM {tn} WHERE Done=0 AND Id>? ORDER BY Id LIMIT ?"
+                    .format(tn=UrlFrontier._TABLE_NAME), (self._last_loaded_id, self.memory_size))
+        rows = cur.fetchall()
+        cur.close()
+        self._memory.extend(rows)
+        if len(rows) < self.memory_size:
+            self._spilled_count = 0
+        else:
+            self._spilled_count -= len(rows)
+        if len(rows) > 0:
+            self._last_loaded_id = rows[-1][0]
+        return len(rows) > 0
+
+    def _changed(self):
+        self._changes += 1
+        if self._changes >= UrlFrontier._COMMIT_INTERVAL:
+            self._commit()
+
+    def _commit(self):
+        if len(self._done_ids) > 0:
+            self._con.executemany("UPDATE {tn} SET Done=1 WHERE Id=?".format(tn=UrlFrontier._TABLE_NAME),
+                                  ((link_id,) for link_id in self._done_ids))
+            self._done_ids = []
+        self._con.commit()
+        self._changes = 0
+
+    def close(self):
+        with self._not_empty:
+            if self._con is not None:
+                self._commit()
+                self._con.close()
+                self._con = None
+            self._not_empty.notify_all()
+
+    def __enter__(self):
+        return self
+
+    # noinspection PyUnusedLocal
+    def __exit__(self, exc_type=None, exc_val=None, exc_tb=None):
+        self.close()
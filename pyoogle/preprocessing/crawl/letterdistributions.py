@@ -29,6 +29,35 @@ _LETTER_DISTRIBUTIONS = {'de': np.array((6.51, 1.89, 3.06, 5.08, 17.4, 1.66, 3.0
                                         2.361, 0.150, 1.974, 0.074, 0, 0, 0, 0)) / 100}
 
 
+_LANGUAGES = list(_LETTER_DISTRIBUTIONS)
+_DISTRIBUTIONS_MATRIX = np.array([_LETTER_DISTRIBUTIONS[language] for language in _LANGUAGES])  # languages x letters
+_CODE_POINT_TO_INDEX = np.array([_letter_index(chr(code_point)) for code_point in range(256)])  # others are no letter
+
+
+def guess_languages(texts):
+    # Guesses the languages of many texts at once, each text being a string or a sequence of strings.
+    # Same results as _guess_language, but empty texts have no language ''.
+    contents = ["".join(text).upper() for text in texts]
+    lengths = np.array([len(content) for content in contents])
+    code_points = np.frombuffer("".join(contents).encode("utf-32-le"), dtype=np.uint32)
+    text_indices = np.repeat(np.arange(len(contents)), lengths)
+    letter_indices = _CODE_POINT_TO_INDEX[np.minimum(code_points, 255)]
+    letter_indices[code_points > 255] = -1
+    is_letter = letter_indices >= 0
+    counts = np.bincount(text_indices[is_letter] * _LETTER_DISTRIBUTION_LENGTH + letter_indices[is_letter],
+                         minlength=len(contents) * _LETTER_DISTRIBUTION_LENGTH)
+    distributions = counts.reshape(len(contents), _LETTER_DISTRIBUTION_LENGTH) / np.maximum(lengths, 1)[:, None]
+
+    # Distances of every distribution to every language's distribution
+    distances = norm(distributions[:, None, :] - _DISTRIBUTIONS_MATRIX[None, :, :], axis=2)
+    best = np.argmin(distances, axis=1)
+    return [_LANGUAGES[index] if length > 0 else '' for index, length in zip(best, lengths)]
+
+
+def guess_language(text):
+    return guess_languages([text])[0]
+
+
 def _add_letter(distribution, letter):
     letter_index = _letter_index(letter)
     if 0 <= letter_index < _LETTER_DISTRIBUTION_LENGTH:
@@ -36,6 +65,7 @@ def _add_letter(distribution, letter):
 
 
 def _guess_language(text):
+    # One letter at a time, use guess_languages
     distribution = np.zeros(_LETTER_DISTRIBUTION_LENGTH)
     content = "".join(text).upper()
     for letter in content:
@@ -46,9 +76,10 @@ def _guess_language(text):
     differences = [norm(distribution - _LETTER_DISTRIBUTIONS[language]) for language in languages]
     return languages[differences.index(min(differences))]
 
+
 if __name__ == "__main__":
     # de
-    print(_guess_language("Hallo ehrlich esel eigentlich. Wie geht es dir das ist eine Testnachricht. "
+    print(guess_language("Hallo ehrlich esel eigentlich. Wie geht es dir das ist eine Testnachricht. "
                           "Du bist immer dann am besten, jedes Mal. Dein Spiegelbild ist anderen egal"))
     # en
-    print(_guess_language("Hello whats up, this is my test message, I'm Daniel"))
+    print(guess_language("Hello whats up, this is my test message, I'm Daniel"))
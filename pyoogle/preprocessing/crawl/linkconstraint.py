@@ -5,31 +5,95 @@ Created on Sun Feb  7 16:37:16 2016
 @author: daniel
 """
 
+from functools import lru_cache
 from urllib.parse import urlparse
 from urllib.parse import quote
 import re
 
 
 class LinkConstraint:
-    def __init__(self, scheme='', netloc='', use_fragment=False):
+    # Decides which links are followed and normalizes them. Prefer the declared rules (forbid_endings,
+    # forbid_path, forbid_point_in_last_segment) over rules given as functions, they are checked together at once.
+    # Results of get_valid are cached for the last cache_size different links, zero disables caching.
+    def __init__(self, scheme='', netloc='', use_fragment=False, cache_size=100000):
         self.netloc = netloc
         self.scheme = scheme
         self.use_fragment = use_fragment  # if false can ignore fragment (# in url) as it only directs within a website
+        self.cache_size = cache_size
         self.rules = []
         self.rules_parsed_link = []
+        self.forbidden_endings = []  # lower case endings of the whole link
+        self.forbidden_paths = []  # regular expressions searched in the path
+        self.point_in_last_segment_endings = None  # if not None, only these endings may have a point
+        self._compile()
 
     def add_rule(self, rule, parsed_link=False):
         if parsed_link:
             self.rules_parsed_link.append(rule)
         else:
             self.rules.append(rule)
+        self._compile()
+
+    def forbid_endings(self, endings):
+        # Forbids links ending with any of the endings, ignoring case
+        self.forbidden_endings.extend(ending.lower() for ending in endings)
+        self._compile()
+
+    def forbid_path(self, pattern):
+        # Forbids links whose path contains a match of the regular expression
+        self.forbidden_paths.append(pattern)
+        self._compile()
+
+    def forbid_point_in_last_segment(self, allowed_endings=()):
+        # Forbids links whose last path segment contains a point as they are likely files, unless it ends
+        # with one of the allowed endings (ignoring case)
+        if self.point_in_last_segment_endings is None:
+            self.point_in_last_segment_endings = []
+        self.point_in_last_segment_endings.extend(ending.lower() for ending in allowed_endings)
+        self._compile()
+
+    def _compile(self):
+        # Fuses the declared rules and starts a new cache as the results may have changed
+        self._forbidden_endings = tuple(self.forbidden_endings)
+        self._forbidden_path = (re.compile("|".join("(?:%s)" % pattern for pattern in self.forbidden_paths))
+                                if len(self.forbidden_paths) > 0 else None)
+        self._point_endings = (tuple(self.point_in_last_segment_endings)
+                               if self.point_in_last_segment_endings is not None else None)
+        self._cached_get_valid = (lru_cache(maxsize=self.cache_size)(self._get_valid)
+                                  if self.cache_size > 0 else self._get_valid)
+
+    def __getstate__(self):
+        # The cache cannot be pickled, it is rebuilt
+        state = self.__dict__.copy()
+        del state["_cached_get_valid"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._compile()
 
     def get_valid(self, link):
+        # The normalized link or None if it is not followed
+        return self._cached_get_valid(link)
+
+    def _get_valid(self, link):
+        # Cheap checks first, links of other netlocs do not contain //netloc
+        if len(self._forbidden_endings) > 0 and link.lower().endswith(self._forbidden_endings):
+            return
+        if self.netloc and "//" + self.netloc not in link:
+            return
         parsed = urlparse(link, scheme=self.scheme)
         if not self._is_in_netloc(parsed[1]):
             return
         if not self._is_scheme(parsed[0]):
             return
+        path = parsed[2]
+        if self._forbidden_path is not None and self._forbidden_path.search(path) is not None:
+            return
+        if self._point_endings is not None:
+            last_segment = path[path.rfind("/") + 1:]
+            if "." in last_segment and not last_segment.lower().endswith(self._point_endings):
+                return
         if (not all((rule(link) for rule in self.rules)) or
                 not all((rule(parsed) for rule in self.rules_parsed_link))):
             return
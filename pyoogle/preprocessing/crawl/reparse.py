@@ -0,0 +1,121 @@
+import logging
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from pyoogle.preprocessing.crawl.archive import PageArchive, get_archive_path
+from pyoogle.preprocessing.crawl.crawler import Crawler
+from pyoogle.preprocessing.web.extractor import SoupExtractor
+from pyoogle.preprocessing.web.net import WebNet
+from pyoogle.preprocessing.web.nodestore import WebNodeStore
+from pyoogle.preprocessing.web.parser import parse_website
+
+
+def _parse_websites(pages, extractor):
+    # Records of the (link, website) pages, parsed in a worker process
+    return [parse_website(link, website, extractor) for link, website in pages]
+
+
+class ArchiveReparser(Crawler):
+    # Builds a new store from the websites of archives without downloading anything: the websites are parsed by
+    # parse_workers processes and the nodes built like the crawler builds them. The link constraint is applied
+    # again, websites of links it does not accept anymore are left out, the first record of a link is used.
+    # Further arguments are the ones of the Crawler that are about processing websites, like near_duplicate_distance,
+    # flush_size, max_sites, extractor or guess_languages.
+    _BATCH_SIZE = 32  # websites parsed by one task of a worker
+
+    def __init__(self, archive_paths, store_path, link_constraint, parse_workers=os.cpu_count(), **crawler_args):
+        super().__init__(store_path, link_constraint, parse_workers=parse_workers, **crawler_args)
+        self.archive_paths = archive_paths
+
+    def add_link(self, link, revive=False):
+        pass  # nothing is downloaded
+
+    def _iter_pages(self):
+        # The (link, website) pages of the archives that are followed
+        seen_links = set()
+        for path in self.archive_paths:
+            for url, _, _, website in PageArchive.iter_records(path):
+                link = self.link_constraint.get_valid(url)
+                if link is None or link in seen_links:
+                    continue
+                seen_links.add(link)
+                yield link, website
+
+    def _iter_batches(self):
+        batch = []
+        for page in self._iter_pages():
+            batch.append(page)
+            if len(batch) >= ArchiveReparser._BATCH_SIZE:
+                yield batch
+                batch = []
+        if len(batch) > 0:
+            yield batch
+
+    def reparse(self):
+        # Returns the number of websites that became nodes
+        logging.info("Reparsing archives %s into %s", self.archive_paths, self.store_path)
+        self.web_net = WebNet()
+        self.is_crawling = True
+        with WebNodeStore(self.store_path, clear=True) as node_store:
+            self.last_flush_time = time.monotonic()
+            try:
+                if self.parse_workers > 0:
+                    with ProcessPoolExecutor(max_workers=self.parse_workers) as executor:
+                        self._reparse_parallel(executor, node_store)
+                else:
+                    for batch in self._iter_batches():
+                        self._process_batch(batch, _parse_websites(batch, self.extractor), node_store)
+                        if self._is_finished():
+                            break
+                self.flush(node_store)
+            finally:
+                self.is_crawling = False
+        return self.processed_sites_count
+
+    def _reparse_parallel(self, executor, node_store):
+        # Like the crawler keeps some more batches in flight than there are workers and processes them in order
+        parsing = deque()
+        max_parsing = 2 * self.parse_workers
+        for batch in self._iter_batches():
+            parsing.append((batch, executor.submit(_parse_websites, batch, self.extractor)))
+            if len(parsing) >= max_parsing:
+                batch, future = parsing.popleft()
+                self._process_batch(batch, future.result(), node_store)
+                if self._is_finished():
+                    break
+        while len(parsing) > 0 and not self._is_finished():
+            batch, future = parsing.popleft()
+            self._process_batch(batch, future.result(), node_store)
+        for _, future in parsing:
+            future.cancel()
+
+    def _process_batch(self, batch, records, node_store):
+        for (link, _), record in zip(batch, records):
+            if self._is_finished():
+                return
+            self.process_record(link, record)
+        if self._is_flush_due():
+            self.flush(node_store)
+
+
+def reparse_archive(archive_paths, store_path, link_constraint, parse_workers=os.cpu_count(),
+                    extractor=SoupExtractor, **crawler_args):
+    # Rebuilds the store at store_path from the archives, see ArchiveReparser
+    start_time = time.perf_counter()
+    reparser = ArchiveReparser(archive_paths, store_path, link_constraint, parse_workers=parse_workers,
+                               extractor=extractor, **crawler_args)
+    count = reparser.reparse()
+    logging.info("Reparsed %d websites in %.1f seconds", count, time.perf_counter() - start_time)
+    return reparser.web_net
+
+
+if __name__ == "__main__":
+    # Reparses the archive of the default store, for example after changing the parser or the link constraint
+    from pyoogle.config import DATABASE_PATH
+    from pyoogle.preprocessing.crawl.crawler import make_mathy_constraint
+    archive_store_path = sys.argv[1] if len(sys.argv) > 1 else DATABASE_PATH
+    net = reparse_archive([get_archive_path(archive_store_path)], archive_store_path, make_mathy_constraint())
+    logging.info("DONE, webnet contains %d nodes", len(net))
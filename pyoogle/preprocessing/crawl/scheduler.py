@@ -0,0 +1,203 @@
+import heapq
+import itertools
+import logging
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import deque
+from queue import Empty
+from urllib.parse import urlparse, urlunparse
+from urllib.robotparser import RobotFileParser
+
+
+def get_host(link):
+    return urlparse(link).netloc.lower()
+
+
+class _Host:
+    def __init__(self, delay):
+        self.links = deque()  # buffered links of the host
+        self.active = 0  # links handed out and not released yet
+        self.delay = delay
+        self.ready_time = 0.  # time when the next link may be handed out
+        self.scheduled = False  # if the host is in the heap of hosts with links that can be handed out
+
+
+class HostScheduler:
+    # Hands out the links of the frontier spread over their hosts, so that downloading is not limited by the
+    # slowest host. Every host has its own queue of links, at most max_per_host links of a host are handed out
+    # and not released at once (zero for no limit) and links of a host are handed out at least min_delay seconds
+    # apart. The next link is always taken from the host that is ready for the longest time.
+    # Up to max_buffered links are taken from the frontier in advance, links for which skip returns true are dropped.
+    # A link is done in the frontier (see UrlFrontier.task_done) when it is released or dropped, buffered links are not,
+    # so a frontier with a database hands them out again when continuing.
+    # Only one thread may get links, any thread may release them.
+    _POLL_INTERVAL = 0.05  # seconds until waiting for a ready host checks the frontier for new links
+
+    def __init__(self, frontier, min_delay=0., max_per_host=0, max_buffered=10000, skip=None):
+        self.frontier = frontier
+        self.min_delay = min_delay
+        self.max_per_host = max_per_host
+        self.max_buffered = max(1, max_buffered)
+        self.skip = skip
+        self.hosts = {}
+        self._ready = []  # heap of (ready time, counter, host name) of the scheduled hosts
+        self._counter = itertools.count()  # keeps hosts with the same ready time in insertion order
+        self._buffered_count = 0
+        self._changed = threading.Condition()
+
+    def qsize(self):
+        with self._changed:
+            return self._buffered_count + self.frontier.qsize()
+
+    def get(self, timeout=None):
+        # Blocks until a link can be handed out. Returns None if the frontier returned None (crawling stopped)
+        # and raises Empty if there was no link for timeout seconds. While links are buffered but their hosts are
+        # not ready this does not time out.
+        end_time = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._changed:
+                if not self._fill():
+                    return
+                link, wait = self._pop_ready(time.monotonic())
+                if link is not None:
+                    return link
+                if self._buffered_count > 0:
+                    self._changed.wait(min(wait, HostScheduler._POLL_INTERVAL))
+                    continue
+            # Nothing buffered, wait for the frontier without blocking releasing
+            remaining = None if end_time is None else end_time - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                raise Empty
+            link = self.frontier.get(timeout=remaining)
+            if link is None:
+                return
+            with self._changed:
+                self._add(link)
+
+    def release(self, link):
+        # The download of the handed out link finished
+        with self._changed:
+            host = self.hosts.get(get_host(link))
+            if host is None or host.active == 0:
+                return
+            self.frontier.task_done(link)
+            host.active -= 1
+            self._schedule(get_host(link), host)
+            self._changed.notify()
+
+    def set_crawl_delay(self, link, delay):
+        # The host of the link asks for this delay, at least min_delay is kept
+        with self._changed:
+            host = self._get_host(get_host(link))
+            host.delay = max(self.min_delay, delay)
+
+    def _get_host(self, name):
+        host = self.hosts.get(name)
+        if host is None:
+            host = _Host(self.min_delay)
+            self.hosts[name] = host
+        return host
+
+    def _fill(self):
+        # Buffers the links pending in the frontier, returns False if it returned None
+        while self._buffered_count < self.max_buffered:
+            try:
+                link = self.frontier.get(block=False)
+            except Empty:
+                break
+            if link is None:
+                return False
+            self._add(link)
+        return True
+
+    def _add(self, link):
+        if self.skip is not None and self.skip(link):
+            self.frontier.task_done(link)
+            return
+        name = get_host(link)
+        host = self._get_host(name)
+        host.links.append(link)
+        self._buffered_count += 1
+        self._schedule(name, host)
+
+    def _schedule(self, name, host):
+        if (not host.scheduled and len(host.links) > 0 and
+                (self.max_per_host <= 0 or host.active < self.max_per_host)):
+            heapq.heappush(self._ready, (host.ready_time, next(self._counter), name))
+            host.scheduled = True
+
+    def _pop_ready(self, now):
+        # The next link of the host ready the longest or None and the seconds until the next host is ready
+        if len(self._ready) == 0:
+            return None, HostScheduler._POLL_INTERVAL
+        ready_time, _, name = self._ready[0]
+        if ready_time > now:
+            return None, ready_time - now
+        heapq.heappop(self._ready)
+        host = self.hosts[name]
+        host.scheduled = False
+        link = host.links.popleft()
+        self._buffered_count -= 1
+        host.active += 1
+        host.ready_time = now + host.delay
+        self._schedule(name, host)
+        return link, 0.
+
+
+class RobotsCache:
+    # The robots.txt of every host, downloaded when a link of the host is checked for the first time.
+    # Hosts without robots.txt or where it cannot be downloaded allow everything.
+    def __init__(self, user_agent="*", timeout=30):
+        self.user_agent = user_agent
+        self.timeout = timeout
+        self.parsers = {}
+        self._host_locks = {}
+        self._lock = threading.Lock()
+
+    def can_fetch(self, link):
+        return self._get_parser(link).can_fetch(self.user_agent, link)
+
+    def get_crawl_delay(self, link):
+        # Seconds between requests asked for by the host or None
+        parser = self._get_parser(link)
+        delay = parser.crawl_delay(self.user_agent)
+        rate = parser.request_rate(self.user_agent)
+        if rate is not None and rate.requests > 0:
+            delay = max(delay or 0, rate.seconds / rate.requests)
+        return delay
+
+    def _get_parser(self, link):
+        name = get_host(link)
+        parser = self.parsers.get(name)
+        if parser is not None:
+            return parser
+        with self._lock:
+            host_lock = self._host_locks.setdefault(name, threading.Lock())
+        with host_lock:  # download only once, but do not block other hosts meanwhile
+            parser = self.parsers.get(name)
+            if parser is None:
+                parser = self._download(link)
+                self.parsers[name] = parser
+        return parser
+
+    def _download(self, link):
+        parsed = urlparse(link)
+        robots_url = urlunparse((parsed.scheme, parsed.netloc, "/robots.txt", "", "", ""))
+        parser = RobotFileParser(robots_url)
+        logging.debug("Downloading %s", robots_url)
+        try:
+            raw = urllib.request.urlopen(robots_url, timeout=self.timeout).read()
+            parser.parse(raw.decode("utf-8", errors="replace").splitlines())
+        except urllib.error.HTTPError as err:
+            if err.code in (401, 403):
+                parser.disallow_all = True
+            else:
+                parser.allow_all = True
+            parser.modified()
+        except (OSError, ValueError) as err:
+            logging.debug("Could not download %s %s", robots_url, err)
+            parser.allow_all = True
+            parser.modified()
+        return parser
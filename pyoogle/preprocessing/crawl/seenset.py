@@ -0,0 +1,139 @@
+import hashlib
+import math
+import struct
+import threading
+
+
+def _hash_pair(link):
+    # Two independent 64 bit hashes, stable between processes unlike hash()
+    digest = hashlib.blake2b(link.encode("utf-8", "surrogatepass"), digest_size=16).digest()
+    first, second = struct.unpack("<QQ", digest)
+    return first, second | 1  # odd step, so the positions do not repeat
+
+
+class BloomFilter:
+    # Set of fixed capacity that only stores some bits per element. Contains all added elements, but also
+    # other elements with a probability of about error_rate as long as not more than capacity elements are added.
+    def __init__(self, capacity, error_rate, bits=None, count=0):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.bits_count = max(8, int(math.ceil(-capacity * math.log(error_rate) / (math.log(2) ** 2))))
+        self.hashes_count = max(1, int(round(self.bits_count / capacity * math.log(2))))
+        self.bits = bits if bits is not None else bytearray((self.bits_count + 7) // 8)
+        self.count = count
+
+    def _positions(self, hash_pair):
+        first, second = hash_pair
+        return ((first + index * second) % self.bits_count for index in range(self.hashes_count))
+
+    def add(self, hash_pair):
+        # Returns False if the element was (likely) already contained
+        added = False
+        bits = self.bits
+        for position in self._positions(hash_pair):
+            mask = 1 << (position & 7)
+            if not bits[position >> 3] & mask:
+                bits[position >> 3] |= mask
+                added = True
+        if added:
+            self.count += 1
+        return added
+
+    def contains(self, hash_pair):
+        bits = self.bits
+        return all(bits[position >> 3] & (1 << (position & 7)) for position in self._positions(hash_pair))
+
+    def is_full(self):
+        return self.count >= self.capacity
+
+    def estimated_error(self):
+        return (1. - math.exp(-self.hashes_count * self.count / self.bits_count)) ** self.hashes_count
+
+
+class ScalableBloomFilter:
+    # Set of links for the crawler that needs only a few bytes per link no matter how long it is.
+    # Whenever a bloom filter is full a bigger one with a smaller error rate is added, so that the probability
+    # that a link not added is contained stays below error_rate however many links are added.
+    # Adding is thread safe.
+    _GROWTH = 2  # capacity of each filter compared to the previous one
+    _TIGHTENING = 0.5  # error rate of each filter compared to the previous one
+    _FILE_HEADER = struct.Struct("<4sdQI")
+    _FILE_FILTER_HEADER = struct.Struct("<QdQQ")
+    _FILE_MAGIC = b"PYSB"
+
+    def __init__(self, error_rate=0.001, initial_capacity=100000):
+        if not 0 < error_rate < 1:
+            raise ValueError("Error rate must be between 0 and 1.")
+        self.error_rate = error_rate
+        self.initial_capacity = initial_capacity
+        self.filters = []
+        self._lock = threading.Lock()
+
+    def _add_filter(self):
+        index = len(self.filters)
+        capacity = self.initial_capacity * ScalableBloomFilter._GROWTH ** index
+        # The error rates of all filters sum up to at most error_rate
+        error_rate = self.error_rate * (1 - ScalableBloomFilter._TIGHTENING) * ScalableBloomFilter._TIGHTENING ** index
+        self.filters.append(BloomFilter(capacity, error_rate))
+
+    def add(self, link):
+        hash_pair = _hash_pair(link)
+        with self._lock:
+            if any(bloom.contains(hash_pair) for bloom in self.filters):
+                return
+            if len(self.filters) == 0 or self.filters[-1].is_full():
+                self._add_filter()
+            self.filters[-1].add(hash_pair)
+
+    def __contains__(self, link):
+        hash_pair = _hash_pair(link)
+        return any(bloom.contains(hash_pair) for bloom in self.filters)
+
+    def __len__(self):
+        # Amount of added links, links that were thought to be contained already are not counted
+        return sum(bloom.count for bloom in self.filters)
+
+    def copy(self):
+        other = ScalableBloomFilter(self.error_rate, self.initial_capacity)
+        with self._lock:
+            other.filters = [BloomFilter(bloom.capacity, bloom.error_rate, bytearray(bloom.bits), bloom.count)
+                             for bloom in self.filters]
+        return other
+
+    def memory_usage(self):
+        # Bytes used for the bits
+        return sum(len(bloom.bits) for bloom in self.filters)
+
+    def estimated_error(self):
+        # Probability that a link that was not added is contained
+        probability_none = 1.
+        for bloom in self.filters:
+            probability_none *= 1. - bloom.estimated_error()
+        return 1. - probability_none
+
+    def save(self, path):
+        with self._lock, open(path, "wb") as file:
+            file.write(ScalableBloomFilter._FILE_HEADER.pack(ScalableBloomFilter._FILE_MAGIC, self.error_rate,
+                                                             self.initial_capacity, len(self.filters)))
+            for bloom in self.filters:
+                file.write(ScalableBloomFilter._FILE_FILTER_HEADER.pack(bloom.capacity, bloom.error_rate,
+                                                                        bloom.count, len(bloom.bits)))
+                file.write(bloom.bits)
+
+    @staticmethod
+    def load(path):
+        with open(path, "rb") as file:
+            magic, error_rate, initial_capacity, filters_count = ScalableBloomFilter._FILE_HEADER.unpack(
+                file.read(ScalableBloomFilter._FILE_HEADER.size))
+            if magic != ScalableBloomFilter._FILE_MAGIC:
+                raise ValueError("Not a saved ScalableBloomFilter: " + path)
+            seen = ScalableBloomFilter(error_rate, initial_capacity)
+            for _ in range(filters_count):
+                capacity, bloom_error_rate, count, bits_length = ScalableBloomFilter._FILE_FILTER_HEADER.unpack(
+                    file.read(ScalableBloomFilter._FILE_FILTER_HEADER.size))
+                seen.filters.append(BloomFilter(capacity, bloom_error_rate, bytearray(file.read(bits_length)), count))
+        return seen
+
+    def __str__(self):
+        return "{} links in {} bytes, estimated error {:.2g}".format(len(self), self.memory_usage(),
+                                                                      self.estimated_error())
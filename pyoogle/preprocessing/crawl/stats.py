@@ -0,0 +1,104 @@
+import bisect
+import json
+import threading
+import time
+
+
+class Histogram:
+    # Counts values in buckets whose upper bounds roughly double, enough to estimate percentiles of durations
+    BOUNDS = (0.0005, 0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1., 2., 5., 10., 30., 60.)
+
+    def __init__(self):
+        self.counts = [0] * (len(Histogram.BOUNDS) + 1)  # the last bucket has no upper bound
+        self.count = 0
+        self.sum = 0.
+        self.max = 0.
+
+    def add(self, value):
+        self.counts[bisect.bisect_left(Histogram.BOUNDS, value)] += 1
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+    def get_percentile(self, fraction):
+        # Upper bound of the bucket containing the percentile, the maximum for the last bucket
+        if self.count == 0:
+            return 0.
+        rank = fraction * self.count
+        total = 0
+        for index, count in enumerate(self.counts):
+            total += count
+            if total >= rank and count > 0:
+                return min(Histogram.BOUNDS[index], self.max) if index < len(Histogram.BOUNDS) else self.max
+        return self.max
+
+    def snapshot(self):
+        return {"count": self.count,
+                "sum": self.sum,
+                "mean": self.sum / self.count if self.count > 0 else 0.,
+                "p50": self.get_percentile(0.5),
+                "p90": self.get_percentile(0.9),
+                "p99": self.get_percentile(0.99),
+                "max": self.max,
+                "buckets": {("le_%g" % bound if index < len(Histogram.BOUNDS) else "inf"): count
+                            for index, (bound, count) in enumerate(zip(Histogram.BOUNDS + (None,), self.counts))
+                            if count > 0}}
+
+
+class CrawlStats:
+    # Counters and histograms of durations of the stages of a crawl, used by all the crawler's threads
+    def __init__(self):
+        self.counters = {}
+        self.histograms = {}
+        self.start_time = time.time()
+        self._lock = threading.Lock()
+
+    def count(self, name, amount=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def add_duration(self, name, seconds):
+        with self._lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = Histogram()
+                self.histograms[name] = histogram
+            histogram.add(seconds)
+
+    def snapshot(self):
+        with self._lock:
+            return {"elapsed": time.time() - self.start_time,
+                    "counters": dict(self.counters),
+                    "durations": {name: histogram.snapshot() for name, histogram in self.histograms.items()}}
+
+
+class StatsWriter:
+    # Appends the snapshot returned by get_snapshot as a json line to the file every interval seconds
+    # and once more when stopped
+    def __init__(self, path, get_snapshot, interval=10.):
+        self.path = path
+        self.get_snapshot = get_snapshot
+        self.interval = interval
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            self.write()
+
+    def write(self):
+        with open(self.path, "a") as file:
+            file.write(json.dumps(self.get_snapshot()) + "\n")
+
+    def stop(self):
+        if self._stopped.is_set():
+            return
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.write()
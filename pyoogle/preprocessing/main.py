@@ -1,5 +1,6 @@
 from pyoogle.preprocessing.crawl.crawler import crawl_mathy
 from pyoogle.preprocessing.web.nodestore import WebNodeStore
+from pyoogle.preprocessing.web.snapshot import GraphSnapshot, export_snapshot
 
 
 path, webnet = crawl_mathy()
@@ -8,6 +9,8 @@ if webnet is not None:
     from pyoogle.preprocessing.ranking.ranker import BaseRanker
     ranker = BaseRanker()
     print("Starting ranking webnet with", ranker)
-    ranker.rank(webnet)
+    # The crawler's webnet holds nodes of previous crawls without out links, so rank the snapshot of the store
+    snapshot = GraphSnapshot.load(export_snapshot(path))
+    importances = ranker.rank_snapshot(snapshot)
     with WebNodeStore(database_path=path) as store:
-        store.save_webnodes(webnet.get_nodes())
+        store.save_importances(snapshot.node_ids, importances)
@@ -0,0 +1,318 @@
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+from scipy.sparse import lil_matrix
+
+from pyoogle.preprocessing.ranking.blockrank import BlockRanker, make_url_blocks
+from pyoogle.preprocessing.ranking.outofcore import OutOfCoreRanker
+from pyoogle.preprocessing.ranking.ranker import BaseRanker, TeleportRanker, PersonalizedRanker, make_group_teleports
+from pyoogle.preprocessing.ranking.solvers import (PowerSolver, GaussSeidelSolver, ExtrapolationSolver,
+                                                   AdaptiveSolver, LocalUpdateSolver)
+from pyoogle.preprocessing.web.benchmark import make_synthetic_nodes
+from pyoogle.preprocessing.web.net import WebNet, make_csr
+from pyoogle.preprocessing.web.node import WebNode
+from pyoogle.preprocessing.web.snapshot import GraphSnapshot, export_snapshot, get_snapshot_path
+
+
+def make_synthetic_net(nodes_count, out_degree=10, dangling_fraction=0.1, seed=42):
+    # Net of nodes linking to out_degree random nodes, some of them link only to urls outside of the net
+    webnet = WebNet()
+    for index, node in enumerate(make_synthetic_nodes(nodes_count, out_degree, seed)):
+        if dangling_fraction > 0 and index % int(1 / dangling_fraction) == 0:
+            node.out_links[:] = ["http://www.example.com/outside/%d" % index]
+        webnet.add_node(node)
+    return webnet
+
+
+def make_host_net(hosts_count=50, pages_per_host=200, out_degree=10, cross_fraction=0.02, seed=42):
+    # Net of hosts whose pages link to pages of the same host and only a cross_fraction of the links go to other
+    # hosts, like websites. Every page links to the host's start page, later pages link to earlier ones more often.
+    rand = random.Random(seed)
+    url = "http://www.host{}.example/page{}"
+    webnet = WebNet()
+    for host in range(hosts_count):
+        for page in range(pages_per_host):
+            out_links = [url.format(host, 0)]
+            for _ in range(out_degree - 1):
+                if rand.random() < cross_fraction:
+                    out_links.append(url.format(rand.randrange(hosts_count), rand.randrange(pages_per_host)))
+                else:
+                    out_links.append(url.format(host, int(pages_per_host * rand.random() ** 2)))
+            webnet.add_node(WebNode([url.format(host, page)], None, out_links, "en", "",
+                                    node_id=host * pages_per_host + page + 1))
+    return webnet
+
+
+def add_host_pages(webnet, host, count, out_degree=10, seed=42):
+    # Adds count new pages to the host of a net of make_host_net, like a recrawl finding them. They link to the
+    # host's start page, the new page before them and random pages of the host.
+    rand = random.Random(seed)
+    url = "http://www.host{}.example/page{}"
+    pages = [int(node.get_urls()[0].rsplit("page", 1)[1]) for node in webnet
+             if node.get_urls()[0].startswith("http://www.host{}.example/".format(host))]
+    for page in range(max(pages) + 1, max(pages) + 1 + count):
+        out_links = [url.format(host, 0), url.format(host, page - 1)]
+        out_links.extend(url.format(host, rand.choice(pages)) for _ in range(out_degree - 2))
+        webnet.add_node(WebNode([url.format(host, page)], None, out_links, "en", "", node_id=len(webnet) + 1))
+
+
+def make_random_snapshot(nodes_count, out_degree=10, dangling_fraction=0.1, seed=42):
+    # Snapshot of nodes linking to out_degree random nodes like make_synthetic_net, made without nodes for large sizes
+    rand = np.random.RandomState(seed)
+    sources = np.repeat(np.arange(nodes_count, dtype=np.int64), out_degree)
+    targets = rand.randint(0, nodes_count, len(sources)).astype(np.int32)
+    if dangling_fraction > 0:
+        linking = sources % int(1 / dangling_fraction) != 0
+        sources, targets = sources[linking], targets[linking]
+    indptr, indices = make_csr(sources, targets, nodes_count)
+    return GraphSnapshot(np.arange(1, nodes_count + 1, dtype=np.int64), indptr, indices)
+
+
+def _build_matrix_lil(webnet):
+    # The matrix like BaseRanker built it before, entry by entry, for nodes with node ids 1 to n
+    nodes_count = len(webnet)
+    # noinspection PyPep8Naming
+    M = lil_matrix((nodes_count, nodes_count))
+    rows_without_out_links = []
+    for index, node in enumerate(webnet):
+        out_count = 0
+        for out_link in node.get_out_links():
+            out_node = webnet.get_by_url(out_link)
+            if out_node is not None:
+                M[index, out_node.get_node_id() - 1] = 1
+                out_count += 1
+        if out_count > 0:
+            M[index, :] /= out_count
+        else:
+            rows_without_out_links.append(index)
+    for row in rows_without_out_links:
+        M[row, :] = 1. / nodes_count
+    return M.tocsr().transpose()
+
+
+def benchmark_build_matrix(sizes=(1000, 5000, 10000, 100000, 1000000), max_lil_size=10000, out_degree=10,
+                           dangling_fraction=0.1):
+    # Prints the seconds building the matrix takes by graph size, entry by entry only for the smaller graphs
+    # as it takes too long for the others. Checks that both build the same matrix apart from the columns
+    # of nodes without links, which are not filled anymore.
+    results = {}
+    for nodes_count in sizes:
+        webnet = make_synthetic_net(nodes_count, out_degree, dangling_fraction)
+        ranker = BaseRanker(progress_interval=None)
+        ranker.webnet = webnet
+        ranker._init_mapping()
+        start_time = time.perf_counter()
+        ranker._build_matrix()
+        vectorized_seconds = time.perf_counter() - start_time
+        lil_seconds = None
+        if nodes_count <= max_lil_size:
+            start_time = time.perf_counter()
+            expected = _build_matrix_lil(webnet)
+            lil_seconds = time.perf_counter() - start_time
+            expected[:, ranker.dangling] = 0
+            if abs(expected - ranker.matrix).max() > 1e-12:
+                print("Matrices of size", nodes_count, "differ!")
+        results[nodes_count] = (vectorized_seconds, lil_seconds)
+        print("{} nodes, {} links: vectorized {:.3f} s{}".format(
+            nodes_count, ranker.matrix.nnz, vectorized_seconds,
+            ", entry by entry {:.3f} s".format(lil_seconds) if lil_seconds is not None else ""))
+    return results
+
+
+def check_dangling_parity(nodes_count=2000, out_degree=10, dangling_fraction=0.1, teleport_prop=0.1, eps=1e-10):
+    # Ranks with the dangling nodes' columns filled in the matrix like before and with them handled in the power
+    # method step, prints and returns the largest difference of the importances and the entries of both matrices
+    webnet = make_synthetic_net(nodes_count, out_degree, dangling_fraction)
+    implicit = TeleportRanker(teleport_prop, progress_interval=None)
+    implicit.rank(webnet, eps=eps, max_iter=1000)
+    explicit = TeleportRanker(teleport_prop, progress_interval=None)
+    explicit.matrix = _build_matrix_lil(webnet).tocsr()
+    explicit.dangling = np.zeros(0, dtype=np.int64)
+    explicit._calculate_importances(eps=eps, max_iter=1000)
+    difference = np.abs(implicit.importances - explicit.importances).max()
+    print("Dangling nodes implicit: {} matrix entries instead of {}, importances differ by at most {:.2e}"
+          .format(implicit.matrix.nnz, explicit.matrix.nnz, difference))
+    return difference
+
+
+def make_solvers():
+    return [PowerSolver(), GaussSeidelSolver(), ExtrapolationSolver(ExtrapolationSolver.AITKEN),
+            ExtrapolationSolver(ExtrapolationSolver.QUADRATIC), AdaptiveSolver()]
+
+
+def benchmark_solvers(snapshots, teleport_props=(0.15, 0.1, 0.05), eps=1e-8):
+    # Prints iterations and seconds until every solver reaches eps and its distance to the exact importances
+    # for the (name, GraphSnapshot) tuples
+    results = {}
+    for name, snapshot in snapshots:
+        for teleport_prop in teleport_props:
+            exact = TeleportRanker(teleport_prop, progress_interval=None).rank_snapshot(snapshot, eps=1e-14,
+                                                                                     max_iter=100000)
+            print("{} ({} nodes, {} links), teleport {}:".format(name, len(snapshot), snapshot.get_edges_count(),
+                                                                 teleport_prop))
+            for solver in make_solvers():
+                ranker = TeleportRanker(teleport_prop, progress_interval=None, solver=solver)
+                importances = ranker.rank_snapshot(snapshot, eps=eps, max_iter=10000)
+                error = np.abs(importances - exact).sum()
+                results[(name, teleport_prop, str(solver))] = (ranker.report, error)
+                print("\t{:<26} {:>5} iterations {:>8.3f} s  error {:.1e}".format(
+                    str(solver), ranker.report.iterations, ranker.report.seconds, error))
+    return results
+
+
+def benchmark_warm_start(hosts_count=200, pages_per_host=500, new_pages=(10, 100, 1000), teleport_prop=0.15,
+                         eps=1e-6):
+    # Ranks a host net, adds new pages to one host and ranks again from equally distributed importances (cold),
+    # from the last importances (warm) and with local updates from them. Prints iterations, updated importances,
+    # seconds and the distance to the exact importances by the total number of new pages.
+    webnet = make_host_net(hosts_count, pages_per_host)
+    last = TeleportRanker(teleport_prop, progress_interval=None).rank_snapshot(
+        GraphSnapshot.from_webnet(webnet), eps=1e-12, max_iter=10000)
+    results = {}
+    added = 0
+    for count in new_pages:
+        add_host_pages(webnet, 0, count - added, seed=count)
+        added = count
+        snapshot = GraphSnapshot.from_webnet(webnet)
+        start = np.concatenate((last, np.full(added, -1.)))  # the new pages were added last
+        exact = TeleportRanker(teleport_prop, progress_interval=None).rank_snapshot(snapshot, eps=1e-12,
+                                                                                 max_iter=10000)
+        print("{} nodes, {} of them new:".format(len(snapshot), added))
+        for name, solver, solver_start in (("Cold", PowerSolver(), None), ("Warm", PowerSolver(), start),
+                                           ("Local update", LocalUpdateSolver(), start)):
+            ranker = TeleportRanker(teleport_prop, progress_interval=None, solver=solver)
+            importances = ranker.rank_snapshot(snapshot, eps=eps, max_iter=10000, start=solver_start)
+            report = ranker.report
+            updates = report.updates if report.updates is not None else report.iterations * len(snapshot)
+            error = np.abs(importances - exact).sum()
+            results[(added, name)] = (report, error)
+            print("\t{:<13} {:>4} iterations {:>10} updates {:>8.3f} s  error {:.1e}".format(
+                name, report.iterations, updates, report.seconds, error))
+    return results
+
+
+def benchmark_personalized(hosts_count=200, pages_per_host=500, counts=(1, 4, 16, 64), teleport_prop=0.15,
+                           eps=1e-8):
+    # Ranks a host net for teleport distributions biased towards count hosts at once and one after another, prints
+    # the seconds of both and of the uniform TeleportRanker and checks that both give the same importances
+    webnet = make_host_net(hosts_count, pages_per_host)
+    snapshot = GraphSnapshot.from_webnet(webnet)
+    ranker = TeleportRanker(teleport_prop, progress_interval=None)
+    ranker.rank_snapshot(snapshot, eps=eps)
+    print("{} nodes, {} links, uniform teleport {:.3f} s".format(len(snapshot), snapshot.get_edges_count(),
+                                                                 ranker.report.seconds))
+    hosts = [node.get_urls()[0].split("/")[2] for node in webnet]
+    results = {}
+    for count in counts:
+        chosen = set(hosts[::pages_per_host][:count])
+        names, teleports = make_group_teleports([host if host in chosen else None for host in hosts], "site:")
+        batched = PersonalizedRanker(names, teleports, teleport_prop, progress_interval=None)
+        batched_importances = batched.rank_snapshot(snapshot, eps=eps)
+        single_seconds, difference = 0., 0.
+        for column, name in enumerate(names):
+            single = PersonalizedRanker([name], teleports[:, column:column + 1], teleport_prop, progress_interval=None)
+            single_importances = single.rank_snapshot(snapshot, eps=eps)
+            single_seconds += single.report.seconds
+            difference = max(difference, np.abs(single_importances[:, 0] - batched_importances[:, column]).sum())
+        results[count] = (batched.report.seconds, single_seconds, difference)
+        print("\t{:>3} teleports: at once {:>4} iterations {:.3f} s, one after another {:.3f} s, differ by {:.1e}"
+              .format(count, batched.report.iterations, batched.report.seconds, single_seconds, difference))
+    return results
+
+
+def benchmark_out_of_core(nodes_count=2000000, out_degree=10, memory_budget=1 << 27, processes=None,
+                          teleport_prop=0.15, eps=1e-8):
+    # Ranks a random snapshot in memory and out of core with a pool of 1, 2, 4, ... processes up to the cores,
+    # prints seconds, peak memory of the ranking process, distance to the importances in memory and the speedup.
+    # The memory of the processes multiplying blocks is within the budget as well but not measured.
+    cores = multiprocessing.cpu_count()
+    processes = processes or sorted(set([2 ** power for power in range(cores.bit_length())] + [cores]))
+    results = {}
+    with tempfile.TemporaryDirectory() as path:
+        make_random_snapshot(nodes_count, out_degree).save(path)
+        snapshot = GraphSnapshot.load(path)
+        tracemalloc.start()
+        ranker = TeleportRanker(teleport_prop, progress_interval=None)
+        expected = ranker.rank_snapshot(snapshot, eps=eps)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        print("{} nodes, {} links, {} cores: in memory {:.3f} s, peak {:.0f} MB, memory budget {:.0f} MB".format(
+            nodes_count, snapshot.get_edges_count(), multiprocessing.cpu_count(), ranker.report.seconds,
+            peak / 2 ** 20, memory_budget / 2 ** 20))
+        start_time = time.perf_counter()
+        snapshot.write_in_links(OutOfCoreRanker(memory_budget=memory_budget, processes=1).get_max_links(nodes_count))
+        print("\tWriting in links {:.3f} s".format(time.perf_counter() - start_time))
+        for processes_count in processes:
+            tracemalloc.start()
+            ranker = OutOfCoreRanker(teleport_prop, processes_count, memory_budget, progress_interval=None)
+            importances = ranker.rank_snapshot(snapshot, eps=eps)
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            results[processes_count] = (ranker.report.seconds, peak, np.abs(importances - expected).sum())
+            print("\t{:>2} processes: {:.3f} s, peak {:.0f} MB, differ by {:.1e}, speedup {:.2f}".format(
+                processes_count, ranker.report.seconds, peak / 2 ** 20, results[processes_count][2],
+                results[processes[0]][0] / ranker.report.seconds))
+    return results
+
+
+def benchmark_block_rank(snapshots, teleport_props=(0.15, 0.05), eps=1e-8):
+    # Ranks the (name, GraphSnapshot, blocks) tuples cold and from the BlockRank start vector, prints the global
+    # iterations, the seconds of the start vector and of all and the distance to the exact importances. The block
+    # ranker needs fewer global iterations, but its start vector takes most of the time they save.
+    results = {}
+    for name, snapshot, blocks in snapshots:
+        for teleport_prop in teleport_props:
+            exact = TeleportRanker(teleport_prop, progress_interval=None).rank_snapshot(snapshot, eps=1e-14,
+                                                                                     max_iter=100000)
+            print("{} ({} nodes, {} links, {} blocks), teleport {}:".format(
+                name, len(snapshot), snapshot.get_edges_count(), int(blocks.max()) + 1, teleport_prop))
+            for ranker in (TeleportRanker(teleport_prop, progress_interval=None),
+                           BlockRanker(teleport_prop, progress_interval=None)):
+                start_time = time.perf_counter()
+                if isinstance(ranker, BlockRanker):
+                    importances = ranker.rank_snapshot(snapshot, eps=eps, max_iter=10000, blocks=blocks)
+                else:
+                    importances = ranker.rank_snapshot(snapshot, eps=eps, max_iter=10000)
+                seconds = time.perf_counter() - start_time
+                error = np.abs(importances - exact).sum()
+                block_seconds = ranker.block_seconds if isinstance(ranker, BlockRanker) else 0.
+                results[(name, teleport_prop, str(ranker))] = (ranker.report.iterations, seconds, error)
+                print("\t{:<26} {:>4} iterations, start vector {:.3f} s, global {:.3f} s, all {:.3f} s, "
+                      "error {:.1e}".format(str(ranker), ranker.report.iterations, block_seconds,
+                                            ranker.report.seconds, seconds, error))
+    return results
+
+
+def make_host_snapshot(hosts_count=200, pages_per_host=500):
+    # Snapshot of a host net with its hosts as blocks
+    webnet = make_host_net(hosts_count, pages_per_host)
+    return GraphSnapshot.from_webnet(webnet), make_url_blocks([node.get_urls()[0] for node in webnet])
+
+
+def load_snapshot(store_path):
+    # The snapshot of a crawled store, exported if there is none yet
+    if not GraphSnapshot.exists(get_snapshot_path(store_path)):
+        export_snapshot(store_path)
+    return GraphSnapshot.load(get_snapshot_path(store_path))
+
+
+if __name__ == "__main__":
+    check_dangling_parity()
+    benchmark_build_matrix()
+    # Optionally give the path of a crawled store to also compare the solvers on its graph
+    solver_snapshots = [("Random", GraphSnapshot.from_webnet(make_synthetic_net(100000))),
+                        ("Hosts", GraphSnapshot.from_webnet(make_host_net()))]
+    if len(sys.argv) > 1:
+        solver_snapshots.append((os.path.basename(sys.argv[1]), load_snapshot(sys.argv[1])))
+    benchmark_solvers(solver_snapshots)
+    benchmark_warm_start()
+    benchmark_personalized()
+    benchmark_out_of_core()
+    benchmark_block_rank([("Hosts",) + make_host_snapshot()])
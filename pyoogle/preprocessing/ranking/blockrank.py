@@ -0,0 +1,155 @@
+import time
+from urllib.parse import urlparse
+
+import numpy as np
+from scipy.sparse import coo_matrix, csr_matrix
+
+from pyoogle.preprocessing.ranking.ranker import TeleportRanker
+
+# BlockRank (Kamvar et al.): websites link mostly within their host, so the importances are approximated before
+# solving for them. First the local importances of the nodes in their block, a host or path prefix, ranking only the
+# links within the block. Then the importances of the blocks, ranking the graph of the blocks where a block links to
+# another by the local importances of its nodes linking there. The local importance times the importance of its block
+# is the start vector of the global solve, which needs fewer iterations from there than from equal importances.
+# Calculating the start vector takes about as long as 15 global iterations, on the host net of
+# preprocessing.ranking.benchmark.py it saves 16 of 72 iterations with teleport 0.15 and 41 of 189 with 0.05, so the
+# total time is only a little lower. On nets with fewer links within the blocks it can be higher.
+
+
+def get_url_block(url, path_depth=0):
+    # The host of the url and the first path_depth parts of its path
+    parsed = urlparse(url)
+    parts = [part for part in parsed.path.split("/") if len(part) > 0][:path_depth]
+    return "/".join([parsed.netloc] + parts)
+
+
+def make_url_blocks(urls, path_depth=0):
+    # The block of every node given its url as indices 0 to blocks count - 1
+    _, blocks = np.unique([get_url_block(url, path_depth) for url in urls], return_inverse=True)
+    return blocks.astype(np.int64).reshape(-1)
+
+
+def make_store_blocks(node_store, node_ids, path_depth=0):
+    # Blocks of the stored nodes with the ids, like a snapshot's, by their first url
+    id_to_url = {node_id: urls[0] for node_id, urls in node_store.iter_urls()}
+    return make_url_blocks([id_to_url[int(node_id)] for node_id in node_ids], path_depth)
+
+
+class BlockRanker(TeleportRanker):
+    # Ranks like the TeleportRanker, but the global solve starts from the BlockRank approximation. The blocks of the
+    # nodes of a net are the hosts and path_depth path parts of their first url, ranking a snapshot takes them as
+    # an array, see make_store_blocks. The local importances of all blocks are calculated at once with the power
+    # method on the matrix of the links within blocks until no importance times the size of its block changes by
+    # more than local_eps. Smaller local_eps do not save global iterations, the approximation itself limits them.
+    def __init__(self, teleport_prop=0., path_depth=0, local_eps=1e-2, progress_interval=1., solver=None):
+        super().__init__(teleport_prop, progress_interval, solver)
+        self.path_depth = path_depth
+        self.local_eps = local_eps
+        self.blocks = None
+        self.local_importances = None
+        self.block_importances = None
+        self.local_iterations = 0
+        self.block_seconds = 0.  # seconds the start vector took
+
+    def __str__(self):
+        return "Block Ranker (" + str(self.teleport_prop) + ")"
+
+    def rank(self, webnet, eps=1e-8, max_iter=1000, warm_start=False):
+        self.blocks = make_url_blocks([node.get_urls()[0] for node in webnet], self.path_depth)
+        return super().rank(webnet, eps, max_iter, warm_start)
+
+    def rank_snapshot(self, snapshot, eps=1e-8, max_iter=1000, start=None, blocks=None):
+        # Blocks of the nodes in the order of snapshot.node_ids, without starts like the TeleportRanker
+        self.blocks = blocks
+        return super().rank_snapshot(snapshot, eps, max_iter, start)
+
+    def _calculate_importances(self, eps, max_iter, start=None):
+        # A given start, like the importances of the last ranking, is taken instead of the BlockRank approximation
+        if start is None and self.blocks is not None:
+            start_time = time.perf_counter()
+            start = self._make_block_start_vector()
+            self.block_seconds = time.perf_counter() - start_time
+            self._print("Block start vector of", len(self.block_importances), "blocks after", self.local_iterations,
+                        "local iterations in {:.3f} s".format(self.block_seconds))
+        super()._calculate_importances(eps, max_iter, start)
+
+    def _make_block_start_vector(self):
+        n = self.matrix.shape[0]
+        blocks = np.asarray(self.blocks)
+        if len(blocks) != n:
+            raise ValueError("Blocks for {} nodes given, but ranking {}.".format(len(blocks), n))
+        blocks_count = int(blocks.max()) + 1
+        block_sizes = np.bincount(blocks, minlength=blocks_count).astype(np.float64)
+        # rows of the matrix are the targets, columns the sources, the weight of a link is its share of the source's
+        sources = self.matrix.indices
+        target_blocks = np.repeat(blocks, np.diff(self.matrix.indptr))
+        within = target_blocks == blocks[sources]
+        within_weights = self.matrix.data * within
+        within_shares = np.bincount(sources, weights=within_weights, minlength=n)  # of the out links of every node
+        self.local_importances = self._calculate_local_importances(within_weights, within_shares, blocks,
+                                                                   block_sizes)
+        # The block graph: block I links to block J with the local importances of its nodes times their link
+        # weights. Links within blocks are summed by node first, only the few links between blocks one by one.
+        between = np.flatnonzero(~within)
+        between_sources = sources[between]
+        block_matrix = self._make_block_matrix(
+            np.concatenate((target_blocks[between], np.arange(blocks_count))),
+            np.concatenate((blocks[between_sources], np.arange(blocks_count))),
+            np.concatenate((self.local_importances[between_sources] * self.matrix.data[between],
+                            np.bincount(blocks, weights=self.local_importances * within_shares,
+                                        minlength=blocks_count))),
+            blocks_count)
+        del target_blocks, within, within_weights, between, between_sources
+        # dangling nodes and teleporting go to every node, so to a block by its size
+        block_dangling = np.bincount(blocks[self.dangling], weights=self.local_importances[self.dangling],
+                                     minlength=blocks_count)
+        node_share = block_sizes / n
+        damping = 1. - self.teleport_prop
+        block_importances = node_share.copy()
+        for _ in range(10000):
+            next_importances = damping * (block_matrix.dot(block_importances)
+                                          + block_dangling.dot(block_importances) * node_share)
+            next_importances += self.teleport_prop * node_share
+            next_importances /= next_importances.sum()
+            change = np.abs(next_importances - block_importances).sum()
+            block_importances = next_importances
+            if change < 1e-12:
+                break
+        self.block_importances = block_importances
+        return self.local_importances * block_importances[blocks]
+
+    @staticmethod
+    def _make_block_matrix(target_blocks, source_blocks, weights, blocks_count):
+        # Dense if there are not many more blocks squared than links, summing the weights of equal block pairs
+        if blocks_count ** 2 <= 4 * len(weights):
+            return np.bincount(target_blocks * blocks_count + source_blocks, weights=weights,
+                               minlength=blocks_count ** 2).reshape((blocks_count, blocks_count))
+        return coo_matrix((weights, (target_blocks, source_blocks)), shape=(blocks_count, blocks_count)).tocsr()
+
+    def _calculate_local_importances(self, within_weights, within_shares, blocks, block_sizes):
+        # Importances of the nodes of every block summing to 1 within the block, ranking only the links within the
+        # blocks. Nodes without such links teleport within their block. The local matrix has the same structure as
+        # the matrix, links between blocks have weight 0. Stops when no importance times the size of its block
+        # changed by more than local_eps.
+        n = len(blocks)
+        local_dangling = np.flatnonzero(within_shares == 0)
+        dangling_blocks = blocks[local_dangling]
+        scales = 1. / np.where(within_shares > 0, within_shares, 1.)
+        local_matrix = csr_matrix((within_weights * scales[self.matrix.indices], self.matrix.indices,
+                                   self.matrix.indptr), shape=(n, n))
+        node_block_sizes = block_sizes[blocks]
+        damping = 1. - self.teleport_prop
+        x = 1. / node_block_sizes
+        self.local_iterations = 0
+        for _ in range(10000):
+            dangling_mass = np.bincount(dangling_blocks, weights=x[local_dangling], minlength=len(block_sizes))
+            next_x = local_matrix.dot(x)
+            next_x += dangling_mass[blocks] / node_block_sizes
+            next_x *= damping
+            next_x += self.teleport_prop / node_block_sizes
+            change = (np.abs(next_x - x) * node_block_sizes).max()
+            x = next_x
+            self.local_iterations += 1
+            if change < self.local_eps:
+                break
+        return x
@@ -0,0 +1,148 @@
+import multiprocessing
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from pyoogle.preprocessing.ranking.ranker import TeleportRanker
+from pyoogle.preprocessing.ranking.solvers import SolverReport
+from pyoogle.preprocessing.web.net import split_rows
+from pyoogle.preprocessing.web.snapshot import GraphSnapshot
+
+# Ranks snapshots whose links do not fit into memory. Instead of building the matrix the power method reads the links
+# to every node from the memory mapped in link arrays of the snapshot (see GraphSnapshot.write_in_links) in blocks of
+# rows. The blocks of every step are multiplied by a pool of processes, which read the importances from and write
+# the next importances of their rows to vectors in shared memory. Only vectors of the nodes and one block of links
+# per process are in memory at once.
+
+_VECTORS_BYTES_PER_NODE = 6 * 8  # the shared vectors, the importances, out link counts and temporary vectors
+_BYTES_PER_LINK = 4 + 8 + 8 + 8  # a block's link sources, their importances, rows and temporary copies
+
+_worker = {}  # what a process needs to multiply blocks, set by _init_worker
+
+
+def _init_worker(snapshot_path, scaled_name, next_name):
+    in_indptr, in_indices = GraphSnapshot.load(snapshot_path).load_in_links(mmap=True)
+    nodes_count = len(in_indptr) - 1
+    scaled_memory = shared_memory.SharedMemory(name=scaled_name)
+    next_memory = shared_memory.SharedMemory(name=next_name)
+    _worker.update(in_indptr=in_indptr, in_indices=in_indices, memories=(scaled_memory, next_memory),
+                   scaled=np.ndarray(nodes_count, dtype=np.float64, buffer=scaled_memory.buf),
+                   next=np.ndarray(nodes_count, dtype=np.float64, buffer=next_memory.buf))
+
+
+def _multiply_rows(block):
+    # The rows of the block of the matrix times the importances divided by the out link counts of their nodes
+    start, end = block
+    indptr = np.asarray(_worker["in_indptr"][start:end + 1])
+    sources = np.asarray(_worker["in_indices"][indptr[0]:indptr[-1]])
+    rows = np.repeat(np.arange(end - start), np.diff(indptr))
+    _worker["next"][start:end] = np.bincount(rows, weights=_worker["scaled"][sources], minlength=end - start)
+
+
+def _close_worker():
+    memories = _worker.get("memories", ())
+    _worker.clear()  # the views of the shared memory first
+    for memory in memories:
+        memory.close()
+
+
+class OutOfCoreRanker(TeleportRanker):
+    # Ranks like the TeleportRanker with the power method, but a saved snapshot without building its matrix.
+    # Peak memory stays below memory_budget bytes if the vectors of the nodes fit: their 48 bytes per node are taken
+    # from the budget and the rest is split between the processes' blocks of links.
+    # The in links of the snapshot are written if it has none yet. Ranking a net ranks in memory.
+    def __init__(self, teleport_prop=0., processes=None, memory_budget=1 << 30, progress_interval=1.):
+        super().__init__(teleport_prop, progress_interval)
+        self.processes = processes or multiprocessing.cpu_count()
+        self.memory_budget = memory_budget
+        self._inverse_out_counts = None
+
+    def __str__(self):
+        return "Out Of Core Ranker (" + str(self.teleport_prop) + ", " + str(self.processes) + " processes)"
+
+    def get_max_links(self, nodes_count):
+        # Links of a block so that the blocks of all processes and the vectors fit into the budget
+        links_budget = self.memory_budget - _VECTORS_BYTES_PER_NODE * nodes_count
+        if links_budget < _BYTES_PER_LINK * self.processes:
+            raise ValueError("Memory budget of {} bytes too small for the vectors of {} nodes.".format(
+                self.memory_budget, nodes_count))
+        return links_budget // (_BYTES_PER_LINK * self.processes)
+
+    def rank_snapshot(self, snapshot, eps=1e-8, max_iter=1000, start=None):
+        # The snapshot must be saved, see GraphSnapshot.save and GraphSnapshot.load
+        self.webnet = None
+        self.id_to_index = None
+        self.matrix = None
+        nodes_count = len(snapshot)
+        if nodes_count == 0:
+            print("Nothing to rank!")
+            return np.zeros(0)
+        max_links = self.get_max_links(nodes_count)
+        if not snapshot.has_in_links():
+            self._print("Writing in links of", nodes_count, "nodes.")
+            snapshot.write_in_links(max_links)
+        in_indptr, _ = snapshot.load_in_links(mmap=True)
+        # More blocks than processes, so that they finish at about the same time
+        blocks = split_rows(in_indptr, max(1, min(max_links, -(-snapshot.get_edges_count() // (4 * self.processes)))))
+        out_counts = np.diff(np.asarray(snapshot.indptr))
+        self.dangling = np.flatnonzero(out_counts == 0)
+        self._inverse_out_counts = 1. / np.maximum(out_counts, 1)
+        del out_counts
+        x = self._make_start_vector(start, nodes_count)[:, 0]
+        self._print("Calculating importances for size", nodes_count, "in", len(blocks), "blocks with",
+                    self.processes, "processes")
+        scaled_memory = shared_memory.SharedMemory(create=True, size=8 * nodes_count)
+        next_memory = shared_memory.SharedMemory(create=True, size=8 * nodes_count)
+        pool = None
+        scaled = np.ndarray(nodes_count, dtype=np.float64, buffer=scaled_memory.buf)
+        next_x = np.ndarray(nodes_count, dtype=np.float64, buffer=next_memory.buf)
+        try:
+            if self.processes > 1:
+                pool = multiprocessing.Pool(self.processes, _init_worker,
+                                            (snapshot.path, scaled_memory.name, next_memory.name))
+            else:
+                _init_worker(snapshot.path, scaled_memory.name, next_memory.name)
+            x = self._power_method(x, scaled, next_x, blocks, pool, eps, max_iter)
+        finally:
+            del scaled, next_x
+            if pool is not None:
+                pool.close()
+                pool.join()
+            else:
+                _close_worker()
+            self._inverse_out_counts = None
+            scaled_memory.close()
+            scaled_memory.unlink()
+            next_memory.close()
+            next_memory.unlink()
+        self.importances = x.reshape((nodes_count, 1))
+        self._print(self.report)
+        return x
+
+    def _power_method(self, x, scaled, next_x, blocks, pool, eps, max_iter):
+        # The steps of the PowerSolver with _power_method_step, but the matrix is multiplied by blocks
+        self.report = SolverReport("Out of core power (" + str(self.processes) + " processes)")
+        start_time = time.perf_counter()
+        nodes_count = len(x)
+        for _ in range(max_iter):
+            np.multiply(x, self._inverse_out_counts, out=scaled)
+            if pool is not None:
+                pool.map(_multiply_rows, blocks)
+            else:
+                for block in blocks:
+                    _multiply_rows(block)
+            # the dangling nodes and teleporting like in the TeleportRanker
+            next_x += x[self.dangling].sum() / nodes_count
+            next_x *= 1. - self.teleport_prop
+            next_x += self.teleport_prop / nodes_count
+            next_x /= next_x.sum()
+            change = np.abs(next_x - x)
+            self.report.add_residual(change.sum())
+            x[:] = next_x
+            if self.report.get_residual() < eps:
+                self.report.converged = True
+                break
+            self._print_progress("At step", self.report.iterations, "residual=", self.report.get_residual())
+        self.report.seconds = time.perf_counter() - start_time
+        return x
@@ -1,18 +1,33 @@
+import time
+
 import numpy as np
-from scipy.sparse import lil_matrix
+from scipy.sparse import coo_matrix
+
+from pyoogle.preprocessing.ranking.solvers import PowerSolver
 
 
 class BaseRanker:
-    def __init__(self):
+    # Progress is printed at most every progress_interval seconds, None prints nothing. The solver calculates
+    # the importances from the matrix, see preprocessing.ranking.solvers.py, by default the power method.
+    # After ranking the solver's report tells how many iterations it took.
+    # Ranking again after a recrawl can start from the importances of the last ranking instead of equally distributed
+    # ones (warm start), which takes fewer iterations the less the net changed.
+    def __init__(self, progress_interval=1., solver=None):
+        self.solver = solver if solver is not None else PowerSolver()
+        self.report = None
         self.webnet = None
         self.id_to_index = None
         self.matrix = None
+        self.dangling = None  # indices of the nodes without out links
         self.importances = None
+        self.progress_interval = progress_interval
+        self._last_progress_time = None
 
     def __str__(self):
         return "Base Ranker"
 
-    def rank(self, webnet, eps=1e-8, max_iter=100):
+    def rank(self, webnet, eps=1e-8, max_iter=1000, warm_start=False):
+        # If warm_start is set, starts from the importances the nodes have, nodes never ranked get 1/n
         self.webnet = webnet
         self._init_mapping()
         if len(self.id_to_index) == 0:
@@ -20,113 +35,241 @@ class BaseRanker:
             return  # We ranked all in net perfectly!
 
         self._build_matrix()
-        self._calculate_importances(eps=eps, max_iter=max_iter)
+        start = [node.get_importance() for node in self.webnet] if warm_start else None
+        self._calculate_importances(eps=eps, max_iter=max_iter, start=start)
         self._apply_importances()
+        return self.report
+
+    def rank_snapshot(self, snapshot, eps=1e-8, max_iter=1000, start=None):
+        # Ranks the graph of a GraphSnapshot (see preprocessing.web.snapshot.py) without any nodes and returns
+        # the importances in the order of snapshot.node_ids, for WebNodeStore.save_importances. For a warm start
+        # give the last importances in the same order, like WebNodeStore.load_importances returns them.
+        self.webnet = None
+        if len(snapshot) == 0:
+            print("Nothing to rank!")
+            return np.zeros(0)
+        self.id_to_index = None
+        self._build_matrix_from_adjacency(snapshot.indptr, snapshot.indices)
+        self._calculate_importances(eps=eps, max_iter=max_iter, start=start)
+        return self.importances[:, 0]
+
+    def _print(self, *message):
+        if self.progress_interval is not None:
+            print(*message)
+
+    def _print_progress(self, *message):
+        now = time.monotonic()
+        if self.progress_interval is None or (self._last_progress_time is not None and
+                                              now - self._last_progress_time < self.progress_interval):
+            return
+        self._last_progress_time = now
+        print(*message)
 
     def _init_mapping(self):
+        # The matrix has a row and column for every node of the webnet in the same order
         self.id_to_index = {}
-        for index, node in enumerate(filter(lambda inode: inode.has_node_id(), self.webnet)):
-            node_id = node.get_node_id()
-            self.id_to_index[node_id] = index
+        for index, node in enumerate(self.webnet):
+            if node.has_node_id():
+                self.id_to_index[node.get_node_id()] = index
 
     def _build_matrix(self):
         # Build adjacency matrix for the WebNet graph where a WebNode is a node and an out going url is an edge
         # and normalize so that we get the probability matrix to travel to a random adjacent node.
+        # A node linking to another node several times links to it once.
+        indptr, indices = self.webnet.get_adjacency(unique=True)
+        self._build_matrix_from_adjacency(indptr, indices)
+
+    def _build_matrix_from_adjacency(self, indptr, indices):
+        # Builds the matrix at once from the graph given as CSR arrays of node indices: every link from source to
+        # target gets the weight 1 / out links of source. Ultimately we want to have the edge values for a node
+        # in a column, so the targets are the rows.
         self.matrix = None
-        nodes_count = len(self.webnet)
-        # noinspection PyPep8Naming
-        M = lil_matrix((nodes_count, nodes_count))
-        rows_without_out_links = []
-        self.webnet.build_url_index()
-        print("Starting to build matrix. Url index built.")
-        for index, node in enumerate(self.webnet):
-            out_links = node.get_out_links()
-            if out_links is not None:
-                out_count = 0
-                for out_link in out_links:
-                    out_node = self.webnet.get_by_url(out_link)
-                    if out_node is not None:
-                        out_id = out_node.get_node_id()
-                        M[index, self.id_to_index[out_id]] = 1
-                        out_count += 1
-                if out_count > 0:
-                    M[index, :] /= out_count
-                else:
-                    rows_without_out_links.append(index)
-            print("Got ", index, "/", len(self.webnet))
-
-        # In case some nodes do not have any edges there is a zero row in the matrix which we do not want.
-        # Therefore teleport to a random node by filling this row with ones
-        for row in rows_without_out_links:
-            M[row, :] = 1. / nodes_count
-
-        # Ultimately we want to have the edge values for a node in a column, but it was cheaper to build
-        # the lil-matrix row based.
-        self.matrix = M.tocsr().transpose()
-
-    def _calculate_importances(self, eps, max_iter):
-        # Calculate greatest eigenvalue of matrix using the power method.
-        # In each step ensure that the current (probability!) distribution x is normalized in the sum (1) norm.
+        nodes_count = len(indptr) - 1
+        out_counts = np.diff(np.asarray(indptr))
+        sources = np.repeat(np.arange(nodes_count), out_counts)
+        targets = np.asarray(indices)
+        weights = 1. / out_counts[sources]
+        self.matrix = coo_matrix((weights, (targets, sources)), shape=(nodes_count, nodes_count)).tocsr()
+        # In case some nodes do not have any edges there is a zero column in the matrix which we do not want.
+        # Instead of filling these columns, _power_method_step teleports from them to a random node.
+        self.dangling = np.flatnonzero(out_counts == 0)
+        self._print_progress("Built matrix of", nodes_count, "nodes and", len(indices), "links.")
+
+    def _calculate_importances(self, eps, max_iter, start=None):
+        # Calculate greatest eigenvalue of matrix with the solver, by default using the power method.
+        # Starts with equally distributed importances or the given start importances.
         self.importances = None
         n = self.matrix.shape[1]
-        x = np.ones((n, 1)) / n  # Normalized start vector with equally distributed importances
-        print("Calculating importances for size", n)
-        for index in range(0, max_iter):
-            next_x = self._power_method_step(x)
-            # noinspection PyTypeChecker
-            norm_next_x = np.linalg.norm(next_x, 1)
-            if norm_next_x < eps:
-                break  # Matrix singular and we go towards null vector, better stop!
-            next_x /= norm_next_x
-            diff = np.linalg.norm(x - next_x)
-            x = next_x
-            if diff < eps:
-                print("Converged at step", index, "with eps=", eps)
-                break  # Converged, stop
-            else:
-                print("At step", index, "diff=", diff)
-        self.importances = x
+        x = self._make_start_vector(start, n)
+        self._print("Calculating importances for size", n, "with", self.solver)
+        self.importances, self.report = self.solver.solve(self, x, eps, max_iter)
+        self._print(self.report)
+
+    @staticmethod
+    def _make_start_vector(start, n):
+        # Normalized start vector. Without start importances they are equally distributed, else importances
+        # below 0 (not ranked yet, new nodes) get 1/n, the average importance, and all are scaled to sum 1 again.
+        if start is None:
+            return np.ones((n, 1)) / n
+        x = np.array(start, dtype=np.float64).reshape((n, 1))
+        x[~(x >= 0)] = 1. / n
+        norm = x.sum()
+        return x / norm if norm > 0 else np.ones((n, 1)) / n
+
+    def get_teleport_prop(self):
+        # Probability to teleport to a random node in every step
+        return 0.
 
     def _power_method_step(self, x):
-        return self.matrix.dot(x)
+        # The matrix with the columns of the dangling nodes filled with 1/n is the sparse matrix plus the
+        # rank 1 matrix ones((n, 1)) * (indicator of dangling nodes / n), applied without building it
+        step = self.matrix.dot(x)
+        if len(self.dangling) > 0:
+            step += x[self.dangling].sum() / self.matrix.shape[0]
+        return step
 
     def _apply_importances(self):
-        for node in self.webnet:
-            node.set_importance(self.importances[self.id_to_index[node.get_node_id()], 0])
+        for index, node in enumerate(self.webnet):
+            node.set_importance(self.importances[index, 0])
 
 
 class TeleportRanker(BaseRanker):
 
-    def __init__(self, teleport_prop=0.):
-        super().__init__()
+    def __init__(self, teleport_prop=0., progress_interval=1., solver=None):
+        super().__init__(progress_interval, solver)
         self.teleport_prop = min(1., max(0., teleport_prop))
-        self._matrix_size = 1
 
     def __str__(self):
         return "Teleport Ranker (" + str(self.teleport_prop) + ")"
 
-    # noinspection PyUnresolvedReferences
-    def _build_matrix(self):
-        super()._build_matrix()
-        self._matrix_size = self.matrix.shape[0]  # Matrix is square
+    def get_teleport_prop(self):
+        return self.teleport_prop
 
     def _power_method_step(self, x):
         # The teleport matrix the ones((k, k)) matrix scaled by (self.teleport_prop / k)
-        # where k = self._matrix_size.
+        # where k = self.matrix.shape[0] as the matrix is square.
         # We do not compute this full rank 1 matrix for performance reasons and use the fact that
         # norm(x,1)=sum(x)=1
-        return (1. - self.teleport_prop) * super()._power_method_step(x) + self.teleport_prop / self._matrix_size
+        return (1. - self.teleport_prop) * super()._power_method_step(x) + self.teleport_prop / self.matrix.shape[0]
+
+
+class PersonalizedRanker(TeleportRanker):
+    # Ranks for k teleport distributions at once instead of the uniform one, like one for every language or site,
+    # so that searches restricted to them can sort by importances biased towards them. The teleports are an (n, k)
+    # array whose columns sum to 1, for the nodes in the order of the net or snapshot, see make_group_teleports.
+    # Dangling nodes teleport like the distribution of their column. The power method multiplies the matrix with all
+    # k importance vectors at once, which reads the matrix once per step instead of k times. Only the PowerSolver
+    # solves for a block of importance vectors, the other solvers are rejected.
+    def __init__(self, names, teleports, teleport_prop=0.15, progress_interval=1., solver=None):
+        if solver is not None and type(solver) is not PowerSolver:
+            raise ValueError("Only the power solver ranks several teleport distributions at once, not " + str(solver))
+        super().__init__(teleport_prop, progress_interval, solver)
+        self.names = list(names)
+        self.teleports = np.asarray(teleports, dtype=np.float64)
+        if self.teleports.ndim != 2 or self.teleports.shape[1] != len(self.names):
+            raise ValueError("Need a teleport distribution for every name.")
+        self._teleported = self.teleport_prop * self.teleports
+
+    def __str__(self):
+        return "Personalized Ranker (" + str(self.teleport_prop) + ", " + ", ".join(self.names) + ")"
+
+    def rank_snapshot(self, snapshot, eps=1e-8, max_iter=1000, start=None):
+        # The (n, k) importances, a column for every name
+        if len(snapshot) == 0:
+            print("Nothing to rank!")
+            return np.zeros((0, len(self.names)))
+        super().rank_snapshot(snapshot, eps, max_iter, start)
+        return self.importances
+
+    def get_importances(self, name):
+        # The importances of the nodes for the teleport distribution of the name
+        return self.importances[:, self.names.index(name)]
+
+    def _make_start_vector(self, start, n):
+        # Starts with the teleport distributions or the given (n, k) importances, given n importances every
+        # column starts with them. Columns without positive sum start with their teleport distribution.
+        if len(self.teleports) != n:
+            raise ValueError("Teleports for {} nodes given, but ranking {}.".format(len(self.teleports), n))
+        if start is None:
+            return self.teleports.copy()
+        x = np.array(start, dtype=np.float64).reshape((n, -1))
+        if x.shape[1] == 1:
+            x = np.repeat(x, len(self.names), axis=1)
+        x[~(x >= 0)] = 1. / n
+        norms = x.sum(axis=0)
+        unusable = ~(norms > 0)
+        x[:, unusable] = self.teleports[:, unusable]
+        norms[unusable] = 1.
+        return x / norms
+
+    def _apply_importances(self):
+        pass  # the nodes keep their importance, the personalized ones are in importances
+
+    def _power_method_step(self, x):
+        # In place, the block of k vectors is large
+        step = self.matrix.dot(x)
+        if len(self.dangling) > 0:
+            step += self.teleports * x[self.dangling].sum(axis=0)
+        step *= 1. - self.teleport_prop
+        step += self._teleported
+        return step
+
+
+def make_group_teleports(groups, prefix=""):
+    # Names and teleports for a PersonalizedRanker with a teleport distribution for every group, equally
+    # distributed over its nodes. Gets the group of every node, like its language, nodes of group None or ""
+    # are in none. The names are the groups with the prefix.
+    names = sorted(set(group for group in groups if group))
+    columns = {group: column for column, group in enumerate(names)}
+    teleports = np.zeros((len(groups), len(names)))
+    for index, group in enumerate(groups):
+        if group:
+            teleports[index, columns[group]] = 1.
+    teleports /= np.maximum(teleports.sum(axis=0, keepdims=True), 1.)
+    return [prefix + name for name in names], teleports
+
+
+def make_store_teleports(node_store, node_ids, site_prefixes=()):
+    # Teleports of the stored nodes with the ids, like a snapshot's, for every language (named "lang:<language>")
+    # and every site prefix (named "site:<prefix>") that nodes' urls start with
+    id_to_index = {int(node_id): index for index, node_id in enumerate(node_ids)}
+    languages = [None] * len(node_ids)
+    for node_id, language in node_store.iter_languages():
+        if node_id in id_to_index:
+            languages[id_to_index[node_id]] = language
+    names, teleports = make_group_teleports(languages, "lang:")
+    for prefix in site_prefixes:
+        sites = [None] * len(node_ids)
+        for node_id, urls in node_store.iter_urls():
+            if node_id in id_to_index and any(url.startswith(prefix) for url in urls):
+                sites[id_to_index[node_id]] = prefix
+        if any(sites):
+            site_names, site_teleports = make_group_teleports(sites, "site:")
+            names.extend(site_names)
+            teleports = np.hstack((teleports, site_teleports))
+    return names, teleports
 
 
 if __name__ == "__main__":
     ranker = TeleportRanker(0.1)
-    print("Starting ranking webnet.")
+    print("Starting ranking snapshot.")
     from pyoogle.preprocessing.web.nodestore import WebNodeStore
-    from pyoogle.preprocessing.web.net import WebNet
+    from pyoogle.preprocessing.web.snapshot import GraphSnapshot, export_snapshot, get_snapshot_path
     from pyoogle.config import DATABASE_PATH
+    # The crawler writes the snapshot if asked to, else export it from the store once
+    if not GraphSnapshot.exists(get_snapshot_path(DATABASE_PATH)):
+        export_snapshot(DATABASE_PATH)
+    loaded_snapshot = GraphSnapshot.load(get_snapshot_path(DATABASE_PATH))
     with WebNodeStore(database_path=DATABASE_PATH) as store:
-        loaded_webnet = WebNet()
-        for loaded_node in store.load_webnodes(load_content=False):
-            loaded_webnet.add_node(loaded_node)
-        ranker.rank(loaded_webnet)
-        store.save_webnodes(loaded_webnet.get_nodes())
+        # Starts from the importances of the last ranking, if any
+        loaded_importances = ranker.rank_snapshot(loaded_snapshot,
+                                                  start=store.load_importances(loaded_snapshot.node_ids))
+        store.save_importances(loaded_snapshot.node_ids, loaded_importances)
+        # Language biased importances for searches restricted to a language
+        language_names, language_teleports = make_store_teleports(store, loaded_snapshot.node_ids)
+        if len(language_names) > 0:
+            personalized = PersonalizedRanker(language_names, language_teleports)
+            personalized.rank_snapshot(loaded_snapshot)
+            for importance_name in personalized.names:
+                store.save_importances(loaded_snapshot.node_ids, personalized.get_importances(importance_name),
+                                       importance_name)
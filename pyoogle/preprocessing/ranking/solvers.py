@@ -0,0 +1,292 @@
+import time
+
+import numpy as np
+from scipy.sparse import identity, tril, triu
+from scipy.sparse.linalg import spsolve_triangular
+
+# Solvers for the importances of a ranker: the vector x with x = G x and sum(x) = 1 where G is the matrix the
+# ranker's power method step applies, the transition matrix with dangling nodes and teleporting of the ranker.
+# All of them start from a given vector, stop when the sum norm of the change of an iteration is below eps and
+# return the importances together with a SolverReport.
+
+
+def _column_sums(x):
+    # Much faster than x.sum(axis=0) for a block of a few vectors
+    return np.ones(len(x)).dot(x)
+
+
+class SolverReport:
+    def __init__(self, solver_name):
+        self.solver_name = solver_name
+        self.iterations = 0
+        self.residuals = []  # sum norm of the change of every iteration
+        self.seconds = 0.
+        self.converged = False
+        self.updates = None  # how many importances were updated in total, if the solver counts them
+
+    def add_residual(self, residual):
+        self.iterations += 1
+        self.residuals.append(residual)
+
+    def get_residual(self):
+        return self.residuals[-1] if len(self.residuals) > 0 else None
+
+    def __str__(self):
+        return "{}: {} after {} iterations in {:.3f} s, residual {:.2e}".format(
+            self.solver_name, "converged" if self.converged else "not converged", self.iterations, self.seconds,
+            self.get_residual() if len(self.residuals) > 0 else float("nan"))
+
+
+class PowerSolver:
+    # Applies the ranker's power method step until the importances do not change anymore. Also solves a block of
+    # several importance vectors at once, like the PersonalizedRanker's, until none of them changes anymore.
+    def __str__(self):
+        return "Power"
+
+    def solve(self, ranker, x, eps, max_iter):
+        report = SolverReport(str(self))
+        start_time = time.perf_counter()
+        for _ in range(max_iter):
+            # noinspection PyProtectedMember
+            next_x = ranker._power_method_step(x)
+            norm_next_x = _column_sums(next_x)  # the sum norm, the importances are not negative
+            if norm_next_x.min() < eps:
+                break  # Matrix singular and we go towards null vector, better stop!
+            next_x /= norm_next_x
+            x = self._next(x, next_x, report)
+            if report.get_residual() < eps:
+                report.converged = True
+                break
+            # noinspection PyProtectedMember
+            ranker._print_progress("At step", report.iterations, "residual=", report.get_residual())
+        report.seconds = time.perf_counter() - start_time
+        return x, report
+
+    # noinspection PyMethodMayBeStatic
+    def _next(self, x, next_x, report):
+        change = next_x - x
+        np.abs(change, out=change)  # in place, a block of vectors is large
+        report.add_residual(_column_sums(change).max())
+        return next_x
+
+
+class ExtrapolationSolver(PowerSolver):
+    # Power method that every period iterations extrapolates from the last iterates where they are heading, either
+    # with Aitken's delta squared per importance or with quadratic extrapolation of the vectors (Kamvar et al.).
+    # Helps most when the teleport probability is small and the power method converges slowly.
+    AITKEN = "aitken"
+    QUADRATIC = "quadratic"
+
+    def __init__(self, method=QUADRATIC, period=10):
+        if method not in (ExtrapolationSolver.AITKEN, ExtrapolationSolver.QUADRATIC):
+            raise ValueError("Unknown extrapolation method " + str(method))
+        self.method = method
+        self.period = max(4, period)
+        self._iterates = []
+
+    def __str__(self):
+        return "Extrapolation (" + self.method + ")"
+
+    def solve(self, ranker, x, eps, max_iter):
+        self._iterates = [x]
+        try:
+            return super().solve(ranker, x, eps, max_iter)
+        finally:
+            self._iterates = []
+
+    def _next(self, x, next_x, report):
+        self._iterates = self._iterates[-3:] + [next_x]
+        if (report.iterations + 1) % self.period == 0 and len(self._iterates) == 4:
+            extrapolated = (self._aitken(*self._iterates[1:]) if self.method == ExtrapolationSolver.AITKEN
+                            else self._quadratic(*self._iterates))
+            if extrapolated is not None:
+                next_x = extrapolated
+                self._iterates = [next_x]
+        return super()._next(x, next_x, report)
+
+    @staticmethod
+    def _aitken(x0, x1, x2):
+        first = x1 - x0
+        second = x2 - 2 * x1 + x0
+        # Only where the differences shrink geometrically, elsewhere the last iterate stays
+        usable = np.abs(second) > 1e-15
+        extrapolated = x2.copy()
+        extrapolated[usable] = x0[usable] - first[usable] ** 2 / second[usable]
+        return ExtrapolationSolver._normalized(extrapolated)
+
+    @staticmethod
+    def _quadratic(x0, x1, x2, x3):
+        # The iterates are assumed to be a combination of the importances and two eigenvectors, the coefficients
+        # of the minimal polynomial are fitted by least squares
+        y = np.hstack((x1 - x0, x2 - x0))
+        gamma, _, rank, _ = np.linalg.lstsq(y, -(x3 - x0), rcond=None)
+        if rank < 2:
+            return
+        gamma1, gamma2, gamma3 = gamma[0, 0], gamma[1, 0], 1.
+        extrapolated = (gamma1 + gamma2 + gamma3) * x1 + (gamma2 + gamma3) * x2 + gamma3 * x3
+        return ExtrapolationSolver._normalized(extrapolated)
+
+    @staticmethod
+    def _normalized(x):
+        x = np.maximum(x, 0.)
+        norm = x.sum()
+        return x / norm if norm > 0 else None
+
+
+class GaussSeidelSolver:
+    # Solves (I - (1 - p) * P) x = b, the linear system of the importances with teleport probability p and
+    # transition matrix P, by Gauss-Seidel sweeps: every importance is updated with the importances already updated
+    # in the same sweep. The right side b holds the teleporting and the mass of the dangling nodes of the last
+    # sweep. Usually needs about half the iterations of the power method, but one sweep costs more than one step.
+    def __str__(self):
+        return "Gauss-Seidel"
+
+    def solve(self, ranker, x, eps, max_iter):
+        report = SolverReport(str(self))
+        start_time = time.perf_counter()
+        damping = 1. - ranker.get_teleport_prop()
+        matrix = ranker.matrix.tocsr()
+        n = matrix.shape[0]
+        lower = (identity(n, format="csr") - damping * tril(matrix, format="csr")).tocsr()
+        upper = (damping * triu(matrix, k=1, format="csr")).tocsr()
+        for _ in range(max_iter):
+            right_side = upper.dot(x) + (damping * x[ranker.dangling].sum() + 1. - damping) / n
+            next_x = spsolve_triangular(lower, right_side, lower=True).reshape(x.shape)
+            next_x /= next_x.sum()
+            report.add_residual(np.abs(next_x - x).sum())
+            x = next_x
+            if report.get_residual() < eps:
+                report.converged = True
+                break
+            # noinspection PyProtectedMember
+            ranker._print_progress("At sweep", report.iterations, "residual=", report.get_residual())
+        report.seconds = time.perf_counter() - start_time
+        return x, report
+
+
+class AdaptiveSolver:
+    # Power method that stops updating the importances that converged (Kamvar et al.): every period iterations the
+    # importances that changed by less than eps / n in the last one are frozen, only the rows of the others are
+    # multiplied. Most importances converge long before the slowest ones, so later iterations get cheaper.
+    # Importances are only frozen once at most reslice_share of the active ones are left, as their rows are copied.
+    # When the active importances converged, one full step checks that the frozen ones did too. If they changed by
+    # less than eps / n each they stay frozen, else the ones that changed more are active again.
+    # Not an acceleration on the graphs of preprocessing.ranking.benchmark.py: importances only change by less than
+    # eps / n in the last few iterations, so it takes about as long as the power method.
+    def __init__(self, period=5, reslice_share=0.75):
+        self.period = max(1, period)
+        self.reslice_share = reslice_share
+
+    def __str__(self):
+        return "Adaptive"
+
+    def solve(self, ranker, x, eps, max_iter):
+        report = SolverReport(str(self))
+        start_time = time.perf_counter()
+        damping = 1. - ranker.get_teleport_prop()
+        matrix = ranker.matrix.tocsr()
+        n = matrix.shape[0]
+        x = x.copy()
+        active, active_matrix = np.arange(n), matrix
+        checking = False
+        for _ in range(max_iter):
+            constant = (damping * x[ranker.dangling].sum() + 1. - damping) / n
+            if checking or len(active) == n:
+                next_x = damping * matrix.dot(x) + constant
+                changes = np.abs(next_x - x)[:, 0]
+                x = next_x
+            else:
+                active_x = damping * active_matrix.dot(x) + constant
+                changes = np.abs(active_x - x[active])[:, 0]
+                x[active] = active_x
+            report.add_residual(changes.sum())
+            if checking:
+                checking = False
+                if report.get_residual() < eps:
+                    report.converged = True
+                    break
+                # the frozen importances that still change are active again
+                frozen = np.ones(n, dtype=bool)
+                frozen[active] = False
+                thawed = frozen & (changes >= eps / n)
+                if thawed.any():
+                    active = np.flatnonzero(~frozen | thawed)
+                    active_matrix = matrix if len(active) == n else matrix[active]
+            elif report.get_residual() < eps:
+                checking = len(active) < n
+                if not checking:
+                    report.converged = True
+                    break
+            elif report.iterations % self.period == 0:
+                still_active = changes >= eps / n
+                if still_active.sum() <= self.reslice_share * len(active):
+                    active = active[still_active]
+                    active_matrix = matrix[active]
+            # noinspection PyProtectedMember
+            ranker._print_progress("At step", report.iterations, "residual=", report.get_residual(),
+                                   "active=", len(active))
+        x /= x.sum()  # frozen importances do not move with the others
+        report.seconds = time.perf_counter() - start_time
+        return x, report
+
+
+class LocalUpdateSolver:
+    # Updates importances of a slightly changed net locally, starting from the importances before the change (warm
+    # start). With teleport probability p > 0 the importances are y / sum(y) for the solution y of
+    # y = (1 - p) * P y + p where P has no columns for the dangling nodes (Del Corso et al.), so the start vector
+    # is scaled to solve this where the net did not change, which is most nodes, and only the residual
+    # r = p + (1 - p) * P y - y is left where it did. Then every round pushes the residual of the nodes whose residual
+    # is above eps * sum(y) / n into their importances and on to the nodes they link to, until the sum of the
+    # residuals is below eps * sum(y).
+    # Apart from finding the residual once, which costs like one power method step, the work depends on how far
+    # the change spreads and not on the size of the net. A cold start pushes from every node and is no faster.
+    def __str__(self):
+        return "Local update"
+
+    def solve(self, ranker, x, eps, max_iter):
+        report = SolverReport(str(self))
+        report.updates = 0
+        start_time = time.perf_counter()
+        teleport_prop = ranker.get_teleport_prop()
+        if teleport_prop <= 0:
+            raise ValueError("Local updates need a teleport probability above 0.")
+        damping = 1. - teleport_prop
+        matrix = ranker.matrix.tocsc()  # columns of the nodes pushing their residual
+        n = matrix.shape[0]
+        y = x[:, 0].copy()
+        change = y - damping * matrix.dot(y)  # constant where the start vector was the fixed point
+        median_change = np.median(change)
+        if np.isfinite(median_change) and median_change > 0:
+            y *= teleport_prop / median_change
+            residual = teleport_prop - change * (teleport_prop / median_change)
+        else:
+            # The start vector is no usable warm start, start cold with y = p everywhere
+            ranker._print("Start vector not usable for local updates, starting cold.")
+            y = np.full(n, teleport_prop)
+            residual = damping * matrix.dot(y)
+        for _ in range(max_iter):
+            norm_y = y.sum()
+            report.add_residual(np.abs(residual).sum() / norm_y)
+            if report.get_residual() < eps:
+                report.converged = True
+                break
+            pushing = np.flatnonzero(np.abs(residual) > eps * norm_y / n)
+            pushed = residual[pushing]
+            y[pushing] += pushed
+            residual[pushing] = 0.
+            if len(pushing) < n // 20:
+                residual += damping * matrix[:, pushing].dot(pushed)
+            else:  # slicing many columns costs more than multiplying all of them
+                pushed_all = np.zeros(n)
+                pushed_all[pushing] = pushed
+                residual += damping * matrix.dot(pushed_all)
+            report.updates += len(pushing)
+            # noinspection PyProtectedMember
+            ranker._print_progress("At round", report.iterations, "residual=", report.get_residual(),
+                                   "pushed=", len(pushing))
+        report.seconds = time.perf_counter() - start_time
+        return (y / y.sum()).reshape(x.shape), report
+
+
+SOLVERS = {"power": PowerSolver, "gauss-seidel": GaussSeidelSolver, "extrapolation": ExtrapolationSolver,
+           "adaptive": AdaptiveSolver, "local": LocalUpdateSolver}
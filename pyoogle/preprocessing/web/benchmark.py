@@ -0,0 +1,237 @@
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from pyoogle.preprocessing.web.extractor import SoupExtractor, StreamExtractor
+from pyoogle.preprocessing.web.net import WebNet
+from pyoogle.preprocessing.web.node import WebNode
+from pyoogle.preprocessing.web.nodestore import WebNodeStore
+from pyoogle.preprocessing.web.parser import WebParser
+
+_WORDS = ("Mathematik", "Numerik", "Vorlesung", "lecture", "seminar", "Übung", "Straße", "analysis", "Fakultät",
+          "&amp;", "&lt;tag&gt;", "&#150;", "&#x9d;", "&#0;", "&#x1F600;", "&#65", "&copy", "&copyright",
+          "&unknown;", "&", "  ", "\n", "\t")
+
+
+def _random_text(rand, words=8):
+    return " ".join(rand.choice(_WORDS) for _ in range(rand.randint(0, words)))
+
+
+def _random_element(rand, depth):
+    # Builds random html including the constructs whose texts or tags need special treatment
+    if depth <= 0:
+        return _random_text(rand)
+    kind = rand.randint(0, 16)
+    inner = "".join(_random_element(rand, depth - 1) for _ in range(rand.randint(0, 3)))
+    if kind == 0:
+        return '<a href="/page/%d?x=1#top" class="link">%s</a>' % (rand.randint(0, 99), inner)
+    if kind == 1:
+        return '<script type="text/javascript">var s = \'<a class="x" href="/script/%d">go</a>\'; if (a < b) {}' \
+               '</script>' % rand.randint(0, 99)
+    if kind == 2:
+        return "<style>p { color: red; } /* </p> */</style>"
+    if kind == 3:
+        return "<!-- comment %s -->" % _random_text(rand)
+    if kind == 4:
+        return "<p lang=\"%s\">%s</p>" % (rand.choice(("de", "en", "")), inner)
+    if kind == 5:
+        return "<br>%s<img src='x.png'/><hr/>" % _random_text(rand)
+    if kind == 6:
+        return "<pre>  %s  </pre>" % inner
+    if kind == 7:
+        return "<template><p>%s</p></template>" % inner
+    if kind == 8:
+        return "<ruby>%s<rp>(</rp><rt>%s</rt><rp>)</rp></ruby>" % (_random_text(rand), _random_text(rand))
+    if kind == 9:
+        return "<![CDATA[%s]]>" % _random_text(rand)
+    if kind == 10:
+        return "<div>%s" % inner  # not closed
+    if kind == 11:
+        return "</span>%s" % inner  # closes nothing
+    if kind == 12:
+        return "<a name=anchor>%s</a><a href>empty</a>" % inner
+    if kind == 13:
+        return "<table><tr><td>%s</td><td>%s</tr></table>" % (inner, _random_text(rand))
+    return "<div class='c'><span>%s</span>%s</div>" % (_random_text(rand), inner)
+
+
+def make_synthetic_corpus(pages_count=200, seed=42):
+    # Random html pages, some of them (intentionally) not valid html websites
+    rand = random.Random(seed)
+    pages = []
+    for index in range(pages_count):
+        body = "".join(_random_element(rand, 4) for _ in range(rand.randint(5, 40)))
+        head = "<head><title>%s</title><meta charset='utf-8'></head>" % _random_text(rand, 4)
+        if index % 10 == 0:
+            page = "<title>Outside</title><html>%s</html>" % body  # no body, not valid
+        elif index % 10 == 1:
+            page = "<!DOCTYPE html><html lang='en'><body>%s</body></html><p>after</p>" % body
+        else:
+            page = "<!DOCTYPE html>\n<html>%s<body>%s</body></html>" % (head, body)
+        pages.append(("http://www.example.com/corpus/%d" % index, page.encode("utf-8")))
+    return pages
+
+
+def load_corpus(directory):
+    # All files in the directory, their file names are used as urls
+    pages = []
+    for name in sorted(os.listdir(directory)):
+        with open(os.path.join(directory, name), "rb") as file:
+            pages.append(("http://www.example.com/" + name, file.read()))
+    return pages
+
+
+def _parse_results(link, website, extractor):
+    try:
+        parser = WebParser(link, website, extractor)
+    except ValueError:
+        return "not valid"
+    return parser.get_record()
+
+
+def check_parity(pages, extractor=StreamExtractor, reference=SoupExtractor):
+    # Compares the records of both extractors for all pages, prints and returns the mismatching urls
+    mismatches = []
+    for link, website in pages:
+        expected = _parse_results(link, website, reference)
+        actual = _parse_results(link, website, extractor)
+        if expected != actual:
+            mismatches.append(link)
+            print("Mismatch for", link)
+            print("\texpected:", expected)
+            print("\tactual:  ", actual)
+    print("Parity of", extractor.__name__, "with", reference.__name__ + ":",
+          len(pages) - len(mismatches), "/", len(pages), "pages equal")
+    return mismatches
+
+
+def benchmark_extractors(pages, extractors=(SoupExtractor, StreamExtractor), repeat=3):
+    # Prints the average parse time per page of every extractor
+    results = {}
+    for extractor in extractors:
+        best = None
+        for _ in range(repeat):
+            start_time = time.perf_counter()
+            for link, website in pages:
+                _parse_results(link, website, extractor)
+            duration = time.perf_counter() - start_time
+            best = duration if best is None else min(best, duration)
+        results[extractor.__name__] = best / len(pages)
+        print("{}: {:.3f} ms per page".format(extractor.__name__, 1000 * best / len(pages)))
+    return results
+
+
+def make_synthetic_nodes(nodes_count=50000, out_degree=20, seed=42):
+    # Nodes linking to out_degree random other nodes, every out link is a string of its own like after parsing
+    rand = random.Random(seed)
+    url = "http://www.example.com/section/{}/page{}.html"
+    return [WebNode([url.format(index % 97, index)],
+                    None, [url.format(target % 97, target) for target in rand.sample(range(nodes_count), out_degree)],
+                    "en", "Page %d" % index, node_id=index + 1)
+            for index in range(nodes_count)]
+
+
+def benchmark_net_memory(nodes_count=50000, out_degree=20):
+    # Compares the memory of the out links as strings of every node to the interned url table and CSR adjacency
+    # of the WebNet, by default of a million edges
+    edges_count = nodes_count * out_degree
+    tracemalloc.start()  # only frees of blocks allocated while tracing are seen
+    try:
+        nodes = make_synthetic_nodes(nodes_count, out_degree)
+        nodes_bytes = tracemalloc.get_traced_memory()[0]
+        links_bytes = sum(sys.getsizeof(node.get_out_links()) +
+                          sum(sys.getsizeof(link) for link in node.get_out_links()) for node in nodes)
+        print("Object graph: {:.1f} MB of nodes, {:.1f} MB ({:.0f} bytes per edge) of them out link strings"
+              .format(nodes_bytes / 1e6, links_bytes / 1e6, links_bytes / edges_count))
+        webnet = WebNet()
+        for node in nodes:
+            webnet.add_node(node)
+        net_bytes = tracemalloc.get_traced_memory()[0]
+        print("WebNet: {:.1f} MB of nodes and net, the nodes' out links share the strings of the url table"
+              .format(net_bytes / 1e6))
+    finally:
+        tracemalloc.stop()
+
+    start_time = time.perf_counter()
+    indptr, indices = webnet.get_adjacency()
+    adjacency_bytes = indptr.nbytes + indices.nbytes
+    print("CSR adjacency of {} edges: {:.1f} MB ({:.1f} bytes per edge), built in {:.2f} s"
+          .format(len(indices), adjacency_bytes / 1e6, adjacency_bytes / edges_count, time.perf_counter() - start_time))
+    return {"object_graph": nodes_bytes, "out_link_strings": links_bytes, "webnet": net_bytes,
+            "adjacency": adjacency_bytes}
+
+
+class _DictWebNode:
+    # The attributes of a WebNode in a dict per node like before WebNode had slots
+    def __init__(self, node):
+        self.urls = node.urls
+        self.content = node.content
+        self.out_links = node.out_links
+        self.language = node.language
+        self.title = node.title
+        self.importance = node.importance
+        self.node_id = node.node_id
+        self._content_hash = node.get_content_hash()
+        self.simhash = node.simhash
+
+
+def _traced(make):
+    # The result of make and the bytes it allocated that are still in use
+    tracemalloc.start()
+    try:
+        result = make()
+        return result, tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+
+
+def benchmark_node_memory(nodes_count=100000, paragraphs=20, cache_size=1000):
+    # Memory of stored nodes loaded for ranking: with a dict per node like before, with slots, with their content
+    # and with lazily loaded content, and the time to access the content lazily
+    rand = random.Random(42)
+    nodes = make_synthetic_nodes(nodes_count, 10)
+    for node in nodes:
+        node.content = [_random_text(rand, 30) for _ in range(paragraphs)]
+        node.node_id = None
+    path = os.path.join(tempfile.mkdtemp(), "nodes.db")
+    with WebNodeStore(path, clear=True) as store:
+        store.save_webnodes(nodes)
+    del nodes
+
+    results = {}
+    with WebNodeStore(path) as store:
+        loaded, results["content"] = _traced(lambda: store.load_webnodes(load_content=True))
+        del loaded
+        loaded, results["slots"] = _traced(lambda: store.load_webnodes(load_content=False))
+        _, per_node_slots = _traced(lambda: [WebNode(node.urls, None, node.out_links, node.language, node.title,
+                                                     node.node_id, content_hash=node.get_content_hash())
+                                             for node in loaded])
+        _, per_node_dict = _traced(lambda: [_DictWebNode(node) for node in loaded])
+        results["dict"] = results["slots"] - per_node_slots + per_node_dict
+        del loaded
+        loaded, results["lazy"] = _traced(lambda: store.load_webnodes(load_content=False, lazy_content=True,
+                                                                     cache_size=cache_size))
+        start_time = time.perf_counter()
+        sample = [rand.choice(loaded) for _ in range(10000)]
+        for node in sample:
+            node.get_content()
+        lazy_seconds = (time.perf_counter() - start_time) / len(sample)
+    for name, description in (("content", "With content"), ("dict", "Without content, dict per node (before)"),
+                              ("slots", "Without content, slots"), ("lazy", "Lazy content, slots")):
+        print("{}: {:.1f} MB ({:.0f} bytes per node)".format(description, results[name] / 1e6,
+                                                             results[name] / nodes_count))
+    print("Lazy content access: {:.1f} µs per node with a cache of {}".format(1e6 * lazy_seconds, cache_size))
+    os.remove(path)
+    return results
+
+
+if __name__ == "__main__":
+    # Optionally give a directory of saved websites, else a synthetic corpus is used
+    test_pages = load_corpus(sys.argv[1]) if len(sys.argv) > 1 else make_synthetic_corpus()
+    check_parity(test_pages)
+    benchmark_extractors(test_pages)
+    benchmark_net_memory()
+    benchmark_node_memory()
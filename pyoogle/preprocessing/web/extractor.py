@@ -0,0 +1,251 @@
+from html.parser import HTMLParser
+import re
+
+from bs4 import BeautifulSoup
+from bs4.dammit import UnicodeDammit, EntitySubstitution
+
+# Extractors take the raw website and offer the texts, title, language, links of <a> tags and links found in
+# javascript of a website for the WebParser. They raise a ValueError if the website is not a valid html website.
+
+_CONTENT_SEPARATOR = "__S_E_P_A_R_A_T_O_R__:)"
+
+# Match <a href="SOMELINK" >
+# allow ' instead of ", capture SOMELINK and allow and ignore other attributes of 'a'
+_REGEX_LINK = re.compile('''<a(?:.[^<>]+)href\s*=\s*['"](.[^'"]+)['"](?:.[^<>]*)>''')
+
+
+def find_hrefs(text):
+    return _REGEX_LINK.findall(text)
+
+
+class SoupExtractor:
+    # Builds the full BeautifulSoup tree of the website
+    def __init__(self, website_raw):
+        self.soup = BeautifulSoup(website_raw, "html.parser")
+        self.check_valid()
+        self.script_links = []
+        self.content = self._parse_content()
+
+    def check_valid(self):
+        # If there is a <html> tag its serialization contains "<html", no need to serialize the whole soup
+        if (not hasattr(self.soup, "body") or
+                self.soup.body is None or not hasattr(self.soup, "html") or self.soup.html is None):
+            raise ValueError("Given website is not valid html website.")
+
+    def get_content(self):
+        return self.content
+
+    def get_title(self):
+        title = self.soup.html.title
+        return title.getText() if title is not None else ''
+
+    def get_language(self):
+        lang_tag = self.soup.find(attrs={"lang": True})
+        return lang_tag["lang"] if lang_tag is not None else ''
+
+    def get_hrefs(self):
+        return [link.get("href") for link in self.soup.find_all("a")]
+
+    def get_script_links(self):
+        return self.script_links
+
+    def _parse_content(self):
+        # Remove <style> tags, no real text content
+        for elem in self.soup.findAll('style'):
+            elem.extract()
+
+        # Remove <script> tags, we do not want to parse and execute the javascript, but fetch the contained links!
+        for elem in self.soup.findAll('script'):
+            if elem.contents is not None:
+                for script_line in elem.contents:
+                    for link in find_hrefs(script_line):
+                        self.script_links.append(link)
+            elem.extract()
+
+        content = self.soup.getText(separator=_CONTENT_SEPARATOR, strip=True)
+        return tuple(content.split(sep=_CONTENT_SEPARATOR))  # content must be static and hashable
+
+
+class StreamExtractor(HTMLParser):
+    # Extracts everything in a single pass over the website without building a tree. Yields the same results
+    # as the SoupExtractor: it keeps track of the open tags the same way BeautifulSoup's html.parser tree builder
+    # nests them and ignores the same texts (those of <script>, <style>, <template>, <rt> and <rp>).
+
+    # Tags BeautifulSoup closes immediately
+    _EMPTY_ELEMENT_TAGS = frozenset(('area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'keygen', 'link',
+                                     'menuitem', 'meta', 'param', 'source', 'track', 'wbr', 'basefont', 'bgsound',
+                                     'command', 'frame', 'image', 'isindex', 'nextid', 'spacer'))
+    # Tags whose texts are not part of the text of the website
+    _IGNORED_TEXT_TAGS = frozenset(('script', 'style', 'template', 'rt', 'rp'))
+    _PRESERVE_WHITESPACE_TAGS = frozenset(('pre', 'textarea'))
+    _ASCII_SPACES = ' \n\t\x0c\r'
+
+    def __init__(self, website_raw):
+        super().__init__(convert_charrefs=False)  # resolve references like BeautifulSoup does
+        if isinstance(website_raw, bytes):
+            website_raw = UnicodeDammit(website_raw, is_html=True).unicode_markup
+            if website_raw is None:
+                raise ValueError("Given website cannot be decoded.")
+        self.open_tags = []
+        self.ignored_text_depth = 0  # amount of open tags in _IGNORED_TEXT_TAGS
+        self.preserve_whitespace_depth = 0
+        self.data = []
+        self.texts = []
+        self.hrefs = []
+        self.script_links = []
+        self.language = None
+        self.has_html = False
+        self.has_body = False
+        self.html_index = -1  # index of the first <html> tag in open_tags while it is open, -2 once closed
+        self.title_index = -1  # index of the title in open_tags while reading it
+        self.title = None
+        self.feed(website_raw)
+        self.close()
+        self._end_data()
+        if not self.has_html or not self.has_body:
+            raise ValueError("Given website is not valid html website.")
+        self.content = tuple(self.texts) if len(self.texts) > 0 else ('',)
+
+    def get_content(self):
+        return self.content
+
+    def get_title(self):
+        return "".join(self.title) if self.title is not None else ''
+
+    def get_language(self):
+        return self.language if self.language is not None else ''
+
+    def get_hrefs(self):
+        return self.hrefs
+
+    def get_script_links(self):
+        return self.script_links
+
+    def _end_data(self, cdata=False):
+        if len(self.data) == 0:
+            return
+        data = "".join(self.data)
+        self.data = []
+        if self.preserve_whitespace_depth == 0 and len(data.strip(StreamExtractor._ASCII_SPACES)) == 0:
+            data = "\n" if "\n" in data else " "
+        if self.ignored_text_depth > 0 and not cdata:
+            if self.open_tags[-1] == 'script':
+                self.script_links.extend(find_hrefs(data))
+            return
+        stripped = data.strip()
+        if len(stripped) > 0:
+            self.texts.append(stripped)
+        if self.title_index >= 0:
+            self.title.append(data)
+
+    def handle_starttag(self, tag, attrs):
+        self._start_tag(tag, attrs)
+        if tag not in StreamExtractor._EMPTY_ELEMENT_TAGS:
+            self._push_tag(tag)
+
+    def handle_startendtag(self, tag, attrs):
+        self._start_tag(tag, attrs)
+        self._push_tag(tag)
+        self.handle_endtag(tag)
+
+    def _start_tag(self, tag, attrs):
+        self._end_data()
+        if tag == 'a' or (self.language is None and tag != 'script' and tag != 'style'):
+            # Later duplicates of attributes win and attributes without value are empty
+            attrs = {name: value if value is not None else '' for name, value in attrs}
+            if tag == 'a':
+                self.hrefs.append(attrs.get('href'))
+            if self.language is None and tag != 'script' and tag != 'style':
+                self.language = attrs.get('lang')
+        if tag == 'html':
+            self.has_html = True
+        elif tag == 'body':
+            self.has_body = True
+
+    def _push_tag(self, tag):
+        # Only the first <html> tag is searched for the title
+        if tag == 'html' and self.html_index == -1:
+            self.html_index = len(self.open_tags)
+        elif tag == 'title' and self.title is None and self.html_index >= 0:
+            self.title_index = len(self.open_tags)
+            self.title = []
+        if tag in StreamExtractor._IGNORED_TEXT_TAGS:
+            self.ignored_text_depth += 1
+        elif tag in StreamExtractor._PRESERVE_WHITESPACE_TAGS:
+            self.preserve_whitespace_depth += 1
+        self.open_tags.append(tag)
+
+    def handle_endtag(self, tag):
+        self._end_data()
+        # Close the most recently opened tag of this name and all tags opened after it, ignore if not open
+        for index in range(len(self.open_tags) - 1, -1, -1):
+            if self.open_tags[index] == tag:
+                self._pop_tags(index)
+                return
+
+    def _pop_tags(self, index):
+        for tag in self.open_tags[index:]:
+            if tag in StreamExtractor._IGNORED_TEXT_TAGS:
+                self.ignored_text_depth -= 1
+            elif tag in StreamExtractor._PRESERVE_WHITESPACE_TAGS:
+                self.preserve_whitespace_depth -= 1
+        del self.open_tags[index:]
+        if self.title_index >= index:
+            self.title_index = -1
+        if self.html_index >= index:
+            self.html_index = -2
+
+    def handle_data(self, data):
+        self.data.append(data)
+
+    def handle_entityref(self, name):
+        character = EntitySubstitution.HTML_ENTITY_TO_CHARACTER.get(name)
+        self.data.append(character if character is not None else "&" + name)
+
+    _REGEX_DECIMAL_REFERENCE = re.compile("^([0-9]+)(.*)")
+    _REGEX_HEX_REFERENCE = re.compile("^([0-9a-f]+)(.*)")
+
+    def handle_charref(self, name):
+        regex = StreamExtractor._REGEX_DECIMAL_REFERENCE
+        base = 10
+        if name.startswith("x") or name.startswith("X"):
+            name = name[1:]
+            regex = StreamExtractor._REGEX_HEX_REFERENCE
+            base = 16
+        extra_data = ''
+        try:
+            numeric = int(name, base)
+        except ValueError:
+            # Not terminated by a semicolon, the digits are the reference and the rest is text
+            match = regex.match(name)
+            if match is None:
+                self.data.append(name)
+                return
+            numeric = int(match.group(1), base)
+            extra_data = match.group(2)
+        if numeric == 0 or numeric > 0x10ffff or 0xd800 <= numeric <= 0xdfff:
+            self.data.append("\ufffd")
+        elif 0x80 <= numeric <= 0x9f:
+            # Likely encoded with windows-1252 instead of unicode
+            try:
+                self.data.append(bytes((numeric,)).decode("windows-1252"))
+            except UnicodeDecodeError:
+                self.data.append(chr(numeric))
+        else:
+            self.data.append(chr(numeric))
+        self.data.append(extra_data)
+
+    def handle_comment(self, data):
+        self._end_data()
+
+    def handle_decl(self, decl):
+        self._end_data()
+
+    def handle_pi(self, data):
+        self._end_data()
+
+    def unknown_decl(self, data):
+        self._end_data()
+        if data.upper().startswith('CDATA['):
+            self.data.append(data[len('CDATA['):])
+            self._end_data(cdata=True)
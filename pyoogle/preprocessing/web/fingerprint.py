@@ -0,0 +1,77 @@
+import hashlib
+import re
+
+import numpy as np
+
+# Fingerprints of the content of websites that are the same in every process and every run, unlike hash().
+# They are signed 64 bit integers so that they can be saved in sqlite INTEGER columns.
+
+_FINGERPRINT_BITS = 64
+_REGEX_WORD = re.compile(r"\w+")
+_SHINGLE_SIZE = 3  # consecutive words forming a feature of the simhash
+
+
+def _hash64(text):
+    return int.from_bytes(hashlib.blake2b(text.encode("utf-8", "surrogatepass"), digest_size=8).digest(),
+                          "little", signed=True)
+
+
+def content_fingerprint(content):
+    # Equal for equal content
+    if content is None:
+        return
+    return _hash64("".join(content))
+
+
+def simhash(content):
+    # Similar for similar content: the fewer shingles of words differ, the fewer bits differ, so websites that
+    # only differ by some boilerplate like a date or a navigation entry have close simhashes.
+    if content is None:
+        return
+    words = _REGEX_WORD.findall(" ".join(content).lower())
+    if len(words) == 0:
+        return 0
+    shingles = (" ".join(words[index:index + _SHINGLE_SIZE])
+                for index in range(max(1, len(words) - _SHINGLE_SIZE + 1)))
+    features = np.fromiter((_hash64(shingle) for shingle in shingles), dtype=np.int64)
+    # Every bit of the simhash is set if this bit is set in the majority of the features' hashes
+    bits = np.unpackbits(features.view(np.uint8).reshape(-1, 8), axis=1, bitorder="little")
+    majority = 2 * bits.sum(axis=0, dtype=np.int64) > len(features)
+    return int(np.packbits(majority, bitorder="little").view(np.int64)[0])
+
+
+def hamming_distance(first, second):
+    return bin((first ^ second) & 0xFFFFFFFFFFFFFFFF).count("1")
+
+
+class SimHashIndex:
+    # Finds an added item whose simhash differs in at most max_distance bits from a given simhash.
+    # The simhash is split into max_distance + 1 bands, simhashes this close are equal in at least one band
+    # so only items sharing a band need to be compared.
+    def __init__(self, max_distance=3):
+        if not 0 <= max_distance < _FINGERPRINT_BITS:
+            raise ValueError("Distance must be between 0 and %d." % (_FINGERPRINT_BITS - 1))
+        self.max_distance = max_distance
+        bands_count = max_distance + 1
+        band_bits = _FINGERPRINT_BITS // bands_count
+        self.bands = [(band * band_bits, band_bits if band < bands_count - 1 else _FINGERPRINT_BITS - band * band_bits)
+                      for band in range(bands_count)]
+        self.tables = [{} for _ in self.bands]  # band value to list of (simhash, item)
+
+    def _band_values(self, value):
+        value &= 0xFFFFFFFFFFFFFFFF
+        return ((value >> shift) & ((1 << bits) - 1) for shift, bits in self.bands)
+
+    def add(self, value, item):
+        for table, band_value in zip(self.tables, self._band_values(value)):
+            table.setdefault(band_value, []).append((value, item))
+
+    def find(self, value):
+        # The first added item that is close enough or None
+        for table, band_value in zip(self.tables, self._band_values(value)):
+            for other_value, item in table.get(band_value, ()):
+                if hamming_distance(value, other_value) <= self.max_distance:
+                    return item
+
+    def __len__(self):
+        return sum(len(entries) for entries in self.tables[0].values())
@@ -1,9 +1,83 @@
+import numpy as np
+
+
+class _GrowableArray:
+    # Numpy array that can be appended to in amortized constant time by doubling its capacity
+    def __init__(self, dtype, capacity=1024):
+        self._data = np.empty(capacity, dtype=dtype)
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def append(self, value):
+        if self._size == len(self._data):
+            self._grow(self._size + 1)
+        self._data[self._size] = value
+        self._size += 1
+
+    def extend(self, values):
+        values = np.asarray(values, dtype=self._data.dtype)
+        if self._size + len(values) > len(self._data):
+            self._grow(self._size + len(values))
+        self._data[self._size:self._size + len(values)] = values
+        self._size += len(values)
+
+    def _grow(self, min_capacity):
+        data = np.empty(max(min_capacity, 2 * len(self._data)), dtype=self._data.dtype)
+        data[:self._size] = self._data[:self._size]
+        self._data = data
+
+    def view(self):
+        # The valid values, changed by appending to this array while it is not grown
+        return self._data[:self._size]
+
+    def __setitem__(self, index, value):
+        self.view()[index] = value
+
+
+def make_csr(rows, columns, nodes_count, unique=True):
+    # CSR arrays (indptr, indices) of the edges from rows to columns given in the order of the rows. If unique is set,
+    # repeated edges are left out and the columns of every row are sorted.
+    rows = np.asarray(rows, dtype=np.int64)
+    columns = np.asarray(columns, dtype=np.int32)
+    if unique:
+        edges = np.sort(rows * nodes_count + columns)
+        edges = edges[np.concatenate((edges[:1] >= 0, edges[1:] != edges[:-1]))]  # first of equal edges
+        rows, columns = edges // nodes_count, (edges % nodes_count).astype(np.int32)
+    indptr = np.zeros(nodes_count + 1, dtype=np.int64)
+    np.cumsum(np.bincount(rows, minlength=nodes_count), out=indptr[1:])
+    return indptr, columns
+
+
+def split_rows(indptr, max_links):
+    # Splits the rows of CSR arrays into blocks (start, end) of consecutive rows with at most max_links links,
+    # a row with more links is a block of its own. Only reads the indptr entries at the block ends.
+    rows_count = len(indptr) - 1
+    blocks = []
+    start = 0
+    while start < rows_count:
+        end = int(np.searchsorted(indptr, indptr[start] + max_links, side="right")) - 1
+        end = min(rows_count, max(end, start + 1))
+        blocks.append((start, end))
+        start = end
+    return blocks
 
 
 class WebNet:
+    # Besides the nodes keeps every url only once: urls get an id in the order they are seen and the out links of
+    # all nodes are kept as url ids in CSR form (row of the node i are the url ids from indptr[i] to indptr[i+1]).
+    # This is built while nodes are added, get_adjacency() maps it to the indices of the nodes.
+    # Urls of nodes in the net must be added by add_url so that they are found by get_by_url.
     def __init__(self):
         self.nodes = []  # All nodes
-        self.url_to_nodes = {}  # Maps urls to nodes, can contain nodes multiple times
+        self.content_hash_to_node = {}  # Maps content hashes to the first node with this content
+        self.url_ids = {}  # Maps urls to their id
+        self.urls = []  # The url of every url id
+        self._url_node_indices = _GrowableArray(np.int32)  # index of the node of every url id, -1 if none
+        self._out_indptr = _GrowableArray(np.int64)
+        self._out_indptr.append(0)
+        self._out_url_ids = _GrowableArray(np.int32)
 
     def __len__(self):
         return len(self.nodes)
@@ -15,29 +89,63 @@ class WebNet:
         return self.nodes
 
     def add_node(self, webnode):
+        node_index = len(self.nodes)
         self.nodes.append(webnode)
-        self.url_to_nodes[webnode.get_urls()[0]] = webnode
+        content_hash = webnode.get_content_hash()
+        if content_hash is not None:
+            self.content_hash_to_node.setdefault(content_hash, webnode)
+        for url in webnode.get_urls():
+            self._index_url(url, node_index)
+        out_links = webnode.get_out_links()
+        if out_links is not None and len(out_links) > 0:
+            out_url_ids = [self.intern_url(link) for link in out_links]
+            self._out_url_ids.extend(out_url_ids)
+            # The node keeps the same url instances as the table instead of its own copies
+            out_links[:] = [self.urls[url_id] for url_id in out_url_ids]
+        self._out_indptr.append(len(self._out_url_ids))
+
+    def add_url(self, webnode, url):
+        # Adds the url to the node of this net
+        webnode.add_url(url)
+        self._index_url(url, self._url_node_indices.view()[self.url_ids[webnode.get_urls()[0]]])
+
+    def _index_url(self, url, node_index):
+        self._url_node_indices[self.intern_url(url)] = node_index
+
+    def intern_url(self, url):
+        # The id of the url, a new one if it is not known yet
+        url_id = self.url_ids.get(url)
+        if url_id is None:
+            url_id = len(self.urls)
+            self.url_ids[url] = url_id
+            self.urls.append(url)
+            self._url_node_indices.append(-1)
+        return url_id
+
+    def get_url_id(self, url):
+        return self.url_ids.get(url)
+
+    def get_url(self, url_id):
+        return self.urls[url_id]
+
+    def get_adjacency(self, unique=True):
+        # The out links of the nodes as CSR arrays (indptr, indices) of node indices: node i links to the nodes
+        # indices[indptr[i]:indptr[i+1]]. Links to urls that are no node are left out, if unique is set also
+        # repeated links, and the indices of a node are sorted.
+        nodes_count = len(self.nodes)
+        counts = np.diff(self._out_indptr.view())
+        rows = np.repeat(np.arange(nodes_count, dtype=np.int64), counts)
+        columns = self._url_node_indices.view()[self._out_url_ids.view()]
+        is_node = columns >= 0
+        return make_csr(rows[is_node], columns[is_node], nodes_count, unique)
 
     def get_by_content_hash(self, content_hash):
-        for node in self.nodes:
-            if node.get_content_hash() == content_hash:
-                return node
-
-    def get_by_url(self, url, extend_index=False):
-        if url is None:
-            return
-        node = self.url_to_nodes.get(url)
-        if node is not None:
-            return node
-        # Now brute force search
-        for node in self.get_nodes():
-            if url in node.get_urls():
-                if extend_index:
-                    # Map url to node (maybe it is common)
-                    self.url_to_nodes[url] = node
-                return node
-
-    def build_url_index(self):
-        for node in self.get_nodes():
-            for url in node.get_urls():
-                self.url_to_nodes[url] = node
+        return self.content_hash_to_node.get(content_hash)
+
+    def get_by_url(self, url):
+        # The node with this url or None
+        url_id = self.url_ids.get(url)
+        if url_id is None:
+            return None
+        node_index = self._url_node_indices.view()[url_id]
+        return self.nodes[node_index] if node_index >= 0 else None
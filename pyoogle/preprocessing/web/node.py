@@ -14,10 +14,19 @@ _DEFAULT_IMPORTANCE = -1
 
 
 class WebNode:
-
-    def __init__(self, urls, content, out_links, language, title, node_id=None, importance=_DEFAULT_IMPORTANCE):
+    # Slots instead of a dict per node, so that millions of nodes fit into memory for ranking
+    __slots__ = ("urls", "content", "out_links", "language", "title", "importance", "node_id", "_content_hash",
+                 "simhash", "content_loader")
+
+    # The content hash is computed from the content if not given. The simhash is only set for crawls
+    # detecting near duplicates, see preprocessing.web.fingerprint.py
+    # Stored nodes without content can be given a content loader returning the content for the node id,
+    # see WebNodeStore.make_content_loader. Their content is loaded whenever it is needed and not kept.
+    def __init__(self, urls, content, out_links, language, title, node_id=None, importance=_DEFAULT_IMPORTANCE,
+                 content_hash=None, simhash=None, content_loader=None):
         self.urls = urls
         self.content = content
+        self.content_loader = content_loader
         self.out_links = out_links
         self.language = language
         self.title = title
@@ -27,7 +36,8 @@ class WebNode:
             raise ValueError("No urls given for WebNode!")
         if node_id is None and (content is None or len(content) == 0):
             raise ValueError("No node id and no content, node cannot be valid!")
-        self._content_hash = WebParser.hash_content(self.content)
+        self._content_hash = content_hash if content_hash is not None else WebParser.hash_content(self.content)
+        self.simhash = simhash
 
     def add_url(self, url):
         self.urls.append(url)
@@ -62,9 +72,23 @@ class WebNode:
     def get_content_hash(self):
         return self._content_hash
 
+    def get_simhash(self):
+        return self.simhash
+
     def get_content(self):
+        if self.content is None and self.content_loader is not None and self.node_id is not None:
+            return self.content_loader(self.node_id)
         return self.content
 
+    def has_content(self):
+        # If the content is in memory, not only loadable
+        return self.content is not None
+
+    def release_content(self):
+        # Only for stored nodes, they can be loaded with content and out links again
+        self.content = None
+        self.out_links = None
+
     def __eq__(self, other):
         return any((url in other.urls for url in self.urls))
 
@@ -81,9 +105,15 @@ class WebNode:
         return "id: " + str(self.node_id) + ",  url:" + str(self.urls[0]) + ", importance: " + str(self.importance)
 
     class Builder:
+        # If guess_missing_language is given, it guesses the language of records without one from their content,
+        # like preprocessing.crawl.letterdistributions.guess_language
         def __init__(self, link_constraint, urls=None, content=None, out_links=None, language=None,
-                     importance=_DEFAULT_IMPORTANCE, title=None, node_id=None):
+                     importance=_DEFAULT_IMPORTANCE, title=None, node_id=None, content_hash=None, simhash=None,
+                     guess_missing_language=None):
             self.link_constraint = link_constraint
+            self.guess_missing_language = guess_missing_language
+            self.content_hash = content_hash
+            self.simhash = simhash
             self.urls = urls
             self.content = content
             self.out_links = out_links
@@ -91,17 +121,23 @@ class WebNode:
             self.importance = importance
             self.node_id = node_id
             self.title = title
+            self.content_loader = None
 
         def init_from_webparser(self, webparser):
-            self.urls = [webparser.get_url()]
-            self.content = webparser.get_content()
-            self.out_links = [self.link_constraint.get_valid(link) for link in webparser.get_web_links()]
+            self.init_from_record(webparser.get_record())
+
+        def init_from_record(self, record):
+            # Record as returned by WebParser.get_record()
+            url, self.title, self.language, self.content, web_links = record
+            self.urls = [url]
+            self.out_links = [self.link_constraint.get_valid(link) for link in web_links]
             self.out_links = [link for link in self.out_links if link is not None]
-            self.title = webparser.get_title()
-            self.language = webparser.get_language()
+            if not self.language and self.guess_missing_language is not None:
+                self.language = self.guess_missing_language(self.content)
 
         def make_node(self):
             if self.link_constraint is not None:
                 self.urls = [self.link_constraint.normalize(url) for url in self.urls]
             return WebNode(self.urls, self.content, self.out_links, self.language, self.title,
-                           node_id=self.node_id, importance=self.importance)
+                           node_id=self.node_id, importance=self.importance, content_hash=self.content_hash,
+                           simhash=self.simhash, content_loader=self.content_loader)
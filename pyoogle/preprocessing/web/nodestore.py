@@ -1,8 +1,12 @@
 
 import sqlite3 as lite
 import os
+from functools import lru_cache
+
+import numpy as np
 
 from .node import WebNode
+from .parser import WebParser
 
 
 VALID_KEYWORDS = ("OR", "AND", "NOT")
@@ -11,6 +15,9 @@ VALID_KEYWORDS = ("OR", "AND", "NOT")
 class WebNodeStore:
     _SEPARATOR = "<=_|_=>"
     _TABLE_NAME = "WebNodes"
+    _IMPORTANCES_TABLE_NAME = "NodeImportances"  # named importances besides the Importance column, see query
+    _FETCH_SIZE = 1000  # rows read at once when iterating
+    _SAVED_COLUMNS = ("Urls", "Content", "OutLinks", "Language", "Importance", "Title", "ContentHash", "SimHash")
 
     def __init__(self, database_path, clear=False):
         self.database_path = database_path
@@ -18,6 +25,9 @@ class WebNodeStore:
         if exists and clear:
             os.remove(self.database_path)
             exists = False
+        for journal_path in (self.database_path + "-wal", self.database_path + "-shm"):
+            if not exists and os.path.isfile(journal_path):
+                os.remove(journal_path)  # left over by a killed process, must not be applied to a new database
         self.con = None
         self.create_db = not exists
         self.cur = None
@@ -27,7 +37,9 @@ class WebNodeStore:
                                 "OutLinks": "TEXT",
                                 "Language": "TEXT",
                                 "Importance": "INTEGER",
-                                "Title": "TEXT"}
+                                "Title": "TEXT",
+                                "ContentHash": "INTEGER",
+                                "SimHash": "INTEGER"}
 
     def get_path_name(self):
         return os.path.basename(self.database_path)
@@ -39,12 +51,53 @@ class WebNodeStore:
                     format(tn=WebNodeStore._TABLE_NAME, cols=cols_creation))
         cur.close()
 
-    def query(self, request_tree, language=None, start_url=None):
+    def _migrate(self):
+        # Stores created by older versions lack some columns
+        cur = self.con.cursor()
+        cur.execute("PRAGMA table_info({tn})".format(tn=WebNodeStore._TABLE_NAME))
+        existing = set(row[1] for row in cur.fetchall())
+        missing = [col for col in self.column_to_types if col not in existing]
+        for col in missing:
+            cur.execute("ALTER TABLE {tn} ADD COLUMN {col} {type}".format(
+                tn=WebNodeStore._TABLE_NAME, col=col, type=self.column_to_types[col]))
+        cur.close()
+        if "ContentHash" in missing:
+            self._fill_content_hashes()
+        self.con.commit()
+
+    def _fill_content_hashes(self):
+        # Hash the content of the stored nodes once instead of every time a crawl continues
+        read_cur = self.con.cursor()
+        write_cur = self.con.cursor()
+        read_cur.execute("SELECT Id, Content FROM {tn} WHERE ContentHash IS NULL AND Content IS NOT NULL".format(
+            tn=WebNodeStore._TABLE_NAME))
+        rows = read_cur.fetchmany(WebNodeStore._FETCH_SIZE)
+        while len(rows) > 0:
+            write_cur.executemany("UPDATE {tn} SET ContentHash=? WHERE Id=?".format(tn=WebNodeStore._TABLE_NAME),
+                                  [(WebParser.hash_content(content.split(WebNodeStore._SEPARATOR)), node_id)
+                                   for node_id, content in rows])
+            rows = read_cur.fetchmany(WebNodeStore._FETCH_SIZE)
+        read_cur.close()
+        write_cur.close()
+
+    def _create_importances(self):
+        self.con.execute("CREATE TABLE IF NOT EXISTS {tn}(Name TEXT, Id INTEGER, Importance REAL, "
+                         "PRIMARY KEY (Name, Id))".format(tn=WebNodeStore._IMPORTANCES_TABLE_NAME))
+
+    def query(self, request_tree, language=None, start_url=None, importance_name=None):
+        # The matching nodes sorted by their importance or, if given, by the named importances saved
+        # with save_importances, nodes without one last
         with DictCursor(self.con) as cur:
             nodes = []
             where_clause = ' WHERE'
             use_where = False
             where_parameters = []
+            select = "SELECT * from {tn}"
+            order_by = " ORDER BY Importance Desc"
+            if importance_name is not None:
+                select = "SELECT {tn}.* from {tn} LEFT JOIN {itn} ON {itn}.Id = {tn}.Id AND {itn}.Name = ?"
+                order_by = " ORDER BY {itn}.Importance IS NULL, {itn}.Importance Desc"
+                where_parameters.append(importance_name)
             where_join_word = ' '
             if language is not None and len(language) > 0:
                 use_where = True
@@ -100,9 +153,10 @@ class WebNodeStore:
             if not use_where:
                 where_clause = ''
 
-            command = "SELECT * from {tn}" + where_clause + " ORDER BY Importance Desc"
+            command = select + where_clause + order_by
             try:
-                cur.execute(command.format(tn=WebNodeStore._TABLE_NAME), tuple(where_parameters))
+                cur.execute(command.format(tn=WebNodeStore._TABLE_NAME, itn=WebNodeStore._IMPORTANCES_TABLE_NAME),
+                            tuple(where_parameters))
             except lite.OperationalError:
                 return
 
@@ -110,79 +164,231 @@ class WebNodeStore:
                 nodes.append(WebNodeStore._build_node(row, True))
             return nodes
 
-    def load_webnodes(self, load_content=True):
-        with DictCursor(self.con) as cur:
-            nodes = []
-            command = "SELECT {cols} from {tn}"
-            cur.execute(command.format(tn=WebNodeStore._TABLE_NAME,
-                                       cols=", ".join(self._get_column_names(load_content))))
-            for row in cur.fetchall():
-                nodes.append(WebNodeStore._build_node(row, load_content))
-            return nodes
+    def load_webnodes(self, load_content=True, lazy_content=False, cache_size=0):
+        return list(self.iter_webnodes(load_content, lazy_content, cache_size))
+
+    def iter_webnodes(self, load_content=True, lazy_content=False, cache_size=0):
+        # Like load_webnodes but reads the nodes one after another. Nodes read without content but with lazy_content
+        # load it from this store when needed, the last cache_size loaded contents are kept. The store must be open
+        # then and used by the same thread.
+        content_loader = self.make_content_loader(cache_size) if lazy_content and not load_content else None
+        for row in self._iter_rows(self._get_column_names(load_content)):
+            yield WebNodeStore._build_node(row, load_content, content_loader)
+
+    def load_content(self, node_id):
+        # The content of the stored node or None
+        cur = self.con.cursor()
+        try:
+            cur.execute("SELECT Content FROM {tn} WHERE Id=?".format(tn=WebNodeStore._TABLE_NAME), (node_id,))
+            row = cur.fetchone()
+        finally:
+            cur.close()
+        if row is None or row[0] is None:
+            return
+        return row[0].split(WebNodeStore._SEPARATOR)
+
+    def make_content_loader(self, cache_size=0):
+        # Loads the content of node ids, keeping the last cache_size contents
+        if cache_size > 0:
+            return lru_cache(maxsize=cache_size)(self.load_content)
+        return self.load_content
+
+    def iter_resume_nodes(self):
+        # Nodes without content and out links, but with the stored hash of their content
+        columns = [col for col in self._get_column_names(include_content=False) if col != "OutLinks"]
+        for row in self._iter_rows(columns):
+            yield WebNodeStore._make_builder(row).make_node()
+
+    def iter_out_links(self):
+        # The out links of every node
+        for row in self._iter_rows(["OutLinks"]):
+            yield row["OutLinks"].split(WebNodeStore._SEPARATOR)
+
+    def iter_urls(self):
+        # The id and urls of every node, in the same order as iter_out_links
+        for row in self._iter_rows(["Id", "Urls"]):
+            yield row["Id"], row["Urls"].split(WebNodeStore._SEPARATOR)
+
+    def iter_languages(self):
+        # The id and language of every node, in the same order as iter_urls
+        for row in self._iter_rows(["Id", "Language"]):
+            yield row["Id"], row["Language"]
+
+    def get_importance_names(self):
+        # The names of the saved named importances
+        return [row[0] for row in self.con.execute("SELECT DISTINCT Name from {tn} ORDER BY Name".format(
+            tn=WebNodeStore._IMPORTANCES_TABLE_NAME))]
+
+    def load_importances(self, node_ids, name=None):
+        # The stored importances of the nodes with the ids as an array, -1 for nodes not stored or not ranked yet.
+        # With a name the named importances saved by save_importances.
+        if name is None:
+            stored = {row["Id"]: row["Importance"] for row in self._iter_rows(["Id", "Importance"])}
+        else:
+            stored = dict(self.con.execute("SELECT Id, Importance from {tn} WHERE Name = ?".format(
+                tn=WebNodeStore._IMPORTANCES_TABLE_NAME), (name,)))
+        importances = [stored.get(int(node_id)) for node_id in node_ids]
+        return np.array([importance if importance is not None else -1 for importance in importances],
+                        dtype=np.float64)
+
+    def save_importances(self, node_ids, importances, name=None):
+        # Sets the importance of the stored nodes with the ids in one transaction, faster than saving the nodes.
+        # With a name they replace the named importances instead, like the importances of a personalized ranking.
+        importances = [min(1., max(0., float(importance))) for importance in importances]
+        with self.con:
+            if name is not None:
+                self.con.execute("DELETE from {tn} WHERE Name = ?".format(tn=WebNodeStore._IMPORTANCES_TABLE_NAME),
+                                 (name,))
+                self.con.executemany("INSERT INTO {tn}(Name, Id, Importance) VALUES (?, ?, ?)".format(
+                    tn=WebNodeStore._IMPORTANCES_TABLE_NAME),
+                    ((name, int(node_id), importance) for node_id, importance in zip(node_ids, importances)))
+                return
+            self.con.executemany("UPDATE {tn} SET Importance=? WHERE Id=?".format(tn=WebNodeStore._TABLE_NAME),
+                                 zip(importances, (int(node_id) for node_id in node_ids)))
+
+    def _iter_rows(self, columns):
+        cur = self.con.cursor()
+        cur.row_factory = lite.Row
+        try:
+            cur.execute("SELECT {cols} from {tn} ORDER BY Id".format(tn=WebNodeStore._TABLE_NAME,
+                                                                      cols=", ".join(columns)))
+            rows = cur.fetchmany(WebNodeStore._FETCH_SIZE)
+            while len(rows) > 0:
+                for row in rows:
+                    yield row
+                rows = cur.fetchmany(WebNodeStore._FETCH_SIZE)
+        finally:
+            cur.close()
 
     def _get_column_names(self, include_content=True):
         return [col for col in self.column_to_types if include_content or col != "Content"]
 
     @staticmethod
-    def _build_node(row, load_content):
+    def _make_builder(row):
         builder = WebNode.Builder(link_constraint=None,
                                   language=row["Language"], importance=row["Importance"], node_id=row["Id"],
-                                  title=row["Title"])
+                                  title=row["Title"], content_hash=row["ContentHash"], simhash=row["SimHash"])
         builder.urls = row["Urls"].split(WebNodeStore._SEPARATOR)
+        return builder
+
+    @staticmethod
+    def _build_node(row, load_content, content_loader=None):
+        builder = WebNodeStore._make_builder(row)
         if load_content:
             builder.content = row["Content"].split(WebNodeStore._SEPARATOR)
         builder.out_links = row["OutLinks"].split(WebNodeStore._SEPARATOR)
+        builder.content_loader = content_loader
         return builder.make_node()
 
     def save_webnodes(self, nodes):
+        # Saves all nodes in one transaction. New nodes get the next free ids so that rows with the same
+        # columns can be written at once.
         try:
             nodes_iter = iter(nodes)
         except TypeError:
             # Not iterable, maybe a single node
             nodes_iter = [nodes]
         cur = self.con.cursor()
+        cur.execute("SELECT MAX(Id) FROM {tn}".format(tn=WebNodeStore._TABLE_NAME))
+        max_id = cur.fetchone()[0]
+        next_id = max_id + 1 if max_id is not None else 1
+        saved_nodes = set()  # the same node can be given multiple times
+        inserted = []  # (node, id) tuples
+        inserts = []
+        updates = {}  # updated columns to the list of values
         for node in nodes_iter:
+            if id(node) in saved_nodes:
+                continue
+            saved_nodes.add(id(node))
+            columns, values = WebNodeStore._get_node_values(node)
+            if not all(not isinstance(value, str) or WebNodeStore._is_encodable(value) for value in values):
+                print("Failed saving node (skipping it)", node.get_urls()[0], "because of encoding problem")
+                continue
+            if node.get_node_id() is None:
+                inserted.append((node, next_id))
+                inserts.append([next_id] + values)
+                next_id += 1
+            else:
+                updates.setdefault(tuple(columns), []).append(values + [node.get_node_id()])
+        insert_command = "INSERT INTO {tn} (Id, {cols}) VALUES (?, {params})".format(
+            tn=WebNodeStore._TABLE_NAME, cols=", ".join(WebNodeStore._SAVED_COLUMNS),
+            params=", ".join("?" for _ in WebNodeStore._SAVED_COLUMNS))
+        update_commands = {columns: "UPDATE {tn} SET {cols} WHERE Id=?".format(
+            tn=WebNodeStore._TABLE_NAME, cols=", ".join(col + "=?" for col in columns)) for columns in updates}
+        try:
+            with self.con:
+                if len(inserts) > 0:
+                    cur.executemany(insert_command, inserts)
+                for columns, values in updates.items():
+                    cur.executemany(update_commands[columns], values)
+        except lite.IntegrityError as err:
+            # Rolled back, save the nodes one by one so that only the failing ones are skipped
+            print("ERROR: Saving nodes at once failed, saving them one by one:", err)
+            inserted = self._save_rows_singly(cur, insert_command, inserted, inserts, update_commands, updates)
+        finally:
+            cur.close()
+        for node, node_id in inserted:
+            node.set_node_id(node_id)
+
+    def _save_rows_singly(self, cur, insert_command, inserted, inserts, update_commands, updates):
+        # Every row in a transaction of its own, returns the (node, id) tuples of the inserted nodes
+        saved = []
+        for (node, node_id), values in zip(inserted, inserts):
             try:
-                self._save_node(cur, node)
-            except UnicodeEncodeError as ue:
-                print("Failed saving node (skipping it)", node.get_urls()[0], "because of encoding problem:", ue)
-        cur.close()
+                with self.con:
+                    cur.execute(insert_command, values)
+                saved.append((node, node_id))
+            except lite.IntegrityError as err:
+                print("Failed saving node (skipping it)", node.get_urls()[0], ":", err)
+        for columns, rows in updates.items():
+            for values in rows:
+                try:
+                    with self.con:
+                        cur.execute(update_commands[columns], values)
+                except lite.IntegrityError as err:
+                    print("Failed updating node (skipping it) with id", values[-1], ":", err)
+        return saved
 
     @staticmethod
-    def _save_node(cur, node):
-        node_id = node.get_node_id()
-        urls = WebNodeStore._SEPARATOR.join(node.get_urls())
-        ctn = node.get_content()
-        if ctn is not None:
-            ctn = WebNodeStore._SEPARATOR.join(ctn)
-        ol = WebNodeStore._SEPARATOR.join(node.get_out_links())
-        l = node.get_language()
-        imp = node.get_importance()
-        title = node.get_title()
-        # Insert or update depending on if there already is a valid id
-        #  and only update content if valid
+    def _is_encodable(text):
         try:
-            if node_id is None:
-                command = "INSERT INTO {tn} (Urls, Content, OutLinks, Language, Importance, Title)\
-                        VALUES (?, ?, ?, ?, ?, ?)".format(tn=WebNodeStore._TABLE_NAME)
-                cur.execute(command, (urls, ctn, ol, l, imp, title))
-                node.set_node_id(cur.lastrowid)
-            else:
-                if ctn is None:
-                    command = "UPDATE {tn} SET Urls=?, OutLinks=?, Language=?, Importance=?, Title=?\
-                            WHERE Id=?".format(tn=WebNodeStore._TABLE_NAME)
-                    cur.execute(command, (urls, ol, l, imp, title, node_id))
-                else:
-                    command = "UPDATE {tn} SET Urls=?, Content=?, OutLinks=?, Language=?, Importance=?, Title=?\
-                            WHERE Id=?".format(tn=WebNodeStore._TABLE_NAME)
-                    cur.execute(command, (urls, ctn, ol, l, imp, title, node_id))
-        except lite.IntegrityError:
-            print('ERROR: ID {} already exists in PRIMARY KEY column.'.format(node_id))
+            text.encode("utf-8")
+        except UnicodeEncodeError:
+            return False
+        return True
+
+    @staticmethod
+    def _get_node_values(node):
+        # Columns and values to save the node. Content, out links and hashes of nodes loaded without them stay
+        # untouched when updating, when inserting they are NULL.
+        values = {"Urls": WebNodeStore._SEPARATOR.join(node.get_urls()),
+                  "Language": node.get_language(),
+                  "Importance": node.get_importance(),
+                  "Title": node.get_title()}
+        ctn = node.get_content() if node.has_content() else None  # lazily loaded content is unchanged
+        if ctn is not None:
+            values["Content"] = WebNodeStore._SEPARATOR.join(ctn)
+        ol = node.get_out_links()
+        if ol is not None:
+            values["OutLinks"] = WebNodeStore._SEPARATOR.join(ol)
+        if node.get_content_hash() is not None:
+            values["ContentHash"] = node.get_content_hash()
+        if node.get_simhash() is not None:
+            values["SimHash"] = node.get_simhash()
+        if node.get_node_id() is None:
+            return WebNodeStore._SAVED_COLUMNS, [values.get(col) for col in WebNodeStore._SAVED_COLUMNS]
+        columns = [col for col in WebNodeStore._SAVED_COLUMNS if col in values]
+        return columns, [values[col] for col in columns]
 
     def open(self):
         self.con = lite.connect(self.database_path)
+        # Write ahead log: saving does not block readers and a killed process does not corrupt the database
+        self.con.execute("PRAGMA journal_mode=WAL")
         if self.create_db:
             self._create()
+        else:
+            self._migrate()
+        self._create_importances()
 
     def __enter__(self):
         self.open()
@@ -1,25 +1,17 @@
-from bs4 import BeautifulSoup
 from urllib.parse import urljoin
 from itertools import chain
-import re
 
+from .extractor import SoupExtractor, find_hrefs
+from .fingerprint import content_fingerprint
 
-class WebParser:
-    _CONTENT_SEPARATOR = "__S_E_P_A_R_A_T_O_R__:)"
 
-    def __init__(self, base_link, website_raw):
+class WebParser:
+    # The extractor does the actual parsing, the default SoupExtractor builds a full BeautifulSoup tree,
+    # the StreamExtractor yields the same results in a single pass and is considerably faster.
+    def __init__(self, base_link, website_raw, extractor=SoupExtractor):
         self.base_link = base_link
-        self.soup = BeautifulSoup(website_raw, "html.parser")
-        self.check_valid()
-        self.links_in_scripts = []
-        self.content = self._parse_content()
-
-    def check_valid(self):
-        html = str(self.soup)
-        if (html is None or html.find("<html") < 0 or
-                not hasattr(self.soup, "body") or
-                self.soup.body is None or not hasattr(self.soup, "html") or self.soup.html is None):
-            raise ValueError("Given website is not valid html website.")
+        self.extractor = extractor(website_raw)
+        self.content = self.extractor.get_content()
 
     def get_url(self):
         return self.base_link
@@ -28,56 +20,46 @@ class WebParser:
         return self.content
 
     def get_title(self):
-        title = self.soup.html.title
-        return title.getText() if title is not None else ''
+        return self.extractor.get_title()
 
     def get_language(self):
-        lang_tag = self.soup.find(attrs={"lang": True})
-        return lang_tag["lang"] if lang_tag is not None else ''
+        return self.extractor.get_language()
 
     def get_web_links(self):
-        href_urls = (link.get("href") for link in self.soup.find_all("a"))
-        href_urls = chain(href_urls, self.links_in_scripts)
+        href_urls = chain(self.extractor.get_hrefs(), self.extractor.get_script_links())
         return [self._get_resolved_link(url) for url in href_urls if url is not None]  # filter NoneTypes and resolve
 
+    def get_record(self):
+        # Compact picklable summary of the parsed website: (url, title, language, content, out_links)
+        return self.get_url(), self.get_title(), self.get_language(), self.get_content(), self.get_web_links()
+
     def __hash__(self):
         return WebParser.hash_content(self.content)
 
     @staticmethod
     def hash_content(content):
-        if content is None:
-            return
-        return hash("".join(content))
+        # Stable between processes and runs, so it can be stored and compared later
+        return content_fingerprint(content)
 
     def __eq__(self, other):
         return self.content == other.content
 
-    def _parse_content(self):
-        # Remove <style> tags, no real text content
-        for elem in self.soup.findAll('style'):
-            elem.extract()
-
-        # Remove <script> tags, we do not want to parse and execute the javascript, but fetch the contained links!
-        for elem in self.soup.findAll('script'):
-            if elem.contents is not None:
-                for script_line in elem.contents:
-                    for link in WebParser.find_hrefs(script_line):
-                        self.links_in_scripts.append(link)
-            elem.extract()
-
-        content = self.soup.getText(separator=WebParser._CONTENT_SEPARATOR, strip=True)
-        return tuple(content.split(sep=WebParser._CONTENT_SEPARATOR))  # content must be static and hashable
-
     def _get_resolved_link(self, link):
         return urljoin(self.base_link, link)  # Resolve relative links
 
-    # Match <a href="SOMELINK" >
-    # allow ' instead of ", capture SOMELINK and allow and ignore other attributes of 'a'
-    _REGEX_LINK = re.compile('''<a(?:.[^<>]+)href\s*=\s*['"](.[^'"]+)['"](?:.[^<>]*)>''')
-
     @staticmethod
     def find_hrefs(text):
-        return WebParser._REGEX_LINK.findall(text)
+        return find_hrefs(text)
+
+
+def parse_website(link, website_raw, extractor=SoupExtractor):
+    # Parses the website and returns its record or None if it is not a valid html website.
+    # Module level so that it can be executed by worker processes.
+    try:
+        return WebParser(link, website_raw, extractor).get_record()
+    except ValueError:
+        return
+
 
 if __name__ == "__main__":
     test_url = "http://www.math.kit.edu"
@@ -0,0 +1,149 @@
+import os
+import sys
+import time
+
+import numpy as np
+
+from .net import make_csr, split_rows, _GrowableArray
+from .nodestore import WebNodeStore
+
+# A snapshot is the link graph of the stored nodes as numpy arrays in a directory next to the store: the node ids
+# in node_ids.npy and the links between the nodes as CSR arrays indptr.npy and indices.npy of node indices, node i
+# links to the nodes indices[indptr[i]:indptr[i+1]]. Loading maps the files into memory instead of reading them,
+# so a ranker starts without reading the store and resolving urls.
+# For ranking out of core the links can be written the other way round as well, in_indptr.npy and in_indices.npy:
+# node i is linked from the nodes in_indices[in_indptr[i]:in_indptr[i+1]].
+
+_ARRAY_NAMES = ("node_ids", "indptr", "indices")
+_IN_LINK_ARRAY_NAMES = ("in_indptr", "in_indices")
+
+
+def get_snapshot_path(store_path):
+    return store_path + ".snapshot"
+
+
+class GraphSnapshot:
+    def __init__(self, node_ids, indptr, indices):
+        self.node_ids = node_ids
+        self.indptr = indptr
+        self.indices = indices
+        self.path = None  # directory of the snapshot once saved or loaded
+
+    def __len__(self):
+        return len(self.node_ids)
+
+    def get_edges_count(self):
+        return len(self.indices)
+
+    def save(self, path):
+        # Every array is written to a temporary file first, so readers never see half written arrays
+        os.makedirs(path, exist_ok=True)
+        for name in _IN_LINK_ARRAY_NAMES:  # belong to the links saved before
+            file_path = os.path.join(path, name + ".npy")
+            if os.path.isfile(file_path):
+                os.remove(file_path)
+        for name in _ARRAY_NAMES:
+            file_path = os.path.join(path, name + ".npy")
+            with open(file_path + ".tmp", "wb") as file:
+                np.save(file, getattr(self, name))
+            os.replace(file_path + ".tmp", file_path)
+        self.path = path
+
+    @staticmethod
+    def load(path, mmap=True):
+        arrays = [np.load(os.path.join(path, name + ".npy"), mmap_mode="r" if mmap else None)
+                  for name in _ARRAY_NAMES]
+        snapshot = GraphSnapshot(*arrays)
+        snapshot.path = path
+        return snapshot
+
+    def has_in_links(self):
+        return self.path is not None and all(os.path.isfile(os.path.join(self.path, name + ".npy"))
+                                             for name in _IN_LINK_ARRAY_NAMES)
+
+    def load_in_links(self, mmap=True):
+        # The CSR arrays (in_indptr, in_indices) of the links to every node, see write_in_links
+        return tuple(np.load(os.path.join(self.path, name + ".npy"), mmap_mode="r" if mmap else None)
+                     for name in _IN_LINK_ARRAY_NAMES)
+
+    def write_in_links(self, max_links=1 << 22):
+        # Writes the links to every node next to the saved snapshot, reading and sorting at most max_links links at
+        # once. Besides them only vectors of the nodes are kept in memory, the links are written to a memory mapped
+        # file at the position of their target. Their sources are sorted.
+        if self.path is None:
+            raise ValueError("Snapshot must be saved before writing its in links.")
+        nodes_count = len(self)
+        in_counts = np.zeros(nodes_count, dtype=np.int64)
+        for start in range(0, self.get_edges_count(), max_links):
+            in_counts += np.bincount(self.indices[start:start + max_links], minlength=nodes_count)
+        in_indptr = np.zeros(nodes_count + 1, dtype=np.int64)
+        np.cumsum(in_counts, out=in_indptr[1:])
+        del in_counts
+        in_indices_path = os.path.join(self.path, "in_indices.npy")
+        in_indices = np.lib.format.open_memmap(in_indices_path + ".tmp", mode="w+", dtype=np.int32,
+                                               shape=(self.get_edges_count(),))
+        next_positions = in_indptr[:-1].copy()
+        for start, end in split_rows(self.indptr, max_links):
+            indptr = np.asarray(self.indptr[start:end + 1])
+            sources = np.repeat(np.arange(start, end, dtype=np.int32), np.diff(indptr))
+            targets = np.asarray(self.indices[indptr[0]:indptr[-1]])
+            order = np.argsort(targets, kind="stable")
+            targets, sources = targets[order], sources[order]
+            firsts = np.flatnonzero(np.concatenate((targets[:1] >= 0, targets[1:] != targets[:-1])))
+            counts = np.diff(np.append(firsts, len(targets)))
+            # the links to a target follow the ones written before
+            ranks = np.arange(len(targets)) - np.repeat(firsts, counts)
+            in_indices[next_positions[targets] + ranks] = sources
+            next_positions[targets[firsts]] += counts
+        in_indices.flush()
+        del in_indices
+        os.replace(in_indices_path + ".tmp", in_indices_path)
+        in_indptr_path = os.path.join(self.path, "in_indptr.npy")
+        with open(in_indptr_path + ".tmp", "wb") as file:
+            np.save(file, in_indptr)
+        os.replace(in_indptr_path + ".tmp", in_indptr_path)
+
+    @staticmethod
+    def exists(path):
+        return all(os.path.isfile(os.path.join(path, name + ".npy")) for name in _ARRAY_NAMES)
+
+    @staticmethod
+    def from_webnet(webnet):
+        # All nodes must have a node id
+        indptr, indices = webnet.get_adjacency()
+        return GraphSnapshot(np.array([node.get_node_id() for node in webnet], dtype=np.int64), indptr, indices)
+
+    @staticmethod
+    def from_store(node_store):
+        # Reads the urls of all nodes first and then resolves their out links, without building nodes
+        url_to_index = {}
+        node_ids = _GrowableArray(np.int64)
+        for node_id, urls in node_store.iter_urls():
+            for url in urls:
+                url_to_index[url] = len(node_ids)
+            node_ids.append(node_id)
+        rows = _GrowableArray(np.int64)
+        columns = _GrowableArray(np.int32)
+        for index, out_links in enumerate(node_store.iter_out_links()):
+            out_indices = [url_to_index[link] for link in out_links if link in url_to_index]
+            rows.extend(np.full(len(out_indices), index))
+            columns.extend(out_indices)
+        indptr, indices = make_csr(rows.view(), columns.view(), len(node_ids))
+        return GraphSnapshot(node_ids.view().copy(), indptr, indices)
+
+
+def export_snapshot(store_path, snapshot_path=None):
+    # Writes the snapshot of the store, by default next to it, and returns its path
+    snapshot_path = snapshot_path or get_snapshot_path(store_path)
+    start_time = time.perf_counter()
+    with WebNodeStore(store_path) as node_store:
+        snapshot = GraphSnapshot.from_store(node_store)
+    snapshot.save(snapshot_path)
+    print("Exported snapshot of", len(snapshot), "nodes and", snapshot.get_edges_count(), "links to", snapshot_path,
+          "in {:.1f} seconds".format(time.perf_counter() - start_time))
+    return snapshot_path
+
+
+if __name__ == "__main__":
+    from pyoogle.config import DATABASE_PATH
+    export_snapshot(sys.argv[1] if len(sys.argv) > 1 else DATABASE_PATH)
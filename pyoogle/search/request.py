@@ -50,10 +50,18 @@ class Request:
             nodes.append(node)
         return count_to_nodes
 
+    def _get_importance_name(self):
+        # Importances biased towards the searched site or language if the ranker saved them, see PersonalizedRanker
+        names = self.node_store.get_importance_names()
+        for name in ("site:" + (self.start_url or ""), "lang:" + (self.language or "")):
+            if name in names:
+                return name
+
     def execute(self, query):
         self._parse(query)
         # Use the user query string to query the store, returns a list sorted descending by importance value
-        query_nodes = self.node_store.query(self.request_tree, self.language, self.start_url)
+        query_nodes = self.node_store.query(self.request_tree, self.language, self.start_url,
+                                            self._get_importance_name())
         if query_nodes is None:
             raise ValueError("Joining parameters (AND/OR/NOT) in query misplaced:", query)
 